@@ -0,0 +1,45 @@
+"""
+操作日志写入基准测试：对比同步写入与后台批量写入下每次业务写操作的延迟
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_audit_writer --payments 5000
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.common import temp_database, create_bench_contract, format_rate
+from models.entities import PaymentRecord
+from services.payment_service import PaymentService
+
+
+def run_workload(audit_async: bool, payments: int) -> tuple:
+    """逐笔写入收款（每笔附带一条操作日志），返回 (写入耗时, 日志落盘耗时)"""
+    with temp_database(audit_async=audit_async) as db:
+        create_bench_contract(db)
+        service = PaymentService(db)
+        payment = PaymentRecord(date=datetime.date(2024, 1, 15), amount=100.0,
+                                contract_id="BENCH-001", payment_type="租金")
+        start = time.perf_counter()
+        for _ in range(payments):
+            service.add_payment_record(payment, "bench")
+        write_elapsed = time.perf_counter() - start
+        db.flush_logs(timeout=60)
+        total_elapsed = time.perf_counter() - start
+        logged = db.execute_query("SELECT COUNT(*) AS n FROM operation_logs")[0]["n"]
+    return write_elapsed, total_elapsed, logged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="操作日志写入基准测试")
+    parser.add_argument("--payments", type=int, default=5000, help="收款笔数")
+    args = parser.parse_args()
+
+    for label, audit_async in (("同步写日志", False), ("后台批量写日志", True)):
+        write_elapsed, total_elapsed, logged = run_workload(audit_async, args.payments)
+        print(f"{label:<10} 业务写入: {format_rate(write_elapsed, args.payments)}，"
+              f"日志全部落盘 {total_elapsed:.3f}s，日志 {logged} 条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+去重备份仓库基准测试：连续多次备份（每次之间少量写入），对比完整副本与去重仓库的磁盘占用和耗时
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_backup_store --contracts 2000 --backups 10
+"""
+import argparse
+import os
+import tempfile
+import time
+import shutil
+
+from benchmarks.common import temp_database, seed_portfolio
+from database.backup import BackupEngine
+from database.backup_store import BackupStore
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def run(db, label: str, store_factory, backups: int, writes: int):
+    backup_dir = tempfile.mkdtemp(prefix="lease_bench_backup_")
+    try:
+        store = store_factory(backup_dir)
+        engine = BackupEngine(db.pool.create_connection, backup_dir, max_backups=backups, store=store)
+        elapsed = 0.0
+        for i in range(backups):
+            # 模拟两次备份之间的日常业务写入
+            with db.transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO payment_records (contract_id, date, amount_cents, payment_type, created_by)
+                    VALUES ('SEED-00000', '2025-01-01', ?, '租金', 'bench')
+                ''', ((10000 + n * 100,) for n in range(writes)))
+            start = time.perf_counter()
+            result = engine.backup(f"run{i}")
+            elapsed += time.perf_counter() - start
+            assert result.ok, result.error
+
+        if store is not None:
+            # 从最新清单恢复并比对
+            latest = engine.list_backups()[0]
+            restored = os.path.join(backup_dir, "restored.db")
+            engine.extract(latest, restored)
+            assert engine.verify(restored)[0]
+            os.remove(restored)
+        size = dir_size(backup_dir)
+        print(f"{label:<16} {backups} 次备份  占用 {size / 1024 / 1024:8.2f}MB  平均每次 {elapsed / backups:.3f}s")
+        return size
+    finally:
+        shutil.rmtree(backup_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="去重备份仓库基准测试")
+    parser.add_argument("--contracts", type=int, default=2000, help="合成合同数")
+    parser.add_argument("--backups", type=int, default=10, help="连续备份次数")
+    parser.add_argument("--writes", type=int, default=50, help="两次备份之间写入的收款记录数")
+    args = parser.parse_args()
+
+    with temp_database(query_stats=False) as db:
+        print(f"正在写入合成数据：{args.contracts} 份合同...")
+        seed_portfolio(db, args.contracts, 24)
+        db.checkpoint()
+        print(f"数据库文件 {os.path.getsize(db.db_name) / 1024 / 1024:.2f}MB")
+
+        full = run(db, "完整副本", lambda root: None, args.backups, args.writes)
+        lzma_size = run(db, "去重仓库(lzma)", lambda root: BackupStore(root, codec="lzma"), args.backups, args.writes)
+        gzip_size = run(db, "去重仓库(gzip)", lambda root: BackupStore(root, codec="gzip"), args.backups, args.writes)
+        print(f"磁盘占用：lzma 为完整副本的 {lzma_size / full:.1%}，gzip 为 {gzip_size / full:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+连接池基准测试：对比每次新建连接与池化连接在 1 万笔收款写入/查询下的开销
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_connection_pool --payments 10000
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.common import temp_database, create_bench_contract, format_rate
+from config.settings import config
+from models.entities import PaymentRecord
+from services.payment_service import PaymentService
+
+
+def run_workload(pool_size: int, payments: int) -> dict:
+    """在指定连接池大小下执行收款写入与逐笔查询"""
+    with temp_database(pool_size=pool_size) as db:
+        create_bench_contract(db)
+        service = PaymentService(db)
+        pay_date = datetime.date(2024, 1, 1)
+
+        start = time.perf_counter()
+        for _ in range(payments):
+            service.add_payment_record(PaymentRecord(
+                date=pay_date, amount=100.0, contract_id="BENCH-001", payment_type="租金"
+            ), "bench")
+        write_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for record_id in range(1, payments + 1):
+            db.execute_query("SELECT * FROM payment_records WHERE id = ?", (record_id,))
+        read_elapsed = time.perf_counter() - start
+
+    return {"write": write_elapsed, "read": read_elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="连接池基准测试")
+    parser.add_argument("--payments", type=int, default=10000, help="收款记录笔数")
+    args = parser.parse_args()
+
+    print(f"收款笔数: {args.payments}")
+    # pool_size=0 时每次调用都会新建并关闭连接，等同于引入连接池之前的行为
+    baseline = run_workload(0, args.payments)
+    pooled = run_workload(config.database.pool_size, args.payments)
+
+    print(f"每次新建连接  写入: {format_rate(baseline['write'], args.payments)}")
+    print(f"每次新建连接  查询: {format_rate(baseline['read'], args.payments)}")
+    print(f"池化连接      写入: {format_rate(pooled['write'], args.payments)}")
+    print(f"池化连接      查询: {format_rate(pooled['read'], args.payments)}")
+    print(f"✓ 写入提速 {baseline['write'] / pooled['write']:.2f}x，"
+          f"查询提速 {baseline['read'] / pooled['read']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
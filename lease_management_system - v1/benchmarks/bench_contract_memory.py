@@ -0,0 +1,109 @@
+"""
+合同内存基准测试：在 5 万份合同上对比加载全部合同后常驻的内存
+  - 改动前的布局：实体不带 __slots__，租金期/免租期随合同立即加载
+  - __slots__ 实体，关联立即加载（全部访问一遍）
+  - __slots__ 实体 + 延迟关联：只加载合同本身，界面查看若干合同后释放
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_contract_memory --contracts 50000
+"""
+import argparse
+import dataclasses
+import gc
+import time
+import tracemalloc
+from collections import defaultdict
+
+from benchmarks.common import temp_database, seed_portfolio
+from database.rows import RowMode
+from models.entities import FreeRentPeriod, LeaseContract, RentPeriod
+from models.hydration import EntityHydrator
+from services.contract_service import (ContractService, CONTRACT_HYDRATOR, FREE_PERIOD_HYDRATOR,
+                                       RENT_PERIOD_HYDRATOR)
+
+
+def dict_variant(entity: type) -> type:
+    """同字段、不带 __slots__ 的实体类（改动前每个对象附带属性字典的布局）"""
+    return dataclasses.make_dataclass(f"Dict{entity.__name__}", [
+        (item.name, item.type, dataclasses.field(default=item.default, default_factory=item.default_factory,
+                                                 init=item.init))
+        for item in dataclasses.fields(entity)])
+
+
+def dict_hydrator(hydrator: EntityHydrator) -> EntityHydrator:
+    """与 hydrator 相同的列映射与转换，构建不带 __slots__ 的实体"""
+    return EntityHydrator(dict_variant(hydrator.entity), dict(zip(hydrator.fields, hydrator.columns)),
+                          hydrator.converters)
+
+
+def load_eager_dict(db):
+    """改动前的加载方式：不带 __slots__ 的合同及其全部租金期/免租期"""
+    contracts = dict_hydrator(CONTRACT_HYDRATOR).from_columns(
+        db.execute_query("SELECT * FROM contracts ORDER BY create_time DESC", row_mode=RowMode.COLUMNAR))
+    by_id = {contract.contract_id: contract for contract in contracts}
+    for table, hydrator, relation in (("rent_periods", RENT_PERIOD_HYDRATOR, "rent_periods"),
+                                      ("free_periods", FREE_PERIOD_HYDRATOR, "free_rent_periods")):
+        grouped = defaultdict(list)
+        for row in db.execute_query(f"SELECT contract_id, {hydrator.select_list} FROM {table}",
+                                    row_mode=RowMode.TUPLE):
+            grouped[row[0]].append(row[1:])
+        builder = dict_hydrator(hydrator)
+        for contract_id, rows in grouped.items():
+            getattr(by_id[contract_id], relation).extend(builder.from_rows(rows))
+    return contracts
+
+
+def measure(label: str, load, contracts: int):
+    """常驻内存（加载结果保持引用时）与峰值内存"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<34} 常驻 {current / 1024 / 1024:8.1f}MB（每份 {current / contracts:6.0f}B）"
+          f"  峰值 {peak / 1024 / 1024:8.1f}MB  {elapsed:6.2f}s")
+    del result
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合同内存基准测试")
+    parser.add_argument("--contracts", type=int, default=50000, help="合同数")
+    parser.add_argument("--shown", type=int, default=100, help="延迟加载时界面查看过的合同数")
+    args = parser.parse_args()
+
+    with temp_database(query_stats=False) as db:
+        print(f"正在写入 {args.contracts:,} 份合同...")
+        seed_portfolio(db, args.contracts, months=1)
+        service = ContractService(db)
+
+        def load_eager():
+            contracts = service.get_all_contracts()
+            for contract in contracts:
+                len(contract.rent_periods), len(contract.free_rent_periods)
+            return contracts
+
+        def load_lazy():
+            contracts = service.get_all_contracts()
+            # 界面逐个查看合同：选中时加载关联，切换到下一份时释放
+            for contract in contracts[:args.shown]:
+                len(contract.rent_periods), len(contract.free_rent_periods)
+                contract.release_relations()
+            contracts[0].rent_periods[0]
+            return contracts
+
+        print(f"加载 {args.contracts:,} 份合同（各含租金期、免租期）后常驻的内存")
+        before = measure("改动前（属性字典，立即加载）", lambda: load_eager_dict(db), args.contracts)
+        measure("__slots__，立即加载", load_eager, args.contracts)
+        after = measure(f"__slots__ + 延迟关联（查看 {args.shown} 份）", load_lazy, args.contracts)
+        print(f"延迟关联的常驻内存为改动前的 {after / before:.1%}")
+
+        sample = service.get_contract_by_id("SEED-00000")
+        assert isinstance(sample.rent_periods[0], RentPeriod) and isinstance(sample, LeaseContract)
+        assert all(isinstance(period, FreeRentPeriod) for period in sample.free_rent_periods)
+
+
+if __name__ == "__main__":
+    main()
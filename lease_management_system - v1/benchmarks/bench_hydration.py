@@ -0,0 +1,131 @@
+"""
+实体构建基准测试：对比逐行构建（具名元组行 + __init__/__post_init__ 校验 + 逐行转换日期和录入时间，
+日期分别取文本列 strptime 与取序数列）与整批构建（EntityHydrator：跳过校验、每个不同取值只转换一次、
+共享驻留字符串）加载收款记录的开销，并核对各方式构建的实体逐条一致
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_hydration --rows 100000
+"""
+import argparse
+import datetime
+import time
+from collections import namedtuple
+
+from benchmarks.common import temp_database, create_bench_contract
+from database.rows import RowMode, ordinal_date
+from models.entities import PaymentRecord
+from services.payment_service import PaymentService, PAYMENT_HYDRATOR
+
+PaymentRow = namedtuple("PaymentRow", PAYMENT_HYDRATOR.columns)
+# 日期序数列之前的查询：日期读取文本列
+TEXT_COLUMNS = tuple("date" if column == "date_ord" else column for column in PAYMENT_HYDRATOR.columns)
+TextPaymentRow = namedtuple("TextPaymentRow", TEXT_COLUMNS)
+
+
+def seed_payments(db, rows: int):
+    """按日期分布写入收款记录；录入时间、录入人、类型的取值与日常录入一样大量重复"""
+    base = datetime.datetime(2020, 1, 1, 9, 30)
+    with db.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO payment_records (contract_id, date, amount_cents, payment_type, created_at, created_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (("BENCH-001", (base + datetime.timedelta(days=i % 1500)).date().isoformat(), 10000 + i % 500 * 100,
+               ("租金", "押金")[i % 2], (base + datetime.timedelta(days=i % 1500)).isoformat(" "),
+               f"user{i % 5}") for i in range(rows)))
+
+
+def build_record(row: PaymentRow) -> PaymentRecord:
+    """逐行构建：经 __init__ 与 __post_init__ 校验，日期与录入时间逐行转换"""
+    return PaymentRecord(
+        date=ordinal_date(row.date_ord),
+        amount=row.amount,
+        contract_id=row.contract_id,
+        payment_type=row.payment_type,
+        id=row.id,
+        created_by=row.created_by,
+        created_at=datetime.datetime.fromisoformat(row.created_at) if row.created_at else None
+    )
+
+
+def build_text_record(row: TextPaymentRow) -> PaymentRecord:
+    """逐行构建，日期由文本列 strptime 解析"""
+    return PaymentRecord(
+        date=datetime.datetime.strptime(row.date, "%Y-%m-%d").date(),
+        amount=row.amount,
+        contract_id=row.contract_id,
+        payment_type=row.payment_type,
+        id=row.id,
+        created_by=row.created_by,
+        created_at=datetime.datetime.fromisoformat(row.created_at) if row.created_at else None
+    )
+
+
+def best_of(func, repeat: int):
+    """多次执行取最短耗时，返回 (耗时, 最后一次的结果)"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(cases, repeat: int) -> list:
+    """逐项计时并打印相对第一项的提速，返回各项的结果"""
+    results, baseline = [], None
+    for label, func in cases:
+        elapsed, result = best_of(func, repeat)
+        results.append(result)
+        baseline = baseline or elapsed
+        print(f"  {label:<22} {elapsed * 1000:8.1f}ms  提速 {baseline / elapsed:5.2f}x")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="实体构建基准测试")
+    parser.add_argument("--rows", type=int, default=100000, help="收款记录行数")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最短）")
+    args = parser.parse_args()
+
+    with temp_database(query_stats=False) as db:
+        create_bench_contract(db)
+        seed_payments(db, args.rows)
+        service = PaymentService(db)
+        sql, params = service._build_record_query("payment_records", PAYMENT_HYDRATOR.columns, None, None, None)
+        text_sql = service._build_record_query("payment_records", TEXT_COLUMNS, None, None, None)[0]
+
+        fetch_time, rows = best_of(lambda: db.execute_query(sql, params, row_mode=RowMode.TUPLE), args.repeat)
+        text_rows = db.execute_query(text_sql, params, row_mode=RowMode.TUPLE)
+        print(f"{args.rows:,} 行收款记录，取数（TUPLE）{fetch_time * 1000:.1f}ms")
+
+        cases = [
+            ("逐行（strptime 文本日期）", lambda: [build_text_record(TextPaymentRow._make(row)) for row in text_rows]),
+            ("逐行（日期序数）", lambda: [build_record(PaymentRow._make(row)) for row in rows]),
+            ("整批构建", lambda: PAYMENT_HYDRATOR.from_rows(rows)),
+        ]
+        print("构建实体（不含取数）")
+        results = report(cases, args.repeat)
+        expected = [record.to_dict() for record in results[0]]
+        assert all([record.to_dict() for record in records] == expected for records in results[1:]), \
+            "各方式构建的实体不一致"
+
+        def load_per_row(query, row_type, build):
+            return lambda: [build(row) for row in db.iter_query(query, params, row_mode=RowMode.NAMEDTUPLE,
+                                                               row_type=row_type)]
+
+        loads = [
+            ("逐行（strptime 文本日期）", load_per_row(text_sql, TextPaymentRow, build_text_record)),
+            ("逐行（日期序数）", load_per_row(sql, PaymentRow, build_record)),
+            ("get_payment_records", service.get_payment_records),
+        ]
+        print("加载（取数 + 构建）")
+        records = report(loads, args.repeat)[-1]
+        assert len(records) == args.rows
+
+        shared = {field: len({id(getattr(r, field)) for r in records})
+                  for field in ("payment_type", "created_by", "contract_id", "date", "created_at")}
+        print("不同对象数：" + "，".join(f"{field} {count}" for field, count in shared.items()))
+
+
+if __name__ == "__main__":
+    main()
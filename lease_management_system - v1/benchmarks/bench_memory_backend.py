@@ -0,0 +1,99 @@
+"""
+内存数据库基准测试：对比文件库与内存库上的测试数据装载、常用服务调用和核算计算的耗时，
+并验证从快照载入的内存库与源数据一致
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_memory_backend --contracts 500
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import temp_database, memory_database, seed_portfolio
+from services.contract_service import ContractService
+from services.payment_service import PaymentService
+
+try:
+    from lease_accounting.core import LeaseAccounting
+except ImportError as e:  # 核算模块的界面部分依赖 pandas 等可选组件
+    LeaseAccounting, ACCOUNTING_ERROR = None, str(e)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def run_services(db, rounds: int) -> float:
+    """常用读写路径：合同加载、月度汇总、押金余额、收款流式读取、新增并删除收款"""
+    contracts = ContractService(db)
+    payments = PaymentService(db)
+
+    def work():
+        for i in range(rounds):
+            contract_id = f"SEED-{i % 100:05d}"
+            contracts.get_contract_by_id(contract_id)
+            payments.get_monthly_summary(2023, i % 12 + 1)
+            payments.get_deposit_balance(contract_id)
+            sum(p.amount for p in payments.iter_payment_records(contract_id))
+            with db.transaction() as conn:
+                conn.execute("INSERT INTO payment_records (contract_id, date, amount_cents, payment_type, created_by) "
+                             "VALUES (?, '2023-06-30', 100, '租金', 'bench')", (contract_id,))
+                conn.execute("DELETE FROM payment_records WHERE created_by = 'bench'")
+    return timed(work)[0]
+
+
+def run_accounting(db, contracts: int) -> str:
+    """按合同逐月计算收入与税会差异（核算模块依赖的可选组件缺失时跳过）"""
+    if LeaseAccounting is None:
+        return f"跳过（{ACCOUNTING_ERROR}）"
+    # 与界面相同，核算直接使用 DatabaseManager（app.db 即 app.db_manager）
+    service = ContractService(db)
+
+    def work():
+        for n in range(contracts):
+            accounting = LeaseAccounting(service.get_contract_by_id(f"SEED-{n:05d}"), db)
+            for month in range(1, 13):
+                accounting.calculate_tax_diff(2023, month)
+    return f"{timed(work)[0]:.3f}s"
+
+
+def report(label: str, db, args) -> float:
+    seed_time, counts = timed(lambda: seed_portfolio(db, args.contracts, args.months))
+    service_time = run_services(db, args.rounds)
+    accounting = run_accounting(db, min(args.contracts, 20))
+    print(f"{label:<8} 装载 {sum(counts.values()):,} 行 {seed_time:7.3f}s  "
+          f"服务调用 {args.rounds} 轮 {service_time:7.3f}s  核算 {accounting}")
+    return service_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文件库与内存库对比基准测试")
+    parser.add_argument("--contracts", type=int, default=500, help="合成合同数")
+    parser.add_argument("--months", type=int, default=24, help="每份合同的月数")
+    parser.add_argument("--rounds", type=int, default=500, help="服务调用轮数")
+    args = parser.parse_args()
+
+    with temp_database(query_stats=False) as db:
+        file_time = report("文件库", db, args)
+        snapshot = os.path.join(os.path.dirname(db.db_name), "snapshot.db")
+        result = db.backup_engine.backup(dest_path=snapshot, cleanup=False)
+        assert result.ok, result.error
+        expected = db.execute_query("SELECT COUNT(*), SUM(amount) FROM payment_records", row_mode="tuple")
+
+        with memory_database(query_stats=False) as memory_db:
+            memory_time = report("内存库", memory_db, args)
+        print(f"服务调用耗时：内存库为文件库的 {memory_time / file_time:.1%}")
+
+        def load_snapshot():
+            with memory_database(seed=snapshot, query_stats=False) as seeded:
+                return seeded.execute_query("SELECT COUNT(*), SUM(amount) FROM payment_records", row_mode="tuple")
+
+        load_time, actual = timed(load_snapshot)
+        assert actual == expected, (actual, expected)
+        print(f"从快照载入内存库 {load_time:.3f}s，数据与源库一致")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+合同组合核算基准测试：对比逐合同计算（LeaseAccounting 的有效天数/含税租金与调整收入）与
+列式快照上的整批计算（models.portfolio）核算一个月的耗时，并核对两者逐合同一致
+
+运行方式（在项目根目录，需要 NumPy）：
+    python -m benchmarks.bench_portfolio --contracts 100000
+"""
+import argparse
+import time
+from collections import defaultdict
+
+from benchmarks.common import temp_database, seed_portfolio
+from database.rows import RowMode
+from models import portfolio
+from services.contract_service import ContractService, FREE_PERIOD_HYDRATOR, RENT_PERIOD_HYDRATOR
+from services.portfolio_service import PortfolioService
+
+try:
+    from lease_accounting.core import LeaseAccounting
+except ImportError as e:  # 核算模块的界面部分依赖 pandas 等可选组件
+    LeaseAccounting, ACCOUNTING_ERROR = None, str(e)
+
+COLUMNS = ("accounting_income", "tax_income", "diff_amount", "deferred_tax", "to_be_settled_vat", "adjust_vat")
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def load_contracts(db) -> list:
+    """加载全部合同，租金期/免租期按表整批读取后直接挂到合同上（不计入计时）"""
+    contracts = ContractService(db).get_all_contracts()
+    by_id = {contract.contract_id: contract for contract in contracts}
+    for table, hydrator, relation in (("rent_periods", RENT_PERIOD_HYDRATOR, "rent_periods"),
+                                      ("free_periods", FREE_PERIOD_HYDRATOR, "free_rent_periods")):
+        grouped = defaultdict(list)
+        for row in db.execute_query(f"SELECT contract_id, {hydrator.select_list} FROM {table} "
+                                    f"ORDER BY contract_id, start_date_ord", row_mode=RowMode.TUPLE):
+            grouped[row[0]].append(row[1:])
+        for contract_id, rows in grouped.items():
+            setattr(by_id[contract_id], relation, hydrator.from_rows(rows))
+    return contracts
+
+
+def per_contract(contracts, db, year: int, month: int) -> dict:
+    """逐合同计算税会差异（与 calculate_tax_diff 相同的计算，不写入数据库）"""
+    result = {}
+    for contract in contracts:
+        accounting = LeaseAccounting(contract, db)
+        valid_days, tax_rent = accounting._get_valid_rent_data(year, month)
+        tax_income = round(tax_rent / (1 + accounting.tax_rate), 2)
+        if accounting.is_adjust_income:
+            accounting_income = accounting._calculate_adjusted_income(year, month, valid_days)
+        else:
+            accounting_income = tax_income
+        diff_amount = round(accounting_income - tax_income, 2)
+        result[contract.contract_id] = (
+            accounting_income, tax_income, diff_amount, round(diff_amount * accounting.income_tax_rate, 2),
+            round(accounting_income * accounting.tax_rate, 2), round(tax_income * accounting.tax_rate, 2))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合同组合核算基准测试")
+    parser.add_argument("--contracts", type=int, default=100000, help="合同数")
+    parser.add_argument("--year", type=int, default=2023, help="核算年份")
+    parser.add_argument("--month", type=int, default=1, help="核算月份")
+    args = parser.parse_args()
+
+    if not portfolio.NUMPY_AVAILABLE:
+        print("未安装 NumPy，跳过合同组合核算基准测试")
+        return
+    if LeaseAccounting is None:
+        print(f"核算模块无法导入（{ACCOUNTING_ERROR}），跳过合同组合核算基准测试")
+        return
+
+    with temp_database(query_stats=False) as db:
+        print(f"正在写入 {args.contracts:,} 份合同...")
+        seed_portfolio(db, args.contracts, months=1)
+        # 三分之一的合同需要调整收入，覆盖会计口径的分摊计算
+        db.execute_command("UPDATE contracts SET need_adjust_income = 1 WHERE rowid % 3 = 0")
+        contracts = load_contracts(db)
+
+        baseline, expected = timed(lambda: per_contract(contracts, db, args.year, args.month))
+        load_time, snapshot = timed(lambda: PortfolioService(db).load_snapshot())
+        kernel_time, result = timed(lambda: portfolio.tax_diff(snapshot, args.year, args.month))
+        batch_time, rows = timed(lambda: LeaseAccounting.calculate_portfolio_tax_diff(
+            {contract.contract_id: contract for contract in contracts}, db, args.year, args.month, snapshot))
+
+        print(f"{args.contracts:,} 份合同核算 {args.year}年{args.month}月")
+        print(f"  逐合同计算（不含写入）      {baseline * 1000:9.1f}ms")
+        print(f"  构建组合快照                {load_time * 1000:9.1f}ms")
+        print(f"  整批计算                    {kernel_time * 1000:9.1f}ms  提速 {baseline / kernel_time:6.1f}x")
+        print(f"  整批核算（含写入）          {batch_time * 1000:9.1f}ms")
+        print("  合计：" + "，".join(f"{name} {value:,.2f}" for name, value in
+                                   portfolio.totals({name: result[name] for name in COLUMNS}).items()))
+
+        actual = {row["contract_id"]: tuple(row[name] for name in COLUMNS) for row in rows}
+        assert actual == expected, "整批计算与逐合同计算不一致"
+        print("整批计算与逐合同计算逐合同一致")
+
+
+if __name__ == "__main__":
+    main()
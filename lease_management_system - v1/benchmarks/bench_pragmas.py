@@ -0,0 +1,89 @@
+"""
+PRAGMA 配置基准测试：对比默认回滚日志与 WAL + 调优 PRAGMA 下的写入吞吐和报表延迟
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_pragmas --payments 5000 --seed 200000
+"""
+import argparse
+import datetime
+import statistics
+import threading
+import time
+
+from benchmarks.common import temp_database, create_bench_contract, format_rate
+from models.entities import PaymentRecord
+from services.payment_service import PaymentService
+
+
+def seed_payments(db, count: int):
+    """批量写入历史收款，使月度报表有足够的数据量"""
+    base = datetime.date(2023, 1, 1)
+    rows = [("BENCH-001", (base + datetime.timedelta(days=i % 365)).isoformat(),
+             10000 + i % 50 * 100, "租金", "bench") for i in range(count)]
+    db.execute_batch('''
+        INSERT INTO payment_records (contract_id, date, amount_cents, payment_type, created_by)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def run_workload(apply_pragmas: bool, payments: int, seed: int, reports: int) -> dict:
+    """执行逐笔写入，再在后台持续写入的同时测量月度报表耗时"""
+    with temp_database(apply_pragmas=apply_pragmas) as db:
+        create_bench_contract(db)
+        seed_payments(db, seed)
+        service = PaymentService(db)
+        payment = PaymentRecord(date=datetime.date(2024, 1, 15), amount=100.0,
+                                contract_id="BENCH-001", payment_type="租金")
+
+        start = time.perf_counter()
+        for _ in range(payments):
+            service.add_payment_record(payment, "bench")
+        write_elapsed = time.perf_counter() - start
+
+        # 后台写入线程模拟报表期间的日常录入
+        stop = threading.Event()
+        written = [0]
+
+        def writer():
+            while not stop.is_set():
+                if service.add_payment_record(payment, "bench"):
+                    written[0] += 1
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        latencies = []
+        report_start = time.perf_counter()
+        for i in range(reports):
+            start = time.perf_counter()
+            service.get_monthly_summary(2023, i % 12 + 1)
+            latencies.append(time.perf_counter() - start)
+        report_window = time.perf_counter() - report_start
+        stop.set()
+        thread.join()
+
+    return {
+        "write": write_elapsed,
+        "report_p50": statistics.median(latencies),
+        "report_max": max(latencies),
+        "concurrent_writes": written[0] / report_window if report_window else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PRAGMA 配置基准测试")
+    parser.add_argument("--payments", type=int, default=5000, help="逐笔写入的收款笔数")
+    parser.add_argument("--seed", type=int, default=200000, help="预置历史收款笔数")
+    parser.add_argument("--reports", type=int, default=50, help="月度报表执行次数")
+    args = parser.parse_args()
+
+    print(f"逐笔写入: {args.payments}，历史数据: {args.seed}，报表次数: {args.reports}")
+    for label, apply_pragmas in (("默认配置", False), ("WAL+PRAGMA", True)):
+        result = run_workload(apply_pragmas, args.payments, args.seed, args.reports)
+        print(f"{label:<10} 写入: {format_rate(result['write'], args.payments)}")
+        print(f"{label:<10} 报表: p50 {result['report_p50'] * 1000:.1f}ms，"
+              f"最大 {result['report_max'] * 1000:.1f}ms，"
+              f"报表期间后台写入 {result['concurrent_writes']:.0f} 笔/秒")
+
+
+if __name__ == "__main__":
+    main()
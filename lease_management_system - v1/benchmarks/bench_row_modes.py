@@ -0,0 +1,117 @@
+"""
+行模式基准测试：对比 DICT / TUPLE / NAMEDTUPLE / __slots__ / COLUMNAR 每 10 万行的取数与实体构建开销，
+以及文本日期 strptime 与日期序数列经缓存构建 date 对象的开销
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_row_modes --rows 100000
+"""
+import argparse
+import datetime
+import time
+
+from benchmarks.common import temp_database, create_bench_contract
+from database.rows import RowMode, ordinal_date
+from benchmarks.bench_hydration import PaymentRow, build_record
+from services.payment_service import PAYMENT_HYDRATOR
+
+
+class PaymentSlotsRow:
+    """预先声明 __slots__ 的行类"""
+    __slots__ = PAYMENT_HYDRATOR.columns
+
+    def __init__(self, id, contract_id, date_ord, amount, payment_type, created_at, created_by):
+        self.id = id
+        self.contract_id = contract_id
+        self.date_ord = date_ord
+        self.amount = amount
+        self.payment_type = payment_type
+        self.created_at = created_at
+        self.created_by = created_by
+
+
+def seed_payments(db, rows: int):
+    base = datetime.date(2020, 1, 1)
+    with db.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO payment_records (contract_id, date, amount_cents, payment_type, created_by)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (("BENCH-001", (base + datetime.timedelta(days=i % 1500)).isoformat(),
+               10000 + i % 500 * 100, "租金", "bench") for i in range(rows)))
+
+
+def best_of(func, repeat: int) -> float:
+    """多次执行取最短耗时"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行模式基准测试")
+    parser.add_argument("--rows", type=int, default=100000, help="收款记录行数")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最短）")
+    args = parser.parse_args()
+
+    with temp_database() as db:
+        create_bench_contract(db)
+        seed_payments(db, args.rows)
+        sql = f"SELECT {', '.join(PaymentRow._fields)} FROM payment_records"
+        scale = 100000 / args.rows
+
+        fetch_cases = [
+            ("DICT", lambda: db.execute_query(sql)),
+            ("TUPLE", lambda: db.execute_query(sql, row_mode=RowMode.TUPLE)),
+            ("NAMEDTUPLE(自动)", lambda: db.execute_query(sql, row_mode=RowMode.NAMEDTUPLE)),
+            ("NAMEDTUPLE(PaymentRow)", lambda: db.execute_query(sql, row_mode=RowMode.NAMEDTUPLE, row_type=PaymentRow)),
+            ("__slots__ 行类", lambda: db.execute_query(sql, row_mode=RowMode.NAMEDTUPLE, row_type=PaymentSlotsRow)),
+            ("COLUMNAR", lambda: db.execute_query(sql, row_mode=RowMode.COLUMNAR)),
+        ]
+        print(f"取数开销（每 10 万行，{args.rows:,} 行实测）")
+        baseline = None
+        for label, func in fetch_cases:
+            elapsed = best_of(func, args.repeat) * scale
+            baseline = baseline or elapsed
+            print(f"  {label:<24} {elapsed * 1000:8.1f}ms  相对 DICT {elapsed / baseline:5.2f}x")
+
+        def hydrate_from_dicts():
+            for row in db.execute_query(sql):
+                build_record(PaymentRow(**row))
+
+        def hydrate_from_rows():
+            for row in db.execute_query(sql, row_mode=RowMode.NAMEDTUPLE, row_type=PaymentRow):
+                build_record(row)
+
+        print(f"构建 PaymentRecord 实体（每 10 万行）")
+        dict_elapsed = best_of(hydrate_from_dicts, args.repeat) * scale
+        row_elapsed = best_of(hydrate_from_rows, args.repeat) * scale
+        print(f"  {'经由 DICT':<24} {dict_elapsed * 1000:8.1f}ms")
+        print(f"  {'经由 PaymentRow':<24} {row_elapsed * 1000:8.1f}ms  提速 {dict_elapsed / row_elapsed:.2f}x")
+        batch_elapsed = best_of(lambda: PAYMENT_HYDRATOR.from_rows(db.execute_query(sql, row_mode=RowMode.TUPLE)),
+                                args.repeat) * scale
+        print(f"  {'TUPLE 整批构建':<24} {batch_elapsed * 1000:8.1f}ms  提速 {dict_elapsed / batch_elapsed:.2f}x")
+
+        text_dates = [row[0] for row in db.execute_query("SELECT date FROM payment_records", row_mode=RowMode.TUPLE)]
+        ordinals = [row[0] for row in db.execute_query("SELECT date_ord FROM payment_records", row_mode=RowMode.TUPLE)]
+        assert [ordinal_date(n) for n in ordinals] == [datetime.date.fromisoformat(d) for d in text_dates]
+
+        def parse_text():
+            for value in text_dates:
+                datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+        def from_ordinals():
+            for value in ordinals:
+                ordinal_date(value)
+
+        print(f"构建 date 对象（每 10 万行）")
+        text_elapsed = best_of(parse_text, args.repeat) * scale
+        ordinal_elapsed = best_of(from_ordinals, args.repeat) * scale
+        print(f"  {'strptime(文本日期)':<24} {text_elapsed * 1000:8.1f}ms")
+        print(f"  {'ordinal_date(date_ord)':<24} {ordinal_elapsed * 1000:8.1f}ms  "
+              f"提速 {text_elapsed / ordinal_elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
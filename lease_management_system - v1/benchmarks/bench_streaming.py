@@ -0,0 +1,81 @@
+"""
+流式查询内存基准测试：在 100 万行 payment_records 上对比全量加载与 iter_query 流式处理的峰值内存
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_streaming --rows 1000000
+"""
+import argparse
+import datetime
+import time
+import tracemalloc
+
+from benchmarks.common import temp_database, create_bench_contract
+from models.entities import PaymentRecord
+from services.payment_service import PaymentService
+
+
+def seed_payments(db, rows: int):
+    """以生成器方式批量写入收款记录，避免预置数据本身占用大量内存"""
+    base = datetime.date(2015, 1, 1)
+    with db.transaction() as conn:
+        conn.executemany('''
+            INSERT INTO payment_records (contract_id, date, amount_cents, payment_type, created_by)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (("BENCH-001", (base + datetime.timedelta(days=i % 3650)).isoformat(),
+               10000 + i % 500 * 100, "租金", "bench") for i in range(rows)))
+
+
+def measure(label: str, func):
+    """执行 func 并输出耗时与 Python 堆峰值内存"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    total = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24} 耗时 {elapsed:7.2f}s  峰值内存 {peak / 1024 / 1024:9.1f}MB  合计 {total:,.2f}")
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式查询内存基准测试")
+    parser.add_argument("--rows", type=int, default=1000000, help="收款记录行数")
+    parser.add_argument("--batch-size", type=int, default=500, help="fetchmany 批大小")
+    args = parser.parse_args()
+
+    with temp_database() as db:
+        create_bench_contract(db)
+        print(f"正在写入 {args.rows:,} 行收款记录...")
+        seed_payments(db, args.rows)
+        service = PaymentService(db)
+        sql = "SELECT * FROM payment_records ORDER BY date DESC"
+
+        def legacy_load():
+            # 引入流式接口之前的做法：fetchall 得到字典列表，再整体转换为实体列表
+            rows = db.execute_query(sql)
+            records = [PaymentRecord(
+                date=datetime.datetime.strptime(row['date'], "%Y-%m-%d").date(),
+                amount=row['amount'],
+                contract_id=row['contract_id'],
+                payment_type=row['payment_type'],
+                id=row['id'],
+                created_by=row.get('created_by'),
+                created_at=datetime.datetime.fromisoformat(row['created_at']) if row.get('created_at') else None
+            ) for row in rows]
+            return sum(record.amount for record in records)
+
+        def list_load():
+            return sum(record.amount for record in service.get_payment_records())
+
+        def streaming():
+            return sum(record.amount for record in
+                       service.iter_payment_records(batch_size=args.batch_size))
+
+        legacy_peak = measure("全量加载（字典+实体）", legacy_load)
+        measure("get_payment_records()", list_load)
+        stream_peak = measure("iter_payment_records()", streaming)
+        print(f"✓ 流式处理峰值内存为全量加载的 {stream_peak / legacy_peak:.2%}")
+
+
+if __name__ == "__main__":
+    main()
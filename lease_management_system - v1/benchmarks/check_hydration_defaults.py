@@ -0,0 +1,57 @@
+"""
+批量构建的默认值检查：批量构建不调用 __post_init__，历史数据中为 NULL 的字段须与逐个构建时补的默认值一致
+（合同缺少创建时间时取当前时间）；覆盖按编号获取、获取全部、流式获取三条加载路径，
+并核对加载出的合同能正常转换为字典、按创建时间排序
+
+运行方式（在项目根目录）：
+    python -m benchmarks.check_hydration_defaults
+"""
+import datetime
+import sys
+from typing import List
+
+from benchmarks.common import temp_database, create_bench_contract
+from services.contract_service import ContractService
+
+NULL_CONTRACT = "BENCH-NULL"
+
+
+def main() -> int:
+    failures: List[str] = []
+    with temp_database(query_stats=False) as db:
+        create_bench_contract(db)
+        create_bench_contract(db, NULL_CONTRACT)
+        db.execute_command("UPDATE contracts SET create_time = NULL WHERE contract_id = ?", (NULL_CONTRACT,))
+
+        service = ContractService(db)
+        before = datetime.datetime.now()
+        loaded = {
+            "get_contract_by_id": [service.get_contract_by_id(NULL_CONTRACT)],
+            "get_all_contracts": service.get_all_contracts(),
+            "iter_contracts": list(service.iter_contracts()),
+        }
+        after = datetime.datetime.now()
+
+        for path, contracts in loaded.items():
+            contract = next((c for c in contracts if c is not None and c.contract_id == NULL_CONTRACT), None)
+            if contract is None:
+                failures.append(f"{path}: 未加载到创建时间为 NULL 的合同")
+                continue
+            if not isinstance(contract.create_time, datetime.datetime) or \
+                    not before <= contract.create_time <= after:
+                failures.append(f"{path}: create_time 应为加载时的当前时间，实际为 {contract.create_time!r}")
+                continue
+            try:
+                contract.to_dict()
+                sorted(contracts, key=lambda c: c.create_time, reverse=True)
+            except Exception as e:
+                failures.append(f"{path}: 转换为字典或按创建时间排序失败: {e}")
+
+    for failure in failures:
+        print(f"[FAIL] {failure}")
+    print(f"共检查 {len(loaded)} 条加载路径，失败 {len(failures)} 条")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+整数分金额迁移的等价性检查：在迁移前版本（v9）的数据库中写入 REAL 金额的历史数据，
+记录旧代码路径的输出（逐行金额、月度汇总、押金余额、记录 id 与关联），迁移到最新版本后逐项比对；
+同时统计旧的浮点 SUM 在多少个汇总值上出现了尾差
+
+运行方式（在项目根目录）：
+    python -m benchmarks.check_money_cents --contracts 200 --months 24
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.common import PROJECT_DIR  # noqa: F401  保证以脚本方式运行时能导入项目模块
+from config.settings import config
+from database.fixtures import PortfolioFixture
+from database.migrations import LEDGER_TABLES, run_migrations
+from database.summaries import MONEY_COLUMNS
+
+# 整数分迁移之前的表结构版本
+LEGACY_VERSION = 9
+
+
+def legacy_amount(rng: random.Random) -> float:
+    """两位小数的随机金额，包含 0.1/0.2/0.3 这类二进制浮点无法精确表示的尾数"""
+    return round(rng.choice([0.1, 0.2, 0.3, 0.07, 33.33, 99.99, 1234.56]) + rng.randrange(0, 2000000) / 100, 2)
+
+
+def write_legacy_data(conn: sqlite3.Connection, fixture: PortfolioFixture, seed: int):
+    """按 v9 表结构（金额为 REAL 列）写入合同及收款、押金、开票、开票详情、增值税记录"""
+    rng = random.Random(seed)
+    ends = fixture.month_ends()
+    with conn:
+        for n in range(fixture.contracts):
+            cid = fixture.contract_id(n)
+            conn.execute('''
+                INSERT INTO contracts (contract_id, customer_name, room_number, payment_name, eas_code,
+                                       created_by, contract_type)
+                VALUES (?, ?, ?, ?, ?, 'legacy', '新增')
+            ''', (cid, f"客户{n}", f"R-{n}", f"客户{n}", f"EAS-{n}"))
+            received = legacy_amount(rng)
+            conn.execute("INSERT INTO deposit_records (contract_id, date, amount, record_type, created_by) "
+                         "VALUES (?, ?, ?, '收取', 'legacy')", (cid, fixture.start.isoformat(), received))
+            for end in ends:
+                day = end.isoformat()
+                amount = legacy_amount(rng)
+                payment_id = conn.execute(
+                    "INSERT INTO payment_records (contract_id, date, amount, payment_type, created_by) "
+                    "VALUES (?, ?, ?, ?, 'legacy')", (cid, day, amount, rng.choice(["租金", "押金"]))).lastrowid
+                tax = round(amount / 1.05 * 0.05, 2)
+                invoice_number = f"LEG-{n:05d}-{day}"
+                conn.execute("INSERT INTO invoice_records (contract_id, date, amount, tax_amount, invoice_number, "
+                             "created_by) VALUES (?, ?, ?, ?, ?, 'legacy')", (cid, day, amount, tax, invoice_number))
+                conn.execute('''
+                    INSERT INTO invoice_details (invoice_number, contract_id, invoice_date, total_amount, vat_amount,
+                                                 relate_payment_id, relate_income_year, relate_income_month)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (invoice_number, cid, day, amount, tax, payment_id, end.year, end.month))
+                conn.execute("INSERT INTO vat_records (contract_id, relate_type, relate_id, vat_amount, "
+                             "tax_obligation_date) VALUES (?, 'payment', ?, ?, ?)", (cid, str(payment_id), tax, day))
+                if rng.random() < 0.1:
+                    returned = min(legacy_amount(rng), received)
+                    received = round(received - returned, 2)
+                    conn.execute("INSERT INTO deposit_records (contract_id, date, amount, record_type, created_by) "
+                                 "VALUES (?, ?, ?, '退还', 'legacy')", (cid, day, returned))
+        # 删除部分收款，使 AUTOINCREMENT 序列大于现存最大 id
+        conn.execute("DELETE FROM payment_records WHERE id IN (SELECT MAX(id) FROM payment_records)")
+
+
+def write_orphan_rows(conn: sqlite3.Connection) -> Dict[str, List[int]]:
+    """
+    模拟早期版本（未开启外键约束）删除合同后遗留的明细：租金期、收款、押金记录引用已不存在的合同，
+    另有开票详情关联其中的收款；迁移应删除明细表中的遗留行、置空关联，并且不因租金期中的遗留行失败
+    :return: 明细表 -> 遗留行 id（开票详情为应置空关联的行）
+    """
+    conn.execute("PRAGMA foreign_keys = OFF")
+    with conn:
+        cid = "LEG-DELETED"
+        conn.execute("INSERT INTO rent_periods (contract_id, start_date, end_date, monthly_rent) "
+                     "VALUES (?, '2023-01-01', '2023-12-31', 1000)", (cid,))
+        payment_id = conn.execute("INSERT INTO payment_records (contract_id, date, amount, payment_type, created_by) "
+                                  "VALUES (?, '2023-01-31', 1000, '租金', 'legacy')", (cid,)).lastrowid
+        deposit_id = conn.execute("INSERT INTO deposit_records (contract_id, date, amount, record_type, created_by) "
+                                  "VALUES (?, '2023-01-01', 2000, '收取', 'legacy')", (cid,)).lastrowid
+        # 现存合同的开票详情关联该收款：收款被删除时关联应置空
+        owner = conn.execute("SELECT contract_id FROM contracts ORDER BY contract_id LIMIT 1").fetchone()[0]
+        detail_id = conn.execute('''
+            INSERT INTO invoice_details (invoice_number, contract_id, invoice_date, total_amount, vat_amount,
+                                         relate_payment_id)
+            VALUES (?, ?, '2023-01-31', 1000, 47.62, ?)
+        ''', (f"{cid}-1", owner, payment_id)).lastrowid
+    conn.execute("PRAGMA foreign_keys = ON")
+    return {"payment_records": [payment_id], "deposit_records": [deposit_id], "invoice_details": [detail_id]}
+
+
+def snapshot(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """迁移前后都可执行的输出：逐行金额（按元读取）、记录 id、关联、AUTOINCREMENT 序列"""
+    def rows(sql: str, params: tuple = ()) -> List[tuple]:
+        return [tuple(row) for row in conn.execute(sql, params)]
+
+    result: Dict[str, Any] = {}
+    for table in LEDGER_TABLES:
+        result[table] = rows(f"SELECT id, {', '.join(MONEY_COLUMNS[table])} FROM {table} ORDER BY id")
+    result["relations"] = rows("SELECT id, relate_payment_id FROM invoice_details ORDER BY id")
+    placeholders = ", ".join("?" * len(LEDGER_TABLES))
+    result["sequence"] = sorted(rows(f"SELECT name, seq FROM sqlite_sequence WHERE name IN ({placeholders})",
+                                     LEDGER_TABLES))
+    return result
+
+
+def legacy_summaries(conn: sqlite3.Connection) -> Tuple[Dict[Tuple, float], Dict[str, float]]:
+    """迁移前的代码路径：浮点汇总列按月 SUM，押金余额读取 REAL 余额列（已删除合同的遗留行不计）"""
+    existing = "contract_id IN (SELECT contract_id FROM contracts)"
+    totals: Dict[Tuple, float] = {}
+    for table, key in (("payment_monthly_summary", "payment_type"), ("deposit_monthly_summary", "record_type")):
+        for yyyymm, kind, total in conn.execute(
+                f"SELECT yyyymm, {key}, SUM(total_amount) FROM {table} WHERE {existing} GROUP BY yyyymm, {key}"):
+            totals[(table, yyyymm, kind)] = total
+    for yyyymm, total, tax in conn.execute(
+            f"SELECT yyyymm, SUM(total_amount), SUM(total_tax) FROM invoice_monthly_summary WHERE {existing} "
+            f"GROUP BY yyyymm"):
+        totals[("invoice_monthly_summary", yyyymm, "amount")] = total
+        totals[("invoice_monthly_summary", yyyymm, "tax")] = tax
+    balances = dict(conn.execute(f"SELECT contract_id, balance FROM deposit_balances WHERE {existing}"))
+    return totals, balances
+
+
+def current_summaries(db) -> Tuple[Dict[Tuple, float], Dict[str, float]]:
+    """迁移后的代码路径：PaymentService 按整数分汇总"""
+    from services.payment_service import PaymentService
+
+    service = PaymentService(db)
+    totals: Dict[Tuple, float] = {}
+    months = [row[0] for row in db.execute_query(
+        "SELECT DISTINCT yyyymm FROM payment_records ORDER BY 1", row_mode="tuple")]
+    for yyyymm in months:
+        year, month = divmod(yyyymm, 100)
+        summary = service.get_monthly_summary(year, month)
+        for kind, total in summary["payments"].items():
+            totals[("payment_monthly_summary", yyyymm, kind)] = total
+        for kind, total in summary["deposits"].items():
+            totals[("deposit_monthly_summary", yyyymm, kind)] = total
+        totals[("invoice_monthly_summary", yyyymm, "amount")] = summary["invoices"]["total_amount"]
+        totals[("invoice_monthly_summary", yyyymm, "tax")] = summary["invoices"]["total_tax"]
+    return totals, service.get_deposit_balances(include_zero=True)
+
+
+def compare(label: str, expected: Dict, actual: Dict, failures: List[str]) -> int:
+    """按两位小数比较旧输出与新输出，返回旧浮点值带有尾差的数量"""
+    drift = 0
+    if expected.keys() != actual.keys():
+        failures.append(f"{label}: 键不一致（迁移前 {len(expected)} 项，迁移后 {len(actual)} 项）")
+    for key, old in expected.items():
+        new = actual.get(key)
+        if old is not None and old != round(old, 2):
+            drift += 1
+        if new is None or round(old or 0, 2) != new:
+            failures.append(f"{label} {key}: 迁移前 {old!r}，迁移后 {new!r}")
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description="整数分金额迁移等价性检查")
+    parser.add_argument("--contracts", type=int, default=200, help="合同数")
+    parser.add_argument("--months", type=int, default=24, help="每份合同的月数")
+    parser.add_argument("--seed", type=int, default=7, help="随机数种子")
+    args = parser.parse_args()
+
+    from database.manager import DatabaseManager
+
+    tmp_dir = tempfile.mkdtemp(prefix="lease_money_")
+    path = os.path.join(tmp_dir, "legacy.db")
+    saved = (config.database.db_name, config.database.maintenance_enabled)
+    failures: List[str] = []
+    try:
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("PRAGMA foreign_keys = ON")
+        run_migrations(conn, LEGACY_VERSION)
+        write_legacy_data(conn, PortfolioFixture(args.contracts, args.months, prefix="LEG"), args.seed)
+        orphans = write_orphan_rows(conn)
+        before = snapshot(conn)
+        legacy_totals, legacy_balances = legacy_summaries(conn)
+        conn.close()
+        # 已删除合同遗留的明细在迁移中被删除、关联被置空
+        for table in ("payment_records", "deposit_records"):
+            before[table] = [row for row in before[table] if row[0] not in orphans[table]]
+        before["relations"] = [(row[0], None) if row[0] in orphans["invoice_details"] else row
+                               for row in before["relations"]]
+        rows = sum(len(before[table]) for table in LEDGER_TABLES)
+        print(f"已按 v{LEGACY_VERSION} 表结构写入 {rows:,} 行 REAL 金额记录")
+
+        config.database.db_name, config.database.maintenance_enabled = path, False
+        db = DatabaseManager()
+        try:
+            with db.transaction() as migrated:
+                after = snapshot(migrated)
+                violations = [row for table in LEDGER_TABLES
+                              for row in migrated.execute(f"PRAGMA foreign_key_check({table})").fetchall()]
+                orphan_periods = migrated.execute(
+                    "SELECT COUNT(*) FROM rent_periods WHERE contract_id = 'LEG-DELETED'").fetchone()[0]
+            totals, balances = current_summaries(db)
+        finally:
+            db.close()
+
+        for key in before:
+            if before[key] != after[key]:
+                failures.append(f"{key}: 迁移前后逐行结果不一致")
+        if violations:
+            failures.append(f"明细表外键不一致 {len(violations)} 处")
+        if orphan_periods != 1:
+            failures.append("租金期中早期版本遗留的行不应被明细表迁移改动")
+        drift = compare("月度汇总", legacy_totals, totals, failures)
+        compare("押金余额", legacy_balances, balances, failures)
+        print(f"逐行金额、记录 id、发票与收款关联、AUTOINCREMENT 序列：{'一致' if not failures else '见下'}")
+        print(f"月度汇总 {len(legacy_totals)} 项、押金余额 {len(legacy_balances)} 项与迁移前（两位小数）比对完成；"
+              f"迁移前的浮点 SUM 有 {drift} 项带有尾差，迁移后按整数分求和无尾差")
+    finally:
+        config.database.db_name, config.database.maintenance_enabled = saved
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for failure in failures[:20]:
+        print("  不一致:", failure)
+    print(f"共 {len(failures)} 处不一致")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+热点 SQL 执行计划回归检查：在合成的合同组合上对热点模块中的每条语句执行 EXPLAIN QUERY PLAN，
+语句对大表退化为全表扫描（SCAN）或无法解析时以非零状态退出
+
+运行方式（在项目根目录）：
+    python -m benchmarks.check_query_plans
+    python -m benchmarks.check_query_plans --contracts 1000 --months 36 --verbose
+"""
+import argparse
+import ast
+import datetime
+import os
+import re
+import sqlite3
+import sys
+from typing import Dict, Iterator, List, Tuple
+
+from benchmarks.common import PROJECT_DIR, temp_database, seed_portfolio
+from services.payment_service import PaymentService, PAYMENT_HYDRATOR, DEPOSIT_HYDRATOR, INVOICE_HYDRATOR
+
+# 需要检查的热点模块
+HOT_SQL_FILES = [
+    "services/contract_service.py",
+    "services/payment_service.py",
+    "services/portfolio_service.py",
+    "lease_accounting/core.py",
+    "lease_accounting/vat_tab.py",
+]
+
+# 有意读取整表的语句（列表展示/导出），按归一化后的语句前缀放行
+ALLOWED_SCANS: Dict[str, str] = {
+    "SELECT * FROM contracts ORDER BY create_time DESC": "合同列表按创建时间整表展示",
+    "SELECT contract_id, customer_name, room_number, tax_rate, need_adjust_income, is_effective, total_rent, "
+    "initial_total_rent FROM contracts ORDER BY contract_id": "合同组合快照整表读取",
+    "SELECT contract_id, start_date_ord, end_date_ord, monthly_rent FROM rent_periods": "合同组合快照整表读取",
+    "SELECT contract_id, start_date_ord, end_date_ord FROM free_periods": "合同组合快照整表读取",
+    "SELECT DISTINCT contract_id FROM vat_records WHERE relate_type = 'overpaid' AND status = 'pending'":
+        "组合核算只扫描待缴记录的部分索引",
+}
+
+# 允许语句前出现误写入字符串的 # 注释行，以便报告为无法解析
+_SQL_START_RE = re.compile(r"^\s*(?:#[^\n]*\n\s*)*(SELECT|INSERT|UPDATE|DELETE|WITH)\s+\S", re.I)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_TABLE_ALIAS_RE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+_SCAN_RE = re.compile(r"^SCAN (\w+)")
+_KEYWORDS = {"WHERE", "LEFT", "INNER", "JOIN", "ON", "ORDER", "GROUP", "LIMIT", "SET", "VALUES", "USING"}
+
+
+def normalize(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def extract_statements(relative_path: str) -> Iterator[Tuple[str, int, str]]:
+    """从模块源码中提取 SQL 字符串字面量：(位置, 行号, 语句)"""
+    with open(os.path.join(PROJECT_DIR, relative_path), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), relative_path)
+    # f-string 的片段不是完整语句，由 dynamic_statements 覆盖
+    fragments = {id(part) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for part in node.values}
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Constant) and isinstance(node.value, str)
+                and id(node) not in fragments and _SQL_START_RE.match(node.value)):
+            yield relative_path, node.lineno, node.value
+
+
+def dynamic_statements(db) -> Iterator[Tuple[str, int, str]]:
+    """运行时拼接的语句：收款/押金/开票记录查询的各种过滤组合"""
+    service = PaymentService(db)
+    day = datetime.date(2024, 1, 1)
+    for table, hydrator in (("payment_records", PAYMENT_HYDRATOR), ("deposit_records", DEPOSIT_HYDRATOR),
+                            ("invoice_records", INVOICE_HYDRATOR)):
+        for contract_id, start, end in (("C", None, None), (None, day, day), ("C", day, day)):
+            sql, _ = service._build_record_query(table, hydrator.columns, contract_id, start, end)
+            yield "services/payment_service.py", 0, sql
+
+
+def placeholder_count(sql: str) -> int:
+    """语句中的 ? 占位符个数（忽略字符串字面量中的问号）"""
+    return _STRING_RE.sub("", sql).count("?")
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """别名 -> 表名（表名本身也映射到自身）"""
+    aliases = {}
+    for table, alias in _TABLE_ALIAS_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def large_tables(conn: sqlite3.Connection, min_rows: int) -> Dict[str, int]:
+    """行数达到阈值的表"""
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+    return {table: count for table, count in counts.items() if count >= min_rows}
+
+
+def check_statement(conn: sqlite3.Connection, sql: str, large: Dict[str, int]) -> Tuple[List[str], List[str]]:
+    """返回 (执行计划, 问题列表)"""
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * placeholder_count(sql)).fetchall()
+    except sqlite3.Error as e:
+        return [], [f"语句无法解析: {str(e)}"]
+    plan = [row[3] for row in rows]
+    aliases = table_aliases(sql)
+    problems = []
+    for detail in plan:
+        match = _SCAN_RE.match(detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in large:
+            problems.append(f"全表扫描 {table}（{large[table]:,} 行）: {detail}")
+    return plan, problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="热点 SQL 执行计划回归检查")
+    parser.add_argument("--contracts", type=int, default=500, help="合成合同数")
+    parser.add_argument("--months", type=int, default=24, help="每份合同的月份数")
+    parser.add_argument("--min-rows", type=int, default=1000, help="视为大表的最小行数")
+    parser.add_argument("--verbose", action="store_true", help="输出每条语句的执行计划")
+    args = parser.parse_args()
+
+    with temp_database(query_stats=False) as db:
+        print(f"正在写入合成数据：{args.contracts} 份合同 × {args.months} 个月...")
+        seed_portfolio(db, args.contracts, args.months)
+
+        statements = [stmt for path in HOT_SQL_FILES for stmt in extract_statements(path)]
+        statements.extend(dynamic_statements(db))
+
+        failures = 0
+        with db.get_connection() as conn:
+            large = large_tables(conn, args.min_rows)
+            for path, lineno, sql in statements:
+                text = normalize(sql)
+                plan, problems = check_statement(conn, sql, large)
+                allowed = next((reason for prefix, reason in ALLOWED_SCANS.items() if text.startswith(prefix)), None)
+                if problems and allowed:
+                    status = f"放行（{allowed}）"
+                elif problems:
+                    status = "失败"
+                    failures += 1
+                else:
+                    status = "通过"
+                location = f"{path}:{lineno}" if lineno else f"{path}（动态）"
+                if problems or args.verbose:
+                    print(f"[{status}] {location}\n    {text[:160]}")
+                    for line in plan:
+                        print(f"      {line}")
+                    for problem in problems:
+                        print(f"    ! {problem}")
+
+    print(f"共检查 {len(statements)} 条语句，失败 {failures} 条")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
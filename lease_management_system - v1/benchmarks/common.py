@@ -0,0 +1,95 @@
+"""
+基准测试公共工具
+"""
+import atexit
+import os
+import sys
+import shutil
+import datetime
+import tempfile
+from contextlib import contextmanager
+from typing import Optional
+
+# 允许以 python benchmarks/xxx.py 方式直接运行
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+from config.settings import config
+
+# 基准测试的运行日志写入临时目录，进程结束时删除，不在项目的 logs/ 目录中留下输出
+# （各基准脚本先导入本模块，此时尚未创建任何日志器）
+BENCH_LOG_DIR = tempfile.mkdtemp(prefix="lease_bench_logs_")
+config.logging.log_dir = BENCH_LOG_DIR
+atexit.register(shutil.rmtree, BENCH_LOG_DIR, ignore_errors=True)
+
+
+@contextmanager
+def temp_database(**overrides):
+    """
+    在临时目录中创建独立的数据库，结束后自动清理
+    :param overrides: 需要临时覆盖的 DatabaseConfig 字段
+    """
+    from database.manager import DatabaseManager
+
+    tmp_dir = tempfile.mkdtemp(prefix="lease_bench_")
+    saved = {"db_name": config.database.db_name}
+    saved.update({key: getattr(config.database, key) for key in overrides})
+    config.database.db_name = os.path.join(tmp_dir, "bench.db")
+    for key, value in overrides.items():
+        setattr(config.database, key, value)
+
+    db = DatabaseManager()
+    try:
+        yield db
+    finally:
+        db.close()
+        for key, value in saved.items():
+            setattr(config.database, key, value)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@contextmanager
+def memory_database(seed: Optional[str] = None, **overrides):
+    """
+    创建进程内的内存数据库，不读写任何数据库文件，结束后随连接关闭而销毁
+    :param seed: 启动时载入的快照（数据库文件或备份清单）
+    :param overrides: 需要临时覆盖的 DatabaseConfig 字段
+    """
+    from database.manager import DatabaseManager
+
+    overrides = dict(overrides, in_memory=True, memory_seed=seed)
+    saved = {key: getattr(config.database, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(config.database, key, value)
+    try:
+        db = DatabaseManager()
+    finally:
+        for key, value in saved.items():
+            setattr(config.database, key, value)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def create_bench_contract(db, contract_id: str = "BENCH-001"):
+    """插入一份用于基准测试的最小合同"""
+    db.execute_command('''
+        INSERT INTO contracts (contract_id, customer_name, room_number, payment_name,
+                               eas_code, created_by, contract_type)
+        VALUES (?, ?, ?, ?, ?, ?, '新增')
+    ''', (contract_id, "基准客户", "B-101", "基准客户", "EAS-BENCH", "bench"))
+
+
+def seed_portfolio(db, contracts: int = 500, months: int = 24, start: datetime.date = datetime.date(2023, 1, 1)):
+    """写入一份合成的合同组合（见 database.fixtures.PortfolioFixture），单个事务批量写入"""
+    from database.fixtures import PortfolioFixture, load_portfolio
+
+    return load_portfolio(db, PortfolioFixture(contracts=contracts, months=months, start=start))
+
+
+def format_rate(elapsed: float, count: int) -> str:
+    """格式化耗时与单次平均耗时"""
+    per_call = elapsed / count * 1_000_000 if count else 0.0
+    return f"共 {elapsed:.3f}s，单次 {per_call:.1f}μs"
@@ -3,19 +3,63 @@
 """
 import os
 from dataclasses import dataclass,field
-from typing import List
+from typing import Any, Dict, List, Optional
 
 
 @dataclass
 class DatabaseConfig:
     """数据库配置"""
     db_name: str = "lease.db"
+    in_memory: bool = False                   # 使用进程内的内存数据库（基准测试/测试用，不读写 db_name）
+    memory_seed: Optional[str] = None         # 内存数据库启动时载入的快照（数据库文件或备份清单）
     backup_dir: str = "backups"
     max_backups: int = 30
+    backup_pages_per_step: int = 1024         # 在线备份每步复制的页数，步间释放读锁
+    backup_dedup: bool = True                 # 备份写入按内容去重的压缩仓库（否则保存完整副本）
+    backup_chunk_pages: int = 16              # 去重仓库每个数据块包含的页数
+    backup_compression: str = "lzma"          # 数据块压缩方式：lzma 或 gzip
+    archive_dir: str = "archives"             # 历史归档库 lease_archive_YYYY.db 的存放目录
+    archive_mmap_size: int = 268435456        # 只读附加归档库时的内存映射大小
+    pool_size: int = 5                        # 持久连接数上限（每线程一个）
+    pool_health_check_interval: float = 30.0  # 连接空闲超过该秒数后复用前检查
+    apply_pragmas: bool = True                # 是否在每个新连接上应用下方的 PRAGMA 配置
+    # 连接级 PRAGMA 配置，按顺序执行（busy_timeout 需先于 journal_mode 生效）
+    pragmas: Dict[str, Any] = field(default_factory=lambda: {
+        "busy_timeout": 5000,        # 锁等待 5 秒
+        "auto_vacuum": "INCREMENTAL",  # 新库建表前生效；已有库在整理数据库（VACUUM）后生效
+        "journal_mode": "WAL",       # 读写互不阻塞
+        "synchronous": "NORMAL",     # WAL 下仅在检查点时 fsync
+        "cache_size": -65536,        # 负值单位为 KB，即 64MB
+        "mmap_size": 268435456,      # 256MB 内存映射
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    })
+    audit_async: bool = True                  # 操作日志是否由后台线程批量写入
+    audit_batch_size: int = 200               # 每批写入的最大日志条数
+    audit_flush_interval: float = 0.5         # 攒批等待上限（秒），即日志写入的最大延迟
+    audit_queue_size: int = 10000             # 日志队列容量，满时退化为同步写入
+    log_retention_months: int = 12            # 操作日志保留月数，更早的月份分区整表导出后删除
+    log_export_dir: str = "log_exports"       # 删除前导出的操作日志（JSONL.gz）存放目录
+    query_stats: bool = True                  # 是否按语句指纹统计查询耗时与行数
+    slow_query_ms: float = 200.0              # 慢查询阈值（毫秒），超过时记录语句及执行计划
+    slow_query_explain: bool = True           # 慢查询日志是否附带 EXPLAIN QUERY PLAN
+    query_stats_top_n: int = 20               # 查询统计报表默认输出条数
+    maintenance_enabled: bool = True          # 是否由后台线程按计划执行数据库维护
+    maintenance_tick: float = 60.0            # 检查到期维护任务的间隔（秒）
+    maintenance_budget: float = 2.0           # 单项维护任务的执行时间上限（秒），超时中断
+    analyze_interval: float = 3600.0          # 定期 ANALYZE 的间隔（秒）
+    analysis_limit: int = 1000                # ANALYZE 每个索引抽样的最大行数（0 为全量）
+    vacuum_interval: float = 600.0            # 增量回收空闲页的间隔（秒）
+    vacuum_step_pages: int = 256              # 每批回收的空闲页数（每批一个短事务）
+    vacuum_min_free_pages: int = 64           # 空闲页少于该数时不回收
+    checkpoint_interval: float = 60.0         # 检查 WAL 大小的间隔（秒）
+    checkpoint_passive_bytes: int = 16 * 1024 * 1024   # WAL 超过该大小时执行 PASSIVE 检查点
+    checkpoint_truncate_bytes: int = 64 * 1024 * 1024  # WAL 超过该大小时执行 TRUNCATE 检查点
+    fragmentation_interval: float = 86400.0   # 碎片统计的间隔（秒）
     
     @property
     def db_path(self) -> str:
-        return os.path.abspath(self.db_name)
+        return ":memory:" if self.in_memory else os.path.abspath(self.db_name)
 
 
 @dataclass
@@ -58,11 +102,6 @@ class SystemConfig:
     logging: LoggingConfig = field(default_factory=LoggingConfig)
     ui: UIConfig = field(default_factory=UIConfig)
     business: BusinessConfig = field(default_factory=BusinessConfig)
-    
-    def __post_init__(self):
-        """初始化后创建必要的目录"""
-        os.makedirs(self.logging.log_dir, exist_ok=True)
-        os.makedirs(self.database.backup_dir, exist_ok=True)
 
 
 # 全局配置实例
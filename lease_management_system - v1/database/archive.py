@@ -0,0 +1,335 @@
+"""
+历史归档模块 - 把已结束的合同及其全部子表记录移入按年份划分的归档库（lease_archive_YYYY.db），
+报表需要历史区间时以只读、内存映射方式 ATTACH 归档库，语句中的表名透明地改写为合并主库与归档库的临时视图
+"""
+import datetime
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from database.rows import RowMode, column_names, convert_rows, row_converter
+from database.summaries import derived_column
+from utils.logging import get_logger
+
+logger = get_logger("ArchiveManager")
+
+ARCHIVE_PREFIX = "lease_archive_"
+ARCHIVE_SUFFIX = ".db"
+ROOT_TABLE = "contracts"
+# SQLite 默认最多同时附加 10 个数据库
+MAX_ATTACHED = 10
+
+_TABLE_REF_RE = re.compile(r"\b(FROM|JOIN)\s+(?:main\.)?(\w+)\b", re.I)
+_INDEX_RE = re.compile(r"^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(\w+)", re.I)
+
+
+class ArchiveManager:
+    """
+    归档库管理
+    合同以最后一个租金期的结束日期判定是否已结束，按结束年份归入对应的归档库；
+    先把数据复制进归档库并提交，再在主库中核对行数后删除，任一步失败都不会丢失数据
+    """
+
+    def __init__(self, db, archive_dir: str, mmap_size: int = 268435456):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.mmap_size = mmap_size
+        self._last_dates: Dict[str, Tuple[float, Optional[str]]] = {}
+
+    def archive_path(self, year: int) -> str:
+        return os.path.join(self.archive_dir, f"{ARCHIVE_PREFIX}{year}{ARCHIVE_SUFFIX}")
+
+    def list_archives(self) -> Dict[int, str]:
+        """已有的归档库：年份 -> 路径"""
+        if not os.path.isdir(self.archive_dir):
+            return {}
+        archives = {}
+        for name in os.listdir(self.archive_dir):
+            year = name[len(ARCHIVE_PREFIX):-len(ARCHIVE_SUFFIX)]
+            if name.startswith(ARCHIVE_PREFIX) and name.endswith(ARCHIVE_SUFFIX) and year.isdigit():
+                archives[int(year)] = os.path.join(self.archive_dir, name)
+        return dict(sorted(archives.items()))
+
+    def archived_tables(self, conn: sqlite3.Connection) -> List[str]:
+        """随合同一起归档的表：contracts 及所有以 ON DELETE CASCADE 外键引用它的子表（按建表顺序）"""
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM main.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid")]
+        children = [table for table in tables if any(
+            fk[2] == ROOT_TABLE and fk[6].upper() == "CASCADE"
+            for fk in conn.execute(f"PRAGMA main.foreign_key_list({table})"))]
+        return [ROOT_TABLE] + [table for table in children if table != ROOT_TABLE]
+
+    def find_expired(self, cutoff: datetime.date) -> Dict[int, List[str]]:
+        """
+        查找在 cutoff 之前结束、可以归档的合同，按结束年份分组
+        仍有待缴增值税的合同、仍被未归档合同引用为原合同的合同暂不归档
+        """
+        sql = '''
+            SELECT c.contract_id, MAX(rp.end_date) AS end_date
+            FROM contracts c
+            JOIN rent_periods rp ON rp.contract_id = c.contract_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM vat_records vr
+                WHERE vr.contract_id = c.contract_id AND vr.status = 'pending'
+            )
+            GROUP BY c.contract_id
+            HAVING MAX(rp.end_date) < ?
+        '''
+        rows = self.db.execute_query(sql, (cutoff.strftime("%Y-%m-%d"),), row_mode=RowMode.TUPLE)
+        expired = {contract_id: end_date for contract_id, end_date in rows}
+
+        # 续租/变更合同通过 original_contract_id 引用原合同，原合同须与引用它的合同一起归档
+        references = self.db.execute_query(
+            "SELECT contract_id, original_contract_id FROM contracts WHERE original_contract_id IS NOT NULL",
+            row_mode=RowMode.TUPLE)
+        changed = True
+        while changed:
+            changed = False
+            for contract_id, original_id in references:
+                if original_id in expired and contract_id not in expired:
+                    del expired[original_id]
+                    changed = True
+
+        groups: Dict[int, List[str]] = {}
+        for contract_id, end_date in expired.items():
+            groups.setdefault(int(str(end_date)[:4]), []).append(contract_id)
+        return groups
+
+    def archive_contracts(self, cutoff: datetime.date, user: Optional[str] = None) -> Dict[int, int]:
+        """
+        把 cutoff 之前结束的合同连同全部子表记录移入归档库
+        :return: 年份 -> 归档的合同数；失败的年份不计入
+        """
+        groups = self.find_expired(cutoff)
+        if not groups:
+            logger.info(f"没有 {cutoff} 之前结束的可归档合同")
+            return {}
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        result = {}
+        for year, contract_ids in sorted(groups.items()):
+            started = time.perf_counter()
+            try:
+                rows = self._move_contracts(year, contract_ids)
+            except Exception as e:
+                logger.error(f"归档 {year} 年结束的合同失败: {str(e)}")
+                continue
+            result[year] = len(contract_ids)
+            logger.info(f"已归档 {year} 年结束的合同 {len(contract_ids)} 份（共 {rows} 行），"
+                        f"耗时 {time.perf_counter() - started:.2f}s -> {self.archive_path(year)}")
+            if user:
+                self.db.log_operation(user, 'archive', 'contract', str(year),
+                                      f'归档{cutoff}之前结束的合同{len(contract_ids)}份')
+        return result
+
+    def _move_contracts(self, year: int, contract_ids: List[str]) -> int:
+        """复制到归档库并提交，核对行数后再从主库删除；返回移动的总行数"""
+        path = self.archive_path(year)
+        with self.db.get_connection() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (contract_id TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.archive_batch")
+            conn.executemany("INSERT INTO temp.archive_batch VALUES (?)", [(cid,) for cid in contract_ids])
+            conn.commit()
+            conn.execute("ATTACH DATABASE ? AS archive", (self.db.attach_target(path),))
+            try:
+                tables = self.archived_tables(conn)
+                batch = "contract_id IN (SELECT contract_id FROM temp.archive_batch)"
+
+                # 第一步：写入归档库（先删后插，重复执行结果一致）
+                with self.db.transaction():
+                    columns = {table: self._sync_schema(conn, table) for table in tables}
+                    for table in reversed(tables):
+                        conn.execute(f"DELETE FROM archive.{table} WHERE {batch}")
+                    for table in tables:
+                        column_list = ", ".join(columns[table])
+                        conn.execute(f"INSERT INTO archive.{table} ({column_list}) "
+                                     f"SELECT {column_list} FROM main.{table} WHERE {batch}")
+                    self._update_last_date(conn, tables)
+
+                # 第二步：持有写锁核对两边行数，一致才从主库删除（期间新写入的记录会使核对失败）
+                total = 0
+                with self.db.transaction():
+                    for table in tables:
+                        live = conn.execute(f"SELECT COUNT(*) FROM main.{table} WHERE {batch}").fetchone()[0]
+                        archived = conn.execute(f"SELECT COUNT(*) FROM archive.{table} WHERE {batch}").fetchone()[0]
+                        if live != archived:
+                            raise RuntimeError(f"{table} 行数不一致（主库 {live}，归档库 {archived}），已取消删除")
+                        total += live
+                    for table in reversed(tables):
+                        conn.execute(f"DELETE FROM main.{table} WHERE {batch}")
+                return total
+            finally:
+                conn.execute("DETACH DATABASE archive")
+                conn.execute("DROP TABLE IF EXISTS temp.archive_batch")
+
+    @staticmethod
+    def _update_last_date(conn: sqlite3.Connection, tables: List[str]):
+        """记录归档库中所有 DATE 类型列的最大值，供历史查询判断是否需要附加该库"""
+        dates = []
+        for table in tables:
+            for row in conn.execute(f"PRAGMA archive.table_info({table})").fetchall():
+                if row[2].upper() == "DATE":
+                    dates.append(conn.execute(f"SELECT MAX({row[1]}) FROM archive.{table}").fetchone()[0])
+        dates = [str(value) for value in dates if value]
+        conn.execute("CREATE TABLE IF NOT EXISTS archive.archive_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("INSERT OR REPLACE INTO archive.archive_meta (key, value) VALUES ('last_date', ?)",
+                     (max(dates) if dates else None,))
+
+    def _sync_schema(self, conn: sqlite3.Connection, table: str) -> List[str]:
+        """
+        让归档库中的表包含主库表的全部列：不存在时按主库列建表并复制索引，主库新增的列补到归档表；
+        生成列在归档库中存为普通列。返回需要复制的列名
+        """
+        # table_xinfo 的 hidden：0 普通列，2/3 生成列
+        columns = [(row[1], row[2]) for row in conn.execute(f"PRAGMA main.table_xinfo({table})") if row[6] != 1]
+        existing = {row[1] for row in conn.execute(f"PRAGMA archive.table_info({table})")}
+        if not existing:
+            definitions = ", ".join(f"{name} {col_type}".strip() for name, col_type in columns)
+            conn.execute(f"CREATE TABLE archive.{table} ({definitions})")
+            for (sql,) in conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'index' "
+                                       "AND tbl_name = ? AND sql IS NOT NULL", (table,)).fetchall():
+                # 唯一约束在主库中已保证，归档库统一建普通索引
+                match = _INDEX_RE.match(sql)
+                if match:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS archive.{match.group(2)}{sql[match.end(2):]}")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_{table}_archive_contract ON {table} (contract_id)")
+        else:
+            for name, col_type in columns:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {col_type}".strip())
+                    derived = derived_column(table, name)
+                    if derived is not None:
+                        # 早于该列归档的记录（月份、整数分金额）按同表的原有列回填
+                        conn.execute(f"UPDATE archive.{table} SET {name} = {derived}")
+        return [name for name, _ in columns]
+
+    def last_record_date(self, path: str) -> Optional[str]:
+        """归档库中最晚的日期（归档时记录在 archive_meta 中），按文件修改时间缓存"""
+        mtime = os.path.getmtime(path)
+        cached = self._last_dates.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM archive_meta WHERE key = 'last_date'").fetchone()
+        except sqlite3.Error:
+            row = None
+        finally:
+            conn.close()
+        value = row[0] if row else None
+        self._last_dates[path] = (mtime, value)
+        return value
+
+    def years_for_range(self, start_date: Optional[datetime.date]) -> List[int]:
+        """
+        查询 start_date 之后的记录需要附加的归档年份：
+        跳过最晚日期早于 start_date 的归档库（合同结束后仍可能有退押金等记录，不能只按结束年份判断）
+        """
+        archives = self.list_archives()
+        if start_date is None:
+            return list(archives)
+        start = start_date.strftime("%Y-%m-%d")
+        years = []
+        for year, path in archives.items():
+            last_date = self.last_record_date(path)
+            if last_date is None or last_date >= start:
+                years.append(year)
+        return years
+
+    @contextmanager
+    def historical_connection(self, start_date: Optional[datetime.date] = None) -> Iterator[sqlite3.Connection]:
+        """
+        只读历史查询连接：主库与所需归档库都以只读方式打开，归档库启用内存映射，
+        并为每个归档表建立 TEMP 视图 all_<表名> = 主库 UNION ALL 各归档库
+        :raises ValueError: 所需归档库数量超过 SQLite 可附加的上限
+        """
+        years = self.years_for_range(start_date)
+        if len(years) > MAX_ATTACHED - 1:
+            raise ValueError(f"查询区间涉及 {len(years)} 个归档库，超过上限 {MAX_ATTACHED - 1}，请缩小日期范围")
+        conn = sqlite3.connect(self.db.readonly_uri(), uri=True, check_same_thread=False)
+        try:
+            conn.row_factory = sqlite3.Row
+            for year in years:
+                schema = f"archive_{year}"
+                target = self.db.attach_target(self.archive_path(year), read_only=True)
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (target,))
+                conn.execute(f"PRAGMA {schema}.mmap_size = {int(self.mmap_size)}").fetchall()
+            self._create_union_views(conn, [f"archive_{year}" for year in years])
+            yield conn
+        finally:
+            conn.close()
+
+    def _create_union_views(self, conn: sqlite3.Connection, schemas: List[str]) -> List[str]:
+        """按主库的列建立 all_<表名> 视图（归档库中缺少的列按原有列推算，无法推算的以 NULL 补齐），返回建立了视图的表名"""
+        tables = self.archived_tables(conn)
+        for table in tables:
+            columns = [row[1] for row in conn.execute(f"PRAGMA main.table_xinfo({table})") if row[6] != 1]
+            parts = [f"SELECT {', '.join(columns)} FROM main.{table}"]
+            for schema in schemas:
+                existing = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+                if not existing:
+                    continue
+                select_list = ", ".join(name if name in existing else f"{derived_column(table, name) or 'NULL'} AS {name}"
+                                        for name in columns)
+                parts.append(f"SELECT {select_list} FROM {schema}.{table}")
+            conn.execute(f"CREATE TEMP VIEW all_{table} AS {' UNION ALL '.join(parts)}")
+        return tables
+
+    @staticmethod
+    def rewrite(sql: str, tables: List[str]) -> str:
+        """把语句中 FROM/JOIN 引用的归档表替换为对应的 all_<表名> 视图（列须通过别名或不带表名引用）"""
+        names = set(tables)
+        return _TABLE_REF_RE.sub(
+            lambda m: f"{m.group(1)} all_{m.group(2)}" if m.group(2) in names else m.group(0), sql)
+
+    def execute_query(self, sql: str, params: tuple = (), start_date: Optional[datetime.date] = None,
+                      row_mode: Union[RowMode, str] = RowMode.DICT,
+                      row_type: Optional[type] = None) -> Union[List[Any], Dict[str, List[Any]]]:
+        """
+        在历史查询连接上执行查询：语句照常引用主库表名，自动改写为包含归档数据的视图；失败返回空结果
+        :param start_date: 查询区间起点，用于只附加可能包含该区间记录的归档库（None 表示全部）
+        """
+        mode = RowMode(row_mode)
+        started = time.perf_counter()
+        try:
+            with self.historical_connection(start_date) as conn:
+                sql = self.rewrite(sql, self.archived_tables(conn))
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                self.db.profiler.record(sql, params, time.perf_counter() - started, len(rows), conn)
+                return convert_rows(mode, column_names(cursor), rows, row_type)
+        except Exception as e:
+            logger.error(f"历史查询失败: SQL={sql}, 参数={params}, 错误={str(e)}")
+            return {} if mode is RowMode.COLUMNAR else []
+
+    def iter_query(self, sql: str, params: tuple = (), start_date: Optional[datetime.date] = None,
+                   batch_size: int = 500, row_mode: Union[RowMode, str] = RowMode.DICT,
+                   row_type: Optional[type] = None) -> Iterator[Any]:
+        """流式执行历史查询，用法同 DatabaseManager.iter_query"""
+        mode = RowMode(row_mode)
+        if mode is RowMode.COLUMNAR:
+            raise ValueError("历史查询的流式接口不支持 COLUMNAR 模式")
+        started = time.perf_counter()
+        fetched = 0
+        with self.historical_connection(start_date) as conn:
+            sql = self.rewrite(sql, self.archived_tables(conn))
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.arraysize = batch_size
+            cursor.execute(sql, params)
+            converter = row_converter(mode, column_names(cursor), row_type)
+            try:
+                while True:
+                    rows = cursor.fetchmany()
+                    if not rows:
+                        break
+                    fetched += len(rows)
+                    yield from (rows if converter is None else map(converter, rows))
+            finally:
+                cursor.close()
+                self.db.profiler.record(sql, params, time.perf_counter() - started, fetched, conn)
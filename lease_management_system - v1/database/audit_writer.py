@@ -0,0 +1,162 @@
+"""
+操作日志异步写入模块 - 有界队列 + 后台线程批量写入 operation_logs 分区
+"""
+import atexit
+import datetime
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+from database.log_partitions import LogEntry
+from utils.logging import get_logger
+
+logger = get_logger("AuditLogWriter")
+
+# 队列中的控制标记：停止线程 / 立即写入当前批次
+_STOP = object()
+_FLUSH = object()
+
+def make_log_entry(user: str, operation_type: str, target_type: str,
+                   target_id: str, details: Optional[str] = None) -> LogEntry:
+    """构建日志条目；操作时间在产生时确定，格式与 CURRENT_TIMESTAMP（UTC）一致"""
+    operation_time = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return (user, operation_type, target_type, target_id, details, operation_time)
+
+
+class AuditLogWriter:
+    """
+    操作日志后台写入器
+    业务线程只负责入队，后台线程按批次 executemany 写入并提交；
+    队列满时短暂等待，仍无空位则退化为同步写入，保证日志不丢失
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection],
+                 insert: Callable[[sqlite3.Connection, Sequence[LogEntry]], None],
+                 batch_size: int = 200, flush_interval: float = 0.5,
+                 max_queue: int = 10000, put_timeout: float = 1.0):
+        """
+        :param connect: 创建写入专用连接
+        :param insert: 在给定连接上写入一批日志（不提交），如 LogPartitions.insert
+        """
+        self._connect = connect
+        self._insert = insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.close)
+
+    def enqueue(self, entry: LogEntry):
+        """提交一条日志，后台线程最迟在 flush_interval 后开始写入"""
+        self.enqueue_many([entry])
+
+    def enqueue_many(self, entries: List[LogEntry]):
+        """批量提交日志（如事务提交后一次性提交其间产生的日志）"""
+        self._ensure_started()
+        for entry in entries:
+            try:
+                self._queue.put(entry, timeout=self.put_timeout)
+            except queue.Full:
+                logger.warning("操作日志队列已满，改为同步写入")
+                self.write_sync([entry])
+
+    def write_sync(self, entries: List[LogEntry]):
+        """同步写入日志（合规要求立即落盘的条目或队列满时使用）"""
+        conn = self._connect()
+        try:
+            self._insert(conn, entries)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已入队的日志全部写入；超时返回 False"""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.unfinished_tasks == 0
+        # 通知后台线程结束攒批等待，立即写入
+        self._queue.put(_FLUSH)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """停止后台线程并写完剩余日志；之后再次入队会重新启动线程"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.error("操作日志写入线程未能在限定时间内结束")
+            else:
+                self._thread = None
+                logger.info("操作日志写入线程已停止")
+
+    @property
+    def pending(self) -> int:
+        """尚未写入的日志条数"""
+        return self._queue.unfinished_tasks
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="AuditLogWriter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """后台线程：攒批写入，直到收到停止信号"""
+        conn = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                batch: List[LogEntry] = []
+                markers = 0
+                item = self._queue.get()
+                # 自首条日志起最多等待 flush_interval 攒批，减少提交次数和与业务写入争用写锁
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if item is _STOP or item is _FLUSH:
+                        markers += 1
+                        stopping = stopping or item is _STOP
+                        break
+                    batch.append(item)
+                    remaining = deadline - time.monotonic()
+                    if len(batch) >= self.batch_size or remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._write_batch(conn, batch)
+                for _ in range(len(batch) + markers):
+                    self._queue.task_done()
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[LogEntry]):
+        try:
+            self._insert(conn, batch)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"批量写入操作日志失败，改为逐条写入: {str(e)}")
+            for entry in batch:
+                try:
+                    self._insert(conn, [entry])
+                    conn.commit()
+                except sqlite3.Error as entry_error:
+                    conn.rollback()
+                    logger.error(f"操作日志写入失败，已丢弃: {entry}, 错误={str(entry_error)}")
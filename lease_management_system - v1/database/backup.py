@@ -0,0 +1,287 @@
+"""
+数据库备份模块 - 基于 SQLite 在线备份 API 的一致性备份
+"""
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from database.backup_store import BackupStore, MANIFEST_SUFFIX
+from database.migrations import latest_version
+from utils.logging import get_logger
+
+logger = get_logger("BackupEngine")
+
+BACKUP_PREFIX = "lease_backup_"
+# 可恢复的数据库必须包含的核心表
+REQUIRED_TABLES = ("users", "contracts", "payment_records")
+BACKUP_SUFFIX = ".db"
+
+# 进度回调：(已复制页数, 总页数)
+ProgressCallback = Callable[[int, int], None]
+
+
+@dataclass
+class BackupResult:
+    """一次备份的结果"""
+    path: str
+    ok: bool
+    pages: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    stored_bytes: Optional[int] = None  # 写入去重仓库时本次新增的压缩字节数
+
+
+class BackupEngine:
+    """
+    在线备份引擎
+    通过 Connection.backup() 按页分批复制，备份期间其他连接可以继续读写（写入会使备份自动重新开始），
+    复制完成后在临时文件上执行 integrity_check，通过后再原子地改名为正式备份文件；
+    配置了去重仓库时，校验通过的快照存入仓库并以清单（.json）代替完整的数据库副本
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], backup_dir: str,
+                 max_backups: int = 30, pages_per_step: int = 1024,
+                 store: Optional[BackupStore] = None):
+        self._connect = connect
+        self.backup_dir = backup_dir
+        self.max_backups = max_backups
+        self.pages_per_step = pages_per_step
+        self.store = store
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """是否有备份正在进行"""
+        return self._lock.locked()
+
+    def new_backup_path(self, tag: str = "", suffix: str = BACKUP_SUFFIX) -> str:
+        """生成带时间戳的备份文件路径，如 lease_backup_20250101_120000.db（同一秒内重名时追加序号）"""
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{tag + '_' if tag else ''}{timestamp}")
+        path, index = base + suffix, 1
+        while os.path.exists(path):
+            path, index = f"{base}_{index}{suffix}", index + 1
+        return path
+
+    def backup(self, tag: str = "", dest_path: Optional[str] = None,
+               progress: Optional[ProgressCallback] = None, cleanup: bool = True) -> BackupResult:
+        """
+        同步执行一次备份
+        :param tag: 备份名称中的标记（如 before_restore）
+        :param dest_path: 指定时输出为完整的数据库文件；否则写入去重仓库（未配置仓库时按时间戳生成 .db 文件）
+        :param progress: 每复制一批页面后回调（在执行备份的线程中调用）
+        :param cleanup: 备份成功后是否按 max_backups 清理旧备份
+        """
+        use_store = dest_path is None and self.store is not None
+        if dest_path is None:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            dest_path = self.new_backup_path(tag, MANIFEST_SUFFIX if use_store else BACKUP_SUFFIX)
+        if not self._lock.acquire(blocking=False):
+            return BackupResult(dest_path, False, error="已有备份正在进行")
+
+        temp_path = dest_path + ".part"
+        stored_bytes = None
+        started = time.perf_counter()
+        pages = 0
+        try:
+            def on_step(status, remaining, total):
+                nonlocal pages
+                pages = total
+                if progress is not None:
+                    progress(total - remaining, total)
+
+            source = self._connect()
+            try:
+                target = sqlite3.connect(temp_path)
+                try:
+                    source.backup(target, pages=self.pages_per_step, progress=on_step)
+                    # 备份文件独立使用，不保留 WAL 标记，避免打开时生成 -wal/-shm 附属文件
+                    target.execute("PRAGMA journal_mode = DELETE").fetchall()
+                    ok, detail = self._integrity_check(target)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+
+            if not ok:
+                raise sqlite3.DatabaseError(f"备份文件完整性校验失败: {detail}")
+            if use_store:
+                stored_bytes = self.store.add(temp_path, dest_path, tag)["new_bytes"]
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, dest_path)
+            elapsed = time.perf_counter() - started
+            logger.info(f"数据库备份完成: {dest_path}，{pages} 页，耗时 {elapsed:.2f}s")
+        except Exception as e:
+            self._remove_quietly(temp_path)
+            logger.error(f"数据库备份失败: {str(e)}")
+            return BackupResult(dest_path, False, pages, time.perf_counter() - started, str(e))
+        finally:
+            self._lock.release()
+
+        if cleanup:
+            try:
+                self.cleanup_old_backups()
+            except Exception as e:
+                # 备份本身已完成，清理失败只记录，下次备份时再清理
+                logger.warning(f"清理旧备份失败: {str(e)}")
+        return BackupResult(dest_path, True, pages, elapsed, stored_bytes=stored_bytes)
+
+    def start_backup(self, progress: Optional[ProgressCallback] = None,
+                     on_done: Optional[Callable[[BackupResult], None]] = None,
+                     tag: str = "") -> threading.Thread:
+        """
+        在后台线程执行备份，立即返回线程对象
+        progress 与 on_done 在后台线程中调用，界面代码需自行转交主线程（如 after 轮询）
+        """
+        def run():
+            # 任何异常都须回报结果，否则等待 on_done 的界面（模态的进度对话框）会一直等待
+            try:
+                result = self.backup(tag, progress=progress)
+            except Exception as e:
+                logger.error(f"后台备份异常终止: {str(e)}")
+                result = BackupResult("", False, error=str(e))
+            if on_done is not None:
+                on_done(result)
+
+        self._thread = threading.Thread(target=run, name="BackupEngine", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def verify(self, path: str) -> Tuple[bool, str]:
+        """校验备份：数据库文件执行 integrity_check，清单检查引用的数据块是否齐全且未损坏"""
+        if not os.path.exists(path):
+            return False, "文件不存在"
+        if BackupStore.is_manifest(path):
+            if self.store is None:
+                return False, "未配置去重备份仓库"
+            return (True, "ok") if self.store.verify(path) else (False, "数据块缺失或损坏")
+        try:
+            conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+            try:
+                return self._integrity_check(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            return False, str(e)
+
+    def extract(self, path: str, dest_path: str) -> str:
+        """把备份还原为完整的数据库文件：清单从仓库重建，数据库文件直接复制"""
+        if BackupStore.is_manifest(path):
+            if self.store is None:
+                raise ValueError("未配置去重备份仓库，无法从清单恢复")
+            return self.store.restore(path, dest_path)
+        shutil.copyfile(path, dest_path)
+        return dest_path
+
+    def prepare_restore(self, path: str) -> Tuple[str, bool]:
+        """
+        校验待恢复的备份：完整性检查、核心表是否齐全、表结构版本不高于当前程序
+        :return: (可作为恢复源的数据库文件路径, 是否为需要调用方删除的临时文件)
+        :raises ValueError: 校验不通过
+        """
+        if not os.path.exists(path):
+            raise ValueError(f"备份文件不存在: {path}")
+        temporary = BackupStore.is_manifest(path)
+        if temporary:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            fd, source_path = tempfile.mkstemp(prefix=".restore_", suffix=BACKUP_SUFFIX, dir=self.backup_dir)
+            os.close(fd)
+            try:
+                self.extract(path, source_path)
+            except Exception:
+                self._remove_quietly(source_path)
+                raise
+        else:
+            source_path = path
+
+        try:
+            conn = sqlite3.connect(f"file:{os.path.abspath(source_path)}?mode=ro", uri=True)
+            try:
+                ok, detail = self._integrity_check(conn)
+                if not ok:
+                    raise ValueError(f"备份文件完整性校验失败: {detail}")
+                tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                missing = [name for name in REQUIRED_TABLES if name not in tables]
+                if missing:
+                    raise ValueError(f"备份文件缺少数据表: {', '.join(missing)}")
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version > latest_version():
+                    raise ValueError(f"备份的表结构版本 v{version} 高于当前程序支持的 v{latest_version()}")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            if temporary:
+                self._remove_quietly(source_path)
+            raise ValueError(f"无法读取备份文件: {str(e)}")
+        except Exception:
+            if temporary:
+                self._remove_quietly(source_path)
+            raise
+        return source_path, temporary
+
+    def restore_into(self, source_path: str) -> int:
+        """
+        通过备份 API 把 source_path 整体写入当前数据库（单步完成，对其他连接是一次原子提交）
+        调用前应排空连接池；返回写入的页数
+        """
+        source = sqlite3.connect(f"file:{os.path.abspath(source_path)}?mode=ro", uri=True)
+        try:
+            target = self._connect()
+            try:
+                source.backup(target, pages=-1)
+                return target.execute("PRAGMA page_count").fetchone()[0]
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+    def list_backups(self) -> List[str]:
+        """备份目录下的备份（数据库文件与仓库清单），按修改时间从新到旧排列"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        paths = [os.path.join(self.backup_dir, name) for name in os.listdir(self.backup_dir)
+                 if name.startswith(BACKUP_PREFIX) and name.endswith((BACKUP_SUFFIX, MANIFEST_SUFFIX))]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def cleanup_old_backups(self) -> int:
+        """
+        保留最新的 max_backups 个备份，删除其余备份；
+        随后回收不再被任何清单引用的数据块。返回删除的备份数
+        """
+        # 与备份互斥：新数据块在清单写出之前不被任何清单引用，不能被回收
+        with self._lock:
+            backups = self.list_backups()
+            deleted = 0
+            for path in backups[self.max_backups:]:
+                try:
+                    os.remove(path)
+                    deleted += 1
+                    logger.info(f"删除过期备份: {path}")
+                except OSError as e:
+                    logger.warning(f"删除备份文件失败: {path}, 错误: {str(e)}")
+            if self.store is not None:
+                live = [path for path in backups[:self.max_backups] if BackupStore.is_manifest(path)]
+                self.store.collect_garbage(live)
+        return deleted
+
+    @staticmethod
+    def _integrity_check(conn: sqlite3.Connection) -> Tuple[bool, str]:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+        detail = "; ".join(str(row[0]) for row in rows)
+        return detail == "ok", detail
+
+    @staticmethod
+    def _remove_quietly(path: str):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,224 @@
+"""
+去重备份仓库模块 - 按内容寻址存储压缩后的数据块，每次备份记录为一份清单
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import tempfile
+from typing import Dict, List, Optional, Set
+
+from utils.logging import get_logger
+
+logger = get_logger("BackupStore")
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".json"
+CHUNK_DIR = "chunks"
+
+# 压缩方式 -> (块文件扩展名, 压缩函数, 解压函数)
+CODECS = {
+    "lzma": (".xz", lambda data: lzma.compress(data, preset=1), lzma.decompress),
+    "gzip": (".gz", lambda data: gzip.compress(data, compresslevel=6, mtime=0), gzip.decompress),
+}
+
+
+def sqlite_page_size(path: str) -> int:
+    """从数据库文件头读取页大小（偏移 16 处的 2 字节大端整数，1 表示 65536）"""
+    with open(path, "rb") as f:
+        header = f.read(100)
+    if len(header) < 100 or not header.startswith(b"SQLite format 3\x00"):
+        raise ValueError(f"不是 SQLite 数据库文件: {path}")
+    size = int.from_bytes(header[16:18], "big")
+    return 65536 if size == 1 else size
+
+
+class BackupStore:
+    """
+    内容寻址的备份仓库
+    数据库文件按页对齐切成固定大小的块，以 SHA-256 命名、压缩后存入 chunks/ 目录；
+    内容相同的块只保存一份，因此重复备份只增加发生变化的块。
+    清单（JSON）记录块的顺序及整个文件的摘要，恢复时按清单重建文件并校验
+    """
+
+    def __init__(self, root: str, chunk_pages: int = 16, codec: str = "lzma"):
+        if codec not in CODECS:
+            raise ValueError(f"不支持的压缩方式: {codec}")
+        self.root = root
+        self.chunk_pages = chunk_pages
+        self.codec = codec
+
+    @staticmethod
+    def is_manifest(path: str) -> bool:
+        return path.endswith(MANIFEST_SUFFIX)
+
+    def add(self, db_path: str, manifest_path: str, tag: str = "") -> Dict:
+        """
+        把数据库文件存入仓库并写出清单
+        :param db_path: 已完成一致性备份的数据库文件（不能是正在写入的活动库）
+        :param manifest_path: 清单文件路径
+        :return: 清单内容，附带本次新增块数与字节数统计
+        """
+        page_size = sqlite_page_size(db_path)
+        chunk_size = page_size * self.chunk_pages
+        file_hash = hashlib.sha256()
+        chunks: List[str] = []
+        new_chunks = new_bytes = size = 0
+
+        with open(db_path, "rb") as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                size += len(data)
+                file_hash.update(data)
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append(digest)
+                if self._find_chunk(digest) is None:
+                    new_bytes += self._write_chunk(digest, data)
+                    new_chunks += 1
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "tag": tag,
+            "page_size": page_size,
+            "chunk_size": chunk_size,
+            "size": size,
+            "sha256": file_hash.hexdigest(),
+            "chunks": chunks,
+        }
+        self._write_atomic(manifest_path, json.dumps(manifest, indent=1).encode("utf-8"))
+        logger.info(f"备份清单已写入: {manifest_path}，共 {len(chunks)} 块，新增 {new_chunks} 块 / {new_bytes} 字节")
+        return dict(manifest, new_chunks=new_chunks, new_bytes=new_bytes)
+
+    def restore(self, manifest_path: str, dest_path: str) -> str:
+        """按清单重建数据库文件，校验整体摘要后原子地写到 dest_path"""
+        manifest = self.load_manifest(manifest_path)
+        file_hash = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(prefix=".restore_", dir=os.path.dirname(os.path.abspath(dest_path)))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for digest in manifest["chunks"]:
+                    data = self._read_chunk(digest)
+                    file_hash.update(data)
+                    out.write(data)
+                out.flush()
+                os.fsync(out.fileno())
+            if file_hash.hexdigest() != manifest["sha256"]:
+                raise ValueError(f"重建文件摘要不一致: {manifest_path}")
+            os.replace(temp_path, dest_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        logger.info(f"已从清单重建数据库文件: {manifest_path} -> {dest_path}")
+        return dest_path
+
+    def verify(self, manifest_path: str) -> bool:
+        """检查清单引用的块是否齐全且内容与摘要一致"""
+        try:
+            manifest = self.load_manifest(manifest_path)
+            file_hash = hashlib.sha256()
+            for digest in manifest["chunks"]:
+                data = self._read_chunk(digest)
+                if hashlib.sha256(data).hexdigest() != digest:
+                    logger.error(f"数据块内容损坏: {digest}")
+                    return False
+                file_hash.update(data)
+            return file_hash.hexdigest() == manifest["sha256"]
+        except Exception as e:
+            logger.error(f"校验备份清单失败: {manifest_path}, 错误: {str(e)}")
+            return False
+
+    @staticmethod
+    def load_manifest(manifest_path: str) -> Dict:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"不支持的清单版本: {manifest.get('version')}")
+        return manifest
+
+    def collect_garbage(self, live_manifests: List[str]) -> int:
+        """
+        标记-清除：删除不被任何保留清单引用的数据块及残留的临时文件
+        :param live_manifests: 仍然保留的清单路径
+        :return: 删除的块数
+        """
+        referenced: Set[str] = set()
+        for path in live_manifests:
+            try:
+                referenced.update(self.load_manifest(path)["chunks"])
+            except Exception as e:
+                # 清单无法读取时不能判断引用关系，放弃本次回收以免误删
+                logger.error(f"读取备份清单失败，跳过数据块回收: {path}, 错误: {str(e)}")
+                return 0
+
+        deleted = 0
+        chunk_root = os.path.join(self.root, CHUNK_DIR)
+        if not os.path.isdir(chunk_root):
+            return 0
+        for prefix in os.listdir(chunk_root):
+            prefix_dir = os.path.join(chunk_root, prefix)
+            for name in os.listdir(prefix_dir):
+                digest = name.split(".", 1)[0]
+                if digest in referenced and not name.endswith(".tmp"):
+                    continue
+                try:
+                    os.remove(os.path.join(prefix_dir, name))
+                    deleted += 1
+                except OSError as e:
+                    logger.warning(f"删除数据块失败: {name}, 错误: {str(e)}")
+            try:
+                if not os.listdir(prefix_dir):
+                    os.rmdir(prefix_dir)
+            except OSError as e:
+                logger.warning(f"删除空数据块目录失败: {prefix_dir}, 错误: {str(e)}")
+        if deleted:
+            logger.info(f"已回收 {deleted} 个未引用的数据块")
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        """仓库占用：块数与压缩后字节数"""
+        count = size = 0
+        chunk_root = os.path.join(self.root, CHUNK_DIR)
+        for dirpath, _, filenames in os.walk(chunk_root):
+            for name in filenames:
+                count += 1
+                size += os.path.getsize(os.path.join(dirpath, name))
+        return {"chunks": count, "stored_bytes": size}
+
+    def _chunk_path(self, digest: str, codec: str) -> str:
+        return os.path.join(self.root, CHUNK_DIR, digest[:2], digest + CODECS[codec][0])
+
+    def _find_chunk(self, digest: str) -> Optional[str]:
+        """已存在的块文件路径（任意压缩方式）"""
+        for codec in CODECS:
+            path = self._chunk_path(digest, codec)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _write_chunk(self, digest: str, data: bytes) -> int:
+        compressed = CODECS[self.codec][1](data)
+        path = self._chunk_path(digest, self.codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_atomic(path, compressed)
+        return len(compressed)
+
+    def _read_chunk(self, digest: str) -> bytes:
+        path = self._find_chunk(digest)
+        if path is None:
+            raise FileNotFoundError(f"备份数据块缺失: {digest}")
+        codec = next(name for name, (ext, _, _) in CODECS.items() if path.endswith(ext))
+        with open(path, "rb") as f:
+            return CODECS[codec][2](f.read())
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
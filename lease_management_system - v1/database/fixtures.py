@@ -0,0 +1,160 @@
+"""
+测试数据装载模块 - 按参数生成合成的合同组合，在一个事务内批量写入（基准测试与内存数据库使用）
+"""
+import datetime
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from models.entities import to_cents
+from utils.logging import get_logger
+
+logger = get_logger("Fixtures")
+
+
+@dataclass
+class PortfolioFixture:
+    """
+    合成合同组合：每份合同一条租金期/免租期/押金，
+    每月一条收款、开票、月度收入、收入记录、税会差异、开票详情及应收/收款两条增值税记录
+    """
+    contracts: int = 500
+    months: int = 24
+    start: datetime.date = datetime.date(2023, 1, 1)
+    prefix: str = "SEED"
+    created_by: str = "seed"
+
+    def contract_id(self, n: int) -> str:
+        return f"{self.prefix}-{n:05d}"
+
+    def monthly_rent(self, n: int) -> float:
+        return 10000.0 + n % 50 * 100
+
+    def month_ends(self) -> List[datetime.date]:
+        ends = []
+        for index in range(self.months):
+            year, month = divmod(self.start.month - 1 + index, 12)
+            first = datetime.date(self.start.year + year, month + 1, 1)
+            ends.append((first + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1))
+        return ends
+
+
+# 各表的插入语句，键为表名（写入顺序即字典顺序，子表在合同之后）
+INSERT_SQL = {
+    "contracts": '''
+        INSERT INTO contracts (contract_id, customer_name, room_number, area, total_rent,
+                               payment_name, eas_code, tax_rate, created_by, is_effective,
+                               effective_date, contract_type)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 0.05, ?, 1, ?, '新增')
+    ''',
+    "rent_periods": "INSERT INTO rent_periods (contract_id, start_date, end_date, monthly_rent) VALUES (?, ?, ?, ?)",
+    "free_periods": "INSERT INTO free_periods (contract_id, start_date, end_date) VALUES (?, ?, ?)",
+    "deposit_records": '''
+        INSERT INTO deposit_records (contract_id, date, amount_cents, record_type, created_by)
+        VALUES (?, ?, ?, '收取', ?)
+    ''',
+    "payment_records": '''
+        INSERT INTO payment_records (id, contract_id, date, amount_cents, payment_type, created_by)
+        VALUES (?, ?, ?, ?, '租金', ?)
+    ''',
+    "invoice_records": '''
+        INSERT INTO invoice_records (contract_id, date, amount_cents, tax_amount_cents, invoice_number, created_by)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''',
+    "invoice_details": '''
+        INSERT INTO invoice_details (invoice_number, contract_id, invoice_date, total_amount_cents, vat_amount_cents,
+                                     relate_payment_id, relate_income_year, relate_income_month)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    "monthly_income": '''
+        INSERT INTO monthly_income (id, contract_id, year, month, accounting_income, tax_income, tax_rate, is_adjust)
+        VALUES (?, ?, ?, ?, ?, ?, 0.05, 0)
+    ''',
+    "income_records": '''
+        INSERT INTO income_records (contract_id, income_date, accounting_income, tax_income, source_type, source_id)
+        VALUES (?, ?, ?, ?, 'monthly', ?)
+    ''',
+    "tax_diff": '''
+        INSERT INTO tax_diff (contract_id, year, month, accounting_income, tax_income,
+                              diff_amount, deferred_tax, to_be_settled_vat, adjust_vat)
+        VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?)
+    ''',
+    "vat_records": '''
+        INSERT INTO vat_records (contract_id, relate_type, relate_id, vat_amount_cents, tax_obligation_date, status)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''',
+}
+
+
+def generate_rows(fixture: PortfolioFixture, first_payment_id: int = 1,
+                  first_income_id: int = 1) -> Iterator[Tuple[str, tuple]]:
+    """
+    逐行生成 (表名, 参数)；收款和月度收入的 id 显式分配，
+    使开票详情、收入记录、增值税记录可以在批量写入前引用它们
+    """
+    start = fixture.start.isoformat()
+    ends = fixture.month_ends()
+    payment_id, income_id = first_payment_id, first_income_id
+    for n in range(fixture.contracts):
+        cid = fixture.contract_id(n)
+        rent = fixture.monthly_rent(n)
+        yield "contracts", (cid, f"客户{n}", f"R-{n}", 100.0, rent * fixture.months,
+                            f"客户{n}", f"EAS-{n}", fixture.created_by, start)
+        yield "rent_periods", (cid, start, ends[-1].isoformat(), rent)
+        yield "free_periods", (cid, start, (fixture.start + datetime.timedelta(days=14)).isoformat())
+        rent_cents = to_cents(rent)
+        yield "deposit_records", (cid, start, rent_cents * 2, fixture.created_by)
+        for i, end in enumerate(ends):
+            day = end.isoformat()
+            tax_income = round(rent / 1.05, 2)
+            vat = round(tax_income * 0.05, 2)
+            tax_cents = rent_cents - to_cents(tax_income)
+            status = "paid" if i < fixture.months - 1 else "pending"
+            invoice_number = f"INV-{n:05d}-{i:03d}"
+            yield "payment_records", (payment_id, cid, day, rent_cents, fixture.created_by)
+            yield "invoice_records", (cid, day, rent_cents, tax_cents, invoice_number, fixture.created_by)
+            yield "invoice_details", (invoice_number, cid, day, rent_cents, tax_cents,
+                                      payment_id, end.year, end.month)
+            yield "monthly_income", (income_id, cid, end.year, end.month, tax_income, tax_income)
+            yield "income_records", (cid, day, tax_income, tax_income, income_id)
+            yield "tax_diff", (cid, end.year, end.month, tax_income, tax_income, vat, vat)
+            yield "vat_records", (cid, "receivable", str(uuid.uuid4()), to_cents(vat), day, status)
+            yield "vat_records", (cid, "payment", str(payment_id), to_cents(vat), day, status)
+            payment_id += 1
+            income_id += 1
+
+
+def load_portfolio(db, fixture: Optional[PortfolioFixture] = None, batch_size: int = 5000,
+                   analyze: bool = True) -> Dict[str, int]:
+    """
+    在一个事务内批量写入合成合同组合（每表按批 executemany），失败整体回滚
+    :param db: DatabaseManager（文件库或内存库均可）
+    :return: 表名 -> 写入行数
+    """
+    fixture = fixture or PortfolioFixture()
+    counts = {table: 0 for table in INSERT_SQL}
+    with db.transaction() as conn:
+        first_payment_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM payment_records").fetchone()[0]
+        first_income_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM monthly_income").fetchone()[0]
+        pending: Dict[str, List[tuple]] = {table: [] for table in INSERT_SQL}
+
+        def flush():
+            # 按表的依赖顺序写入，保证子表引用的合同、收款、月度收入已存在
+            for table, rows in pending.items():
+                if rows:
+                    conn.executemany(INSERT_SQL[table], rows)
+                    counts[table] += len(rows)
+                    rows.clear()
+
+        buffered = 0
+        for table, row in generate_rows(fixture, first_payment_id, first_income_id):
+            pending[table].append(row)
+            buffered += 1
+            if buffered >= batch_size:
+                flush()
+                buffered = 0
+        flush()
+        if analyze:
+            conn.execute("ANALYZE")
+    logger.info(f"已写入合成合同组合: {fixture.contracts} 份合同 × {fixture.months} 个月，共 {sum(counts.values())} 行")
+    return counts
@@ -0,0 +1,238 @@
+"""
+查询监测模块 - 记录每条 SQL 的耗时与行数，按语句指纹聚合，并记录慢查询及其执行计划
+"""
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.logging import get_logger
+
+logger = get_logger("QueryProfiler")
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_RE = re.compile(r"\bVALUES\s*\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*", re.I)
+_SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    """
+    语句指纹：去掉注释、字面量替换为 ?、IN/VALUES 列表折叠、空白归一，
+    使只有参数不同的语句聚合到同一条统计
+    """
+    text = _COMMENT_RE.sub(" ", sql)
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (...)", text)
+    text = _VALUES_RE.sub("VALUES (...)", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class QueryStat:
+    """单个语句指纹的累计统计"""
+
+    __slots__ = ("fingerprint", "calls", "errors", "rows", "total_time", "max_time")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": self.total_time * 1000,
+            "avg_ms": self.avg_time * 1000,
+            "max_ms": self.max_time * 1000,
+        }
+
+
+class QueryProfiler:
+    """
+    进程内查询统计
+    record() 由数据库层在每次执行后调用；超过慢查询阈值的语句连同 EXPLAIN QUERY PLAN 写入日志
+    """
+
+    def __init__(self, enabled: bool = True, slow_query_ms: float = 200.0,
+                 explain_slow: bool = True, top_n: int = 20):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow = explain_slow
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._stats: Dict[str, QueryStat] = {}
+
+    def record(self, sql: str, params: Any, elapsed: float, rows: int = 0,
+               conn: Optional[sqlite3.Connection] = None, error: bool = False):
+        """
+        记录一次执行
+        :param elapsed: 耗时（秒）
+        :param rows: 返回或影响的行数
+        :param conn: 执行所用连接，慢查询时用于获取执行计划
+        """
+        if not self.enabled:
+            return
+        key = fingerprint(sql)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = QueryStat(key)
+            stat.calls += 1
+            stat.rows += max(rows, 0)
+            stat.total_time += elapsed
+            if elapsed > stat.max_time:
+                stat.max_time = elapsed
+            if error:
+                stat.errors += 1
+
+        elapsed_ms = elapsed * 1000
+        if self.slow_query_ms is not None and elapsed_ms >= self.slow_query_ms:
+            plan = self.explain(conn, sql, params) if self.explain_slow and conn is not None else []
+            plan_text = "\n".join(f"    {line}" for line in plan) if plan else "    (无)"
+            logger.warning(
+                f"慢查询 {elapsed_ms:.1f}ms, 行数={rows}: {key}\n参数={params}\n执行计划:\n{plan_text}"
+            )
+
+    @staticmethod
+    def explain(conn: sqlite3.Connection, sql: str, params: Any = ()) -> List[str]:
+        """获取语句的 EXPLAIN QUERY PLAN，按层级缩进；失败返回空列表"""
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())
+            rows = cursor.fetchall()
+            cursor.close()
+        except sqlite3.Error as e:
+            logger.debug(f"获取执行计划失败: {str(e)}")
+            return []
+        depth: Dict[int, int] = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+
+    def top(self, n: Optional[int] = None, key: str = "total_time") -> List[QueryStat]:
+        """按指定字段（total_time/calls/max_time/rows）降序取前 n 条"""
+        with self._lock:
+            stats = list(self._stats.values())
+        stats.sort(key=lambda s: getattr(s, key), reverse=True)
+        return stats[:n or self.top_n]
+
+    def dump(self, n: Optional[int] = None, key: str = "total_time") -> str:
+        """生成前 n 条统计的文本报表并写入日志"""
+        stats = self.top(n, key)
+        lines = [f"查询统计（按 {key} 排序，前 {len(stats)} 条）:",
+                 f"{'总耗时ms':>10} {'次数':>8} {'平均ms':>9} {'最大ms':>9} {'行数':>9} {'错误':>5}  语句"]
+        for s in stats:
+            lines.append(
+                f"{s.total_time * 1000:>10.1f} {s.calls:>8} {s.avg_time * 1000:>9.2f} "
+                f"{s.max_time * 1000:>9.2f} {s.rows:>9} {s.errors:>5}  {s.fingerprint}"
+            )
+        report = "\n".join(lines)
+        logger.info(report)
+        return report
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._stats.clear()
+
+
+class InstrumentedCursor:
+    """
+    为直接使用游标的旧接口（数据库适配器）计时的游标代理
+    一次 execute 的耗时包含其后 fetch 的时间，在下一次 execute、取完结果或关闭游标时记录
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor, profiler: QueryProfiler):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._pending: Optional[list] = None  # [sql, params, elapsed, rows]
+
+    def execute(self, sql: str, params: Sequence[Any] = ()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(sql, params)
+        except sqlite3.Error:
+            self._profiler.record(sql, params, time.perf_counter() - started,
+                                  conn=self._cursor.connection, error=True)
+            raise
+        self._pending = [sql, params, time.perf_counter() - started, max(self._cursor.rowcount, 0)]
+        return self
+
+    def executemany(self, sql: str, params_list):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, params_list)
+        except sqlite3.Error:
+            self._profiler.record(sql, (), time.perf_counter() - started, error=True)
+            raise
+        self._profiler.record(sql, (), time.perf_counter() - started, self._cursor.rowcount)
+        return self
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is None:
+            self._finish()
+        elif self._pending is not None:
+            self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        rows = self._timed(self._cursor.fetchmany, size or self._cursor.arraysize)
+        if not rows:
+            self._finish()
+        elif self._pending is not None:
+            self._pending[3] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        if self._pending is not None:
+            self._pending[3] += len(rows)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if self._pending is not None:
+                self._pending[2] += time.perf_counter() - started
+
+    def _finish(self):
+        if self._pending is None:
+            return
+        sql, params, elapsed, rows = self._pending
+        self._pending = None
+        self._profiler.record(sql, params, elapsed, rows, conn=self._cursor.connection)
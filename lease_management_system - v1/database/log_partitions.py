@@ -0,0 +1,199 @@
+"""
+操作日志分区模块 - operation_logs 按月拆分为 operation_logs_YYYYMM 分区表，
+同名视图以 UNION ALL 合并全部分区；保留期外的日志整月导出为压缩 JSONL 后删除分区
+"""
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from utils.logging import get_logger
+
+logger = get_logger("LogPartitions")
+
+VIEW_NAME = "operation_logs"
+PARTITION_PREFIX = "operation_logs_"
+COLUMNS = ("id", "user", "operation_type", "target_type", "target_id", "details", "operation_time")
+EXPORT_SUFFIX = ".jsonl.gz"
+
+_PARTITION_RE = re.compile(r"^operation_logs_(\d{6})$")
+
+# (user, operation_type, target_type, target_id, details, operation_time)
+LogEntry = Tuple[str, str, str, str, Optional[str], str]
+
+
+def partition_name(operation_time: str) -> str:
+    """按操作时间（YYYY-MM-DD HH:MM:SS）确定分区表名，如 operation_logs_202501"""
+    return f"{PARTITION_PREFIX}{operation_time[:4]}{operation_time[5:7]}"
+
+
+def list_partitions(conn: sqlite3.Connection) -> List[str]:
+    """现有分区表名，按月份从早到晚排列"""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'operation_logs_%'")]
+    return sorted(name for name in names if _PARTITION_RE.match(name))
+
+
+def create_partition(conn: sqlite3.Connection, name: str) -> bool:
+    """
+    创建分区表及时间索引，返回是否新建
+    新分区的自增序列从现有最大 id 开始，使 id 在所有分区间保持唯一（视图分页依赖 (operation_time, id) 排序）
+    """
+    if not _PARTITION_RE.match(name):
+        raise ValueError(f"无效的日志分区名: {name}")
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    if exists:
+        return False
+    conn.execute(f'''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT NOT NULL,
+            operation_type TEXT NOT NULL,
+            target_type TEXT NOT NULL,
+            target_id TEXT NOT NULL,
+            details TEXT,
+            operation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute(f"CREATE INDEX idx_{name}_time ON {name} (operation_time, id)")
+    last_id = conn.execute(
+        "SELECT MAX(seq) FROM sqlite_sequence WHERE name LIKE 'operation_logs%'").fetchone()[0]
+    if last_id:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, last_id))
+    return True
+
+
+def rebuild_view(conn: sqlite3.Connection, partitions: Optional[List[str]] = None):
+    """按现有分区重建 operation_logs 视图（无分区时为空视图，保证旧查询可用）"""
+    partitions = list_partitions(conn) if partitions is None else partitions
+    column_list = ", ".join(COLUMNS)
+    if partitions:
+        body = " UNION ALL ".join(f"SELECT {column_list} FROM {name}" for name in partitions)
+    else:
+        body = "SELECT " + ", ".join(f"NULL AS {column}" for column in COLUMNS) + " WHERE 0"
+    conn.execute(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+    conn.execute(f"CREATE VIEW {VIEW_NAME} AS {body}")
+
+
+class LogPartitions:
+    """
+    操作日志分区管理
+    写入时按操作时间路由到对应月份的分区，首次写入某月时在同一事务内建表并重建视图；
+    已确认存在的分区缓存在内存中，数据库被恢复等原因导致分区缺失时自动重建
+    """
+
+    def __init__(self, export_dir: str = "log_exports"):
+        self.export_dir = export_dir
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def insert(self, conn: sqlite3.Connection, entries: Sequence[LogEntry]):
+        """
+        把日志写入各自月份的分区（不提交，由调用方提交）
+        id 按所有分区共用的序列显式分配，先取得写锁再读取序列，避免并发写入分配到相同的 id
+        """
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        groups: Dict[str, List[LogEntry]] = {}
+        for entry in entries:
+            groups.setdefault(partition_name(entry[5]), []).append(entry)
+        for name in groups:
+            if name not in self._known:
+                self.ensure_partition(conn, name)
+
+        next_id = conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name LIKE 'operation_logs_%'").fetchone()[0] + 1
+        for name, rows in groups.items():
+            sql = (f"INSERT INTO {name} (id, user, operation_type, target_type, target_id, details, operation_time) "
+                   f"VALUES (?, ?, ?, ?, ?, ?, ?)")
+            params = [(next_id + offset,) + tuple(row) for offset, row in enumerate(rows)]
+            next_id += len(rows)
+            try:
+                conn.executemany(sql, params)
+            except sqlite3.OperationalError as e:
+                if "no such table" not in str(e):
+                    raise
+                self.forget()
+                self.ensure_partition(conn, name)
+                conn.executemany(sql, params)
+
+    def ensure_partition(self, conn: sqlite3.Connection, name: str):
+        """确保分区存在，新建时同步重建视图"""
+        if create_partition(conn, name):
+            rebuild_view(conn)
+            logger.info(f"已创建操作日志分区: {name}")
+        with self._lock:
+            self._known.add(name)
+
+    def forget(self):
+        """清空分区缓存（数据库被整体替换或分区被删除后调用）"""
+        with self._lock:
+            self._known.clear()
+
+    def page(self, conn: sqlite3.Connection, limit: int = 200,
+             before: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        """
+        按时间倒序分页读取日志：从最新的分区开始逐个向前，凑满 limit 条即停止，不扫描更早的分区
+        :param before: 上一页最后一条的 (operation_time, id)，None 表示第一页
+        """
+        rows: List[Dict[str, Any]] = []
+        column_list = ", ".join(COLUMNS)
+        for name in reversed(list_partitions(conn)):
+            if before is not None and name > partition_name(before[0]):
+                continue
+            sql = f"SELECT {column_list} FROM {name}"
+            params: Tuple[Any, ...] = ()
+            if before is not None:
+                sql += " WHERE (operation_time, id) < (?, ?)"
+                params = tuple(before)
+            sql += " ORDER BY operation_time DESC, id DESC LIMIT ?"
+            cursor = conn.execute(sql, params + (limit - len(rows),))
+            rows.extend(dict(zip(COLUMNS, row)) for row in cursor.fetchall())
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def export_partition(self, conn: sqlite3.Connection, name: str) -> str:
+        """把整个分区导出为 gzip 压缩的 JSONL 文件（已存在同名文件时追加序号），返回文件路径"""
+        os.makedirs(self.export_dir, exist_ok=True)
+        base = os.path.join(self.export_dir, name)
+        path, index = base + EXPORT_SUFFIX, 1
+        while os.path.exists(path):
+            path, index = f"{base}_{index}{EXPORT_SUFFIX}", index + 1
+        temp_path = path + ".tmp"
+        cursor = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM {name} ORDER BY operation_time, id")
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            for row in cursor:
+                f.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n")
+        os.replace(temp_path, path)
+        return path
+
+    def drop_partitions(self, conn: sqlite3.Connection, before_month: Optional[str] = None,
+                        export: bool = True) -> Tuple[int, List[str]]:
+        """
+        删除早于 before_month（YYYYMM，None 表示全部）的分区，先导出再整表删除；
+        导出失败的分区保留不删。调用方负责事务提交
+        :return: (删除的日志条数, 导出文件列表)
+        """
+        removed, exported = 0, []
+        partitions = list_partitions(conn)
+        for name in partitions:
+            if before_month is not None and name[len(PARTITION_PREFIX):] >= before_month:
+                continue
+            count = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+            if export and count:
+                try:
+                    exported.append(self.export_partition(conn, name))
+                except OSError as e:
+                    logger.error(f"导出操作日志分区失败，保留该分区: {name}, 错误: {str(e)}")
+                    continue
+            conn.execute(f"DROP TABLE {name}")
+            removed += count
+            logger.info(f"已删除操作日志分区 {name}（{count} 条）")
+        rebuild_view(conn)
+        self.forget()
+        return removed, exported
+
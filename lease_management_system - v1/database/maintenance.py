@@ -0,0 +1,252 @@
+"""
+数据库维护模块 - 后台线程按计划更新统计信息、增量回收空闲页、按 WAL 大小执行检查点并统计碎片，
+每项任务都有执行时间上限，超时即中断，不长时间占用写锁
+"""
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.logging import get_logger
+
+logger = get_logger("Maintenance")
+
+# 维护任务：在给定连接上执行，deadline 为 time.monotonic() 截止时间（None 表示不限时），返回结果摘要
+JobFunc = Callable[[sqlite3.Connection, Optional[float]], Dict[str, Any]]
+
+# 进度回调的间隔（虚拟机指令数），越小超时中断越及时
+PROGRESS_STEPS = 10000
+
+
+@dataclass
+class MaintenanceJob:
+    """一项维护任务"""
+    name: str
+    func: JobFunc
+    interval: float = 0.0              # 计划执行间隔（秒），<= 0 表示只能手动触发
+    budget: Optional[float] = 2.0      # 单次执行时间上限（秒），None 表示不限时
+    last_run: Optional[float] = None   # 上次执行的 time.monotonic()
+    last_finished: Optional[datetime.datetime] = None
+    last_result: Dict[str, Any] = field(default_factory=dict)
+
+    def due(self, now: float) -> bool:
+        return self.interval > 0 and (self.last_run is None or now - self.last_run >= self.interval)
+
+
+def _remaining_ms(deadline: Optional[float], default: int = 5000) -> int:
+    if deadline is None:
+        return default
+    return max(int((deadline - time.monotonic()) * 1000), 0)
+
+
+def analyze_job(analysis_limit: int = 1000) -> JobFunc:
+    """
+    更新查询规划器的统计信息；analysis_limit 限制每个索引抽样的行数，大库上也只需很短时间
+    （PRAGMA optimize 只分析本连接查询过的表，新建的维护连接上无效，因此定期执行 ANALYZE）
+    """
+    def run(conn: sqlite3.Connection, deadline: Optional[float]) -> Dict[str, Any]:
+        conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}").fetchall()
+        conn.execute("ANALYZE")
+        conn.commit()
+        return {"analysis_limit": analysis_limit}
+    return run
+
+
+def incremental_vacuum_job(step_pages: int = 256, min_free_pages: int = 64) -> JobFunc:
+    """
+    auto_vacuum=INCREMENTAL 时分批归还空闲页（每批一个短事务），空闲页少于 min_free_pages 时跳过
+    """
+    def run(conn: sqlite3.Connection, deadline: Optional[float]) -> Dict[str, Any]:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if mode != 2:
+            return {"skipped": "auto_vacuum 不是 INCREMENTAL（执行一次整理数据库后生效）", "free_pages": free}
+        if free < min_free_pages:
+            return {"free_pages": free, "released": 0}
+        released = 0
+        while free and (deadline is None or time.monotonic() < deadline):
+            conn.execute(f"PRAGMA incremental_vacuum({int(step_pages)})").fetchall()
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break
+            released += free - remaining
+            free = remaining
+        return {"free_pages": free, "released": released}
+    return run
+
+
+def checkpoint_job(wal_path: Optional[str], passive_bytes: int = 16 * 1024 * 1024,
+                   truncate_bytes: int = 64 * 1024 * 1024) -> JobFunc:
+    """
+    WAL 文件超过 passive_bytes 时执行 PASSIVE 检查点（不等待读者），
+    超过 truncate_bytes 时执行 TRUNCATE 检查点把 WAL 截断为 0（最多等待到时间上限）
+    """
+    def run(conn: sqlite3.Connection, deadline: Optional[float]) -> Dict[str, Any]:
+        if wal_path is None or not os.path.exists(wal_path):
+            return {"wal_bytes": 0}
+        size = os.path.getsize(wal_path)
+        if size < passive_bytes:
+            return {"wal_bytes": size}
+        mode = "TRUNCATE" if size >= truncate_bytes else "PASSIVE"
+        conn.execute(f"PRAGMA busy_timeout = {_remaining_ms(deadline)}").fetchall()
+        busy, frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return {"wal_bytes": size, "mode": mode, "busy": bool(busy), "frames": frames,
+                "checkpointed": checkpointed, "wal_bytes_after": os.path.getsize(wal_path)
+                if os.path.exists(wal_path) else 0}
+    return run
+
+
+def fragmentation_job(top_n: int = 10) -> JobFunc:
+    """
+    统计空闲页与碎片：整体空闲页比例，以及（SQLite 编译了 dbstat 时）占用最多的表/索引的未用字节比例
+    """
+    def run(conn: sqlite3.Connection, deadline: Optional[float]) -> Dict[str, Any]:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        report: Dict[str, Any] = {
+            "page_size": page_size,
+            "page_count": page_count,
+            "free_pages": free,
+            "free_ratio": round(free / page_count, 4) if page_count else 0.0,
+            "auto_vacuum": {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}.get(
+                conn.execute("PRAGMA auto_vacuum").fetchone()[0], "?"),
+        }
+        try:
+            rows = conn.execute('''
+                SELECT name, COUNT(*) AS pages, SUM(unused) AS unused
+                FROM dbstat GROUP BY name ORDER BY pages DESC LIMIT ?
+            ''', (top_n,)).fetchall()
+            report["objects"] = [
+                {"name": name, "pages": pages, "unused_ratio": round(unused / (pages * page_size), 4)}
+                for name, pages, unused in rows]
+        except sqlite3.OperationalError as e:
+            # 未编译 dbstat 或统计超时，只保留整体数据
+            report["objects_error"] = str(e)
+        logger.info(f"数据库碎片统计: {page_count} 页，空闲 {free} 页（{report['free_ratio']:.1%}），"
+                    f"auto_vacuum={report['auto_vacuum']}")
+        return report
+    return run
+
+
+def full_vacuum_job(conn: sqlite3.Connection, deadline: Optional[float]) -> Dict[str, Any]:
+    """整库重建：回收全部空闲页、消除碎片，并把 auto_vacuum 切换为 INCREMENTAL（耗时与库大小成正比，不限时）"""
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL").fetchall()
+    conn.execute("VACUUM")
+    after = conn.execute("PRAGMA page_count").fetchone()[0]
+    return {"pages_before": before, "pages_after": after}
+
+
+class MaintenanceScheduler:
+    """
+    维护任务调度器
+    后台线程每隔 tick 秒检查到期任务，逐项在新建的独立连接上执行；同一时间只执行一项任务，
+    超过时间上限时由进度回调中断当前语句（已完成的批次保留，未完成的语句回滚）
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], jobs: List[MaintenanceJob],
+                 tick: float = 60.0):
+        self._connect = connect
+        self.jobs: Dict[str, MaintenanceJob] = {job.name: job for job in jobs}
+        self.tick = tick
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """后台线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动后台线程；各计划任务在启动后满一个间隔时首次执行"""
+        if self.running:
+            return
+        now = time.monotonic()
+        for job in self.jobs.values():
+            if job.last_run is None:
+                job.last_run = now
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="MaintenanceScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """停止后台线程（等待正在执行的任务结束，最长不超过其时间上限）"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error("数据库维护线程未能在限定时间内结束")
+        else:
+            self._thread = None
+
+    def run_pending(self) -> Dict[str, Dict[str, Any]]:
+        """执行全部到期任务，返回 任务名 -> 结果"""
+        results = {}
+        for job in list(self.jobs.values()):
+            if self._stop.is_set():
+                break
+            if job.due(time.monotonic()):
+                results[job.name] = self.run_job(job.name)
+        return results
+
+    def run_job(self, name: str) -> Dict[str, Any]:
+        """立即执行一项任务（与其他任务串行），失败或超时时结果中包含 error"""
+        job = self.jobs[name]
+        with self._run_lock:
+            started = time.monotonic()
+            deadline = None if job.budget is None else started + job.budget
+            try:
+                conn = self._connect()
+                try:
+                    if deadline is not None:
+                        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+                        conn.execute(f"PRAGMA busy_timeout = {_remaining_ms(deadline)}").fetchall()
+                    result = job.func(conn, deadline)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                if "interrupted" in str(e):
+                    result = {"error": "超过时间上限，已中断"}
+                    logger.warning(f"数据库维护任务 {name} 超过时间上限 {job.budget}s，已中断")
+                else:
+                    result = {"error": str(e)}
+                    logger.error(f"数据库维护任务 {name} 失败: {str(e)}")
+            result["elapsed"] = round(time.monotonic() - started, 3)
+            job.last_run = started
+            job.last_finished = datetime.datetime.now()
+            job.last_result = result
+            logger.debug(f"数据库维护任务 {name} 完成: {result}")
+            return result
+
+    def start_job(self, name: str, on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> threading.Thread:
+        """
+        在后台线程执行一项任务（如整理数据库），立即返回线程对象
+        on_done 在后台线程中调用，界面代码需自行转交主线程
+        """
+        def run():
+            result = self.run_job(name)
+            if on_done is not None:
+                on_done(result)
+
+        thread = threading.Thread(target=run, name=f"Maintenance-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """各任务最近一次的执行时间与结果"""
+        return {name: {"last_finished": job.last_finished, "result": job.last_result}
+                for name, job in self.jobs.items()}
+
+    def _loop(self):
+        while not self._stop.wait(self.tick):
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"数据库维护调度出错: {str(e)}")
@@ -1,15 +1,29 @@
 """
 数据库管理模块
 """
+import os
 import sqlite3
 import hashlib
 import datetime
-from typing import List, Dict, Any, Optional, Union
+import threading
+import time
+from typing import List, Dict, Any, Optional, Union, Iterator
 from contextlib import contextmanager
 
 from config.settings import config
 from utils.logging import get_logger
 from models.entities import User
+from database.pool import ConnectionPool, DISK_VFS, memory_database_uri
+from database.migrations import run_migrations, get_schema_version, latest_version
+from database.rows import RowMode, column_names, convert_rows, row_converter
+from database.audit_writer import AuditLogWriter, make_log_entry
+from database.instrumentation import QueryProfiler
+from database.backup import BackupEngine
+from database.backup_store import BackupStore
+from database.archive import ArchiveManager
+from database.log_partitions import LogPartitions
+from database import maintenance
+from database import summaries
 
 logger = get_logger("DatabaseManager")
 
@@ -18,162 +32,254 @@ class DatabaseManager:
     """数据库管理器"""
     
     def __init__(self):
-        self.db_name = config.database.db_name
+        self.in_memory = config.database.in_memory
+        self._keeper: Optional[sqlite3.Connection] = None
+        if self.in_memory:
+            # 内存数据库在最后一个连接关闭时销毁，保活连接持有到 close() 为止（排空连接池时数据仍在）
+            self.db_name = memory_database_uri()
+            self._keeper = sqlite3.connect(self.db_name, uri=True, check_same_thread=False)
+        else:
+            self.db_name = config.database.db_name
         self._connection = None
         self._cursor = None
+        self._tx_state = threading.local()  # 当前线程的事务嵌套深度
+        self.pool = ConnectionPool(
+            self.db_name,
+            max_size=config.database.pool_size,
+            health_check_interval=config.database.pool_health_check_interval,
+            pragmas=config.database.pragmas if config.database.apply_pragmas else None,
+            uri=self.in_memory
+        )
+        self.log_partitions = LogPartitions(config.database.log_export_dir)
+        self.audit_writer = AuditLogWriter(
+            self.pool.create_connection,
+            self.log_partitions.insert,
+            batch_size=config.database.audit_batch_size,
+            flush_interval=config.database.audit_flush_interval,
+            max_queue=config.database.audit_queue_size
+        )
+        self.profiler = QueryProfiler(
+            enabled=config.database.query_stats,
+            slow_query_ms=config.database.slow_query_ms,
+            explain_slow=config.database.slow_query_explain,
+            top_n=config.database.query_stats_top_n
+        )
+        self.backup_engine = BackupEngine(
+            self.pool.create_connection,
+            config.database.backup_dir,
+            max_backups=config.database.max_backups,
+            pages_per_step=config.database.backup_pages_per_step,
+            store=BackupStore(
+                config.database.backup_dir,
+                chunk_pages=config.database.backup_chunk_pages,
+                codec=config.database.backup_compression
+            ) if config.database.backup_dedup else None
+        )
+        self.archive = ArchiveManager(self, config.database.archive_dir, config.database.archive_mmap_size)
+        self.maintenance = maintenance.MaintenanceScheduler(
+            self.pool.create_connection, self._maintenance_jobs(), tick=config.database.maintenance_tick)
+        if self.in_memory and config.database.memory_seed:
+            self.load_snapshot(config.database.memory_seed)
         self.init_database()
+        if config.database.maintenance_enabled:
+            self.maintenance.start()
+    
+    def _maintenance_jobs(self) -> List[maintenance.MaintenanceJob]:
+        """按配置生成计划维护任务（内存数据库没有 WAL 文件，不做检查点）"""
+        settings = config.database
+        budget = settings.maintenance_budget
+        wal_path = None if self.in_memory else os.path.abspath(self.db_name) + "-wal"
+        return [
+            maintenance.MaintenanceJob("checkpoint", maintenance.checkpoint_job(
+                wal_path, settings.checkpoint_passive_bytes, settings.checkpoint_truncate_bytes),
+                settings.checkpoint_interval, budget),
+            maintenance.MaintenanceJob("incremental_vacuum", maintenance.incremental_vacuum_job(
+                settings.vacuum_step_pages, settings.vacuum_min_free_pages), settings.vacuum_interval, budget),
+            maintenance.MaintenanceJob("analyze", maintenance.analyze_job(settings.analysis_limit),
+                                       settings.analyze_interval, budget),
+            maintenance.MaintenanceJob("fragmentation", maintenance.fragmentation_job(),
+                                       settings.fragmentation_interval, budget),
+            # 整库重建只能手动触发，不限时
+            maintenance.MaintenanceJob("vacuum", maintenance.full_vacuum_job, budget=None),
+        ]
      
     @contextmanager
     def get_connection(self):
-        """获取数据库连接的上下文管理器"""
-        conn = None
+        """获取数据库连接的上下文管理器（复用当前线程的池化连接）"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            conn.row_factory = sqlite3.Row
-            yield conn
+            with self.pool.connection() as conn:
+                yield conn
         except sqlite3.Error as e:
-            if conn:
-                conn.rollback()
             logger.error(f"数据库操作错误: {str(e)}")
             raise
+    
+    @contextmanager
+    def transaction(self):
+        """
+        工作单元：块内的 execute_* 与 log_operation 共用当前线程的同一连接，
+        正常退出时只提交一次，发生异常时整体回滚；嵌套调用并入最外层事务
+        """
+        with self.get_connection() as conn:
+            depth = getattr(self._tx_state, "depth", 0)
+            if depth == 0:
+                # 立即获取写锁，避免读后升级写锁时出现 SQLITE_BUSY
+                conn.execute("BEGIN IMMEDIATE")
+                self._tx_state.pending_logs = []
+            self._tx_state.depth = depth + 1
+            try:
+                yield conn
+                if depth == 0:
+                    conn.commit()
+                    # 事务提交后再把期间产生的操作日志交给后台写入器，回滚的操作不留日志
+                    if self._tx_state.pending_logs:
+                        self.audit_writer.enqueue_many(self._tx_state.pending_logs)
+            except Exception:
+                if depth == 0:
+                    conn.rollback()
+                raise
+            finally:
+                self._tx_state.depth = depth
+                if depth == 0:
+                    self._tx_state.pending_logs = []
+    
+    def in_transaction(self) -> bool:
+        """当前线程是否处于 transaction() 工作单元内"""
+        return getattr(self._tx_state, "depth", 0) > 0
+    
+    def _commit(self, conn):
+        """工作单元之外立即提交；工作单元内交由 transaction() 统一提交"""
+        if not self.in_transaction():
+            conn.commit()
+    
+    def close(self):
+        """关闭数据库管理器：停止维护线程，写完待写入的操作日志，更新统计信息后释放连接池中的全部连接"""
+        self.maintenance.stop()
+        self.audit_writer.close()
+        self.optimize()
+        self.pool.close_all()
+        if self._keeper is not None:
+            self._keeper.close()
+            self._keeper = None
+        logger.info("数据库连接已全部关闭")
+    
+    def optimize(self) -> bool:
+        """
+        在当前线程的连接上执行 PRAGMA optimize：按该连接的查询历史为统计信息过期的表重新 ANALYZE
+        （关闭前调用；analysis_limit 限制抽样行数，耗时很短）
+        """
+        try:
+            with self.get_connection() as conn:
+                conn.execute(f"PRAGMA analysis_limit = {int(config.database.analysis_limit)}").fetchall()
+                conn.execute("PRAGMA optimize").fetchall()
+            return True
+        except Exception as e:
+            logger.warning(f"PRAGMA optimize 失败: {str(e)}")
+            return False
+    
+    def readonly_uri(self) -> str:
+        """以只读方式打开当前数据库的 URI（历史查询等只读连接使用）"""
+        if self.in_memory:
+            return f"{self.db_name}&mode=ro"
+        return f"file:{os.path.abspath(self.db_name)}?mode=ro"
+    
+    def attach_target(self, path: str, read_only: bool = False) -> str:
+        """
+        在当前数据库的连接上 ATTACH 磁盘数据库文件时使用的文件名或 URI
+        只读方式要求连接以 uri=True 打开；内存库的连接默认使用 memdb VFS，须显式指定磁盘 VFS
+        """
+        if self.in_memory:
+            return f"file:{os.path.abspath(path)}?vfs={DISK_VFS}" + ("&mode=ro" if read_only else "")
+        return f"file:{os.path.abspath(path)}?mode=ro" if read_only else path
+    
+    def load_snapshot(self, path: str) -> int:
+        """
+        把快照（数据库文件或备份清单）整体载入当前数据库，用于给内存数据库提供初始数据；
+        快照须通过与恢复备份相同的校验，返回载入的页数
+        :raises ValueError: 快照校验不通过
+        """
+        source_path, temporary = self.backup_engine.prepare_restore(path)
+        try:
+            pages = self.backup_engine.restore_into(source_path)
+            logger.info(f"已载入数据库快照: {path}，{pages} 页")
+            return pages
         finally:
-            if conn:
-                conn.close()
+            if temporary:
+                os.remove(source_path)
+    
+    def restore_backup(self, backup_path: str, user: Optional[str] = None,
+                       drain_timeout: float = 30.0) -> Optional[str]:
+        """
+        热恢复：无需重启程序
+        1. 校验备份（完整性、核心表、表结构版本）
+        2. 在线备份当前数据库作为安全副本
+        3. 写完待写入的操作日志，排空连接池
+        4. 通过备份 API 把备份整体写入当前数据库
+        5. 执行迁移，把旧版本备份升级到当前表结构
+        :return: 恢复前安全副本的路径
+        :raises ValueError: 备份校验不通过；RuntimeError: 安全备份失败或连接池无法排空
+        """
+        engine = self.backup_engine
+        source_path, temporary = engine.prepare_restore(backup_path)
+        try:
+            safety = engine.backup("before_restore", cleanup=False)
+            if not safety.ok:
+                raise RuntimeError(f"备份当前数据失败，已取消恢复: {safety.error}")
+            
+            self.audit_writer.close()
+            self.maintenance.stop()
+            if not self.pool.drain(drain_timeout):
+                raise RuntimeError("仍有数据库操作未结束，请稍后重试")
+            try:
+                pages = engine.restore_into(source_path)
+            finally:
+                self.pool.resume()
+            
+            self.log_partitions.forget()
+            self.init_database()
+            logger.info(f"数据库热恢复完成: {backup_path}，{pages} 页，安全副本: {safety.path}")
+            if user:
+                self.log_operation(user, 'restore', 'database', os.path.basename(backup_path),
+                                   f'从备份恢复数据库，恢复前副本：{os.path.basename(safety.path)}', sync=True)
+            return safety.path
+        finally:
+            if temporary:
+                os.remove(source_path)
+            if config.database.maintenance_enabled:
+                self.maintenance.start()
+    
+    def rebuild_summaries(self) -> Optional[Dict[str, int]]:
+        """由明细表重建收款/押金/开票月度汇总表及押金余额表（触发器维护出现偏差或批量导入后使用）；失败返回 None"""
+        try:
+            with self.transaction() as conn:
+                result = summaries.rebuild_summaries(conn)
+                result[summaries.DEPOSIT_BALANCE_TABLE] = summaries.rebuild_deposit_balances(conn)
+                return result
+        except Exception as e:
+            logger.error(f"重建月度汇总表失败: {str(e)}")
+            return None
+    
+    def checkpoint(self, mode: str = "TRUNCATE") -> bool:
+        """将 WAL 中的内容写回主数据库文件（复制数据库文件前调用）"""
+        try:
+            with self.get_connection() as conn:
+                busy, _, _ = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+                if busy:
+                    logger.warning("WAL 检查点未能完成：存在活动的读写连接")
+                return not busy
+        except Exception as e:
+            logger.error(f"WAL 检查点失败: {str(e)}")
+            return False
     
     def init_database(self):
-        """初始化数据库表结构"""
+        """初始化数据库表结构（按 user_version 执行未完成的迁移）"""
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # 创建用户表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        role TEXT NOT NULL CHECK(role IN ('admin', 'operator', 'viewer')),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # 创建合同表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS contracts (
-                        contract_id TEXT PRIMARY KEY,
-                        customer_name TEXT NOT NULL,
-                        room_number TEXT NOT NULL,
-                        area REAL DEFAULT 0,
-                        total_rent REAL DEFAULT 0,
-                        initial_total_rent REAL DEFAULT 0,
-                        payment_name TEXT NOT NULL,
-                        eas_code TEXT NOT NULL,
-                        tax_rate REAL DEFAULT 0.05,
-                        need_adjust_income INTEGER DEFAULT 0,
-                        deposit_amount REAL DEFAULT 0,
-                        create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        initial_stamp_duty REAL DEFAULT 0,
-                        created_by TEXT NOT NULL,
-                        is_effective INTEGER NOT NULL DEFAULT 0,
-                        effective_date DATE,
-                        contract_type TEXT NOT NULL CHECK(contract_type IN ('新增', '续租', '变更')),
-                        original_contract_id TEXT,
-                        FOREIGN KEY (original_contract_id) REFERENCES contracts(contract_id) ON DELETE SET NULL
-                    )
-                ''')
-                
-                # 创建租金期表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS rent_periods (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        contract_id TEXT NOT NULL,
-                        start_date DATE NOT NULL,
-                        end_date DATE NOT NULL,
-                        monthly_rent REAL NOT NULL,
-                        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
-                    )
-                ''')
-                
-                # 创建免租期表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS free_periods (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        contract_id TEXT NOT NULL,
-                        start_date DATE NOT NULL,
-                        end_date DATE NOT NULL,
-                        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
-                    )
-                ''')
-                
-                # 创建收款记录表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS payment_records (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        contract_id TEXT NOT NULL,
-                        date DATE NOT NULL,
-                        amount REAL NOT NULL,
-                        payment_type TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        created_by TEXT NOT NULL,
-                        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
-                    )
-                ''')
-                
-                # 创建押金记录表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS deposit_records (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        contract_id TEXT NOT NULL,
-                        date DATE NOT NULL,
-                        amount REAL NOT NULL,
-                        record_type TEXT NOT NULL CHECK(record_type IN ('收取', '退还')),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        created_by TEXT NOT NULL,
-                        remark TEXT DEFAULT "",
-                        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
-                    )
-                ''')
-                
-                # 创建开票记录表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS invoice_records (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        contract_id TEXT NOT NULL,
-                        date DATE NOT NULL,
-                        amount REAL NOT NULL,
-                        tax_amount REAL DEFAULT 0,
-                        invoice_number TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        created_by TEXT NOT NULL,
-                        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
-                    )
-                ''')
-                
-                # 创建操作日志表
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS operation_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user TEXT NOT NULL,
-                        operation_type TEXT NOT NULL,
-                        target_type TEXT NOT NULL,
-                        target_id TEXT NOT NULL,
-                        details TEXT,
-                        operation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # 添加初始管理员用户
-                cursor.execute("SELECT * FROM users WHERE username = 'admin'")
-                if not cursor.fetchone():
-                    admin_hash = hashlib.sha256("admin123".encode()).hexdigest()
-                    cursor.execute('''
-                        INSERT INTO users (username, password_hash, role)
-                        VALUES ('admin', ?, 'admin')
-                    ''', (admin_hash,))
-                    logger.info("初始管理员用户创建成功")
-                
-                conn.commit()
-                logger.info("数据库表结构初始化完成")
+                current = get_schema_version(conn)
+                if current >= latest_version():
+                    logger.debug(f"数据库表结构已是最新版本 v{current}")
+                    return
+                version = run_migrations(conn)
+                logger.info(f"数据库表结构初始化完成: v{current} -> v{version}")
                 
         except Exception as e:
             logger.error(f"数据库初始化失败: {str(e)}")
@@ -202,73 +308,208 @@ class DatabaseManager:
             logger.error(f"用户验证失败: {str(e)}")
             return None
     
-    def execute_query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
-        """执行查询并返回结果"""
+    def execute_query(self, sql: str, params: tuple = (),
+                      row_mode: Union[RowMode, str] = RowMode.DICT,
+                      row_type: Optional[type] = None) -> Union[List[Any], Dict[str, List[Any]]]:
+        """
+        执行查询并返回结果
+        :param row_mode: 结果形态，默认每行一个字典；TUPLE/NAMEDTUPLE/COLUMNAR 可省去字典的分配开销
+        :param row_type: NAMEDTUPLE 模式下预先声明的行类（namedtuple 或 __slots__ 类）
+        """
+        mode = RowMode(row_mode)
+        started = time.perf_counter()
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
+                if mode is RowMode.DICT:
+                    cursor.execute(sql, params)
+                    result = cursor.fetchall()
+                    self._record(conn, sql, params, started, len(result))
+                    return [dict(row) for row in result] if result else []
+                cursor.row_factory = None
                 cursor.execute(sql, params)
                 result = cursor.fetchall()
-                return [dict(row) for row in result] if result else []
+                self._record(conn, sql, params, started, len(result))
+                return convert_rows(mode, column_names(cursor), result, row_type)
         except Exception as e:
+            self._record(None, sql, params, started, error=True)
             logger.error(f"查询执行失败: SQL={sql}, 参数={params}, 错误={str(e)}")
-            return []
+            return {} if mode is RowMode.COLUMNAR else []
+    
+    def iter_query(self, sql: str, params: tuple = (), batch_size: int = 500,
+                   row_mode: Union[RowMode, str] = RowMode.DICT,
+                   row_type: Optional[type] = None) -> Iterator[Any]:
+        """
+        流式执行查询，按 batch_size 分批 fetchmany 逐行产出（COLUMNAR 模式按批产出列字典）
+        迭代期间占用当前线程的连接；调用方提前结束迭代时连接随生成器关闭而归还
+        """
+        mode = RowMode(row_mode)
+        started = time.perf_counter()
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.arraysize = batch_size
+                cursor.execute(sql, params)
+                columns = column_names(cursor)
+                converter = None if mode is RowMode.COLUMNAR else row_converter(mode, columns, row_type)
+                # 计时只统计取数耗时，不含调用方处理每批结果的时间
+                elapsed, fetched = time.perf_counter() - started, 0
+                try:
+                    while True:
+                        fetch_started = time.perf_counter()
+                        rows = cursor.fetchmany()
+                        elapsed += time.perf_counter() - fetch_started
+                        if not rows:
+                            break
+                        fetched += len(rows)
+                        if mode is RowMode.COLUMNAR:
+                            yield convert_rows(mode, columns, rows)
+                        elif converter is None:
+                            yield from rows
+                        else:
+                            yield from map(converter, rows)
+                finally:
+                    cursor.close()
+                    self.profiler.record(sql, params, elapsed, fetched, conn)
+        except sqlite3.Error as e:
+            self._record(None, sql, params, started, error=True)
+            logger.error(f"流式查询失败: SQL={sql}, 参数={params}, 错误={str(e)}")
+            raise
     
     def execute_command(self, sql: str, params: tuple = ()) -> bool:
         """执行命令（INSERT, UPDATE, DELETE）"""
+        started = time.perf_counter()
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(sql, params)
-                conn.commit()
+                self._commit(conn)
+                self._record(conn, sql, params, started, cursor.rowcount)
                 return True
         except Exception as e:
+            self._record(None, sql, params, started, error=True)
             logger.error(f"命令执行失败: SQL={sql}, 参数={params}, 错误={str(e)}")
             return False
 
     # 新增：执行INSERT并返回自增ID
     def execute_return_id(self, sql: str, params: tuple = ()) -> Optional[int]:
         """执行插入语句并返回新记录的ID"""
+        started = time.perf_counter()
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(sql, params)
-                conn.commit()
+                self._commit(conn)
+                self._record(conn, sql, params, started, cursor.rowcount)
                 return cursor.lastrowid  # 返回自增ID
         except Exception as e:
+            self._record(None, sql, params, started, error=True)
             logger.error(f"插入并返回ID失败: SQL={sql}, 参数={params}, 错误={str(e)}")
             return None  # 失败时返回None
 
     
     def execute_command_with_id(self, sql: str, params: tuple = ()) -> Optional[int]:
         """执行命令并返回最后插入的ID"""
+        started = time.perf_counter()
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute(sql, params)
                 last_id = cursor.lastrowid
-                conn.commit()
+                self._commit(conn)
+                self._record(conn, sql, params, started, cursor.rowcount)
                 return last_id
         except Exception as e:
+            self._record(None, sql, params, started, error=True)
             logger.error(f"命令执行失败: SQL={sql}, 参数={params}, 错误={str(e)}")
             return None
     
     def execute_batch(self, sql: str, params_list: List[tuple]) -> bool:
         """批量执行命令"""
+        started = time.perf_counter()
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.executemany(sql, params_list)
-                conn.commit()
+                self._commit(conn)
+                # 批量语句的执行计划以首组参数获取
+                self._record(conn, sql, params_list[0] if params_list else (), started, cursor.rowcount)
                 return True
         except Exception as e:
+            self._record(None, sql, (), started, error=True)
             logger.error(f"批量执行失败: SQL={sql}, 错误={str(e)}")
             return False
     
     def log_operation(self, user: str, operation_type: str, target_type: str, 
-                     target_id: str, details: str = None):
-        """记录操作日志"""
-        self.execute_command('''
-            INSERT INTO operation_logs (user, operation_type, target_type, target_id, details)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user, operation_type, target_type, target_id, details))
+                     target_id: str, details: str = None, sync: bool = False):
+        """
+        记录操作日志
+        默认交给后台写入器批量写入；sync=True（或关闭 audit_async）时在当前连接上同步写入，
+        处于 transaction() 内时随事务一起提交
+        """
+        entry = make_log_entry(user, operation_type, target_type, target_id, details)
+        if sync or not config.database.audit_async:
+            try:
+                with self.get_connection() as conn:
+                    self.log_partitions.insert(conn, [entry])
+                    self._commit(conn)
+            except Exception as e:
+                logger.error(f"操作日志写入失败: {entry}, 错误={str(e)}")
+            return
+        
+        if self.in_transaction():
+            self._tx_state.pending_logs.append(entry)
+        else:
+            self.audit_writer.enqueue(entry)
+    
+    def flush_logs(self, timeout: float = 5.0) -> bool:
+        """等待后台写入器写完已提交的操作日志（查看或清理日志前调用）"""
+        return self.audit_writer.flush(timeout)
+    
+    def page_logs(self, limit: int = 200, before: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """
+        按时间倒序分页读取操作日志，只读取凑满一页所需的月份分区
+        :param before: 上一页最后一条的 (operation_time, id)
+        """
+        try:
+            with self.get_connection() as conn:
+                return self.log_partitions.page(conn, limit, before)
+        except Exception as e:
+            logger.error(f"读取操作日志失败: {str(e)}")
+            return []
+    
+    def purge_logs(self, keep_months: Optional[int] = None, export: bool = True) -> Optional[tuple]:
+        """
+        按保留期整月删除操作日志分区（删除前导出为压缩 JSONL），不再逐行 DELETE
+        :param keep_months: 保留当月及之前 keep_months-1 个月的日志，0 表示全部删除；默认取配置
+        :return: (删除的日志条数, 导出文件列表)；失败返回 None
+        """
+        keep_months = config.database.log_retention_months if keep_months is None else keep_months
+        before_month = None
+        if keep_months > 0:
+            # 分区按 UTC 时间划分，与 operation_time 一致
+            today = datetime.datetime.now(datetime.timezone.utc).date()
+            index = today.year * 12 + today.month - 1 - (keep_months - 1)
+            before_month = f"{index // 12:04d}{index % 12 + 1:02d}"
+        try:
+            self.flush_logs()
+            with self.transaction() as conn:
+                removed, exported = self.log_partitions.drop_partitions(conn, before_month, export)
+            logger.info(f"操作日志清理完成: 删除 {removed} 条，导出 {len(exported)} 个文件")
+            return removed, exported
+        except Exception as e:
+            logger.error(f"清理操作日志失败: {str(e)}")
+            return None
+    
+    def _record(self, conn, sql: str, params, started: float, rows: int = 0, error: bool = False):
+        """把一次执行的耗时与行数交给查询统计"""
+        self.profiler.record(sql, params, time.perf_counter() - started, rows, conn, error)
+    
+    def dump_query_stats(self, top_n: Optional[int] = None, key: str = "total_time") -> str:
+        """输出查询统计报表（按总耗时等排序的前 N 条语句指纹），同时写入日志"""
+        return self.profiler.dump(top_n, key)
+    
+    def reset_query_stats(self):
+        """清空查询统计"""
+        self.profiler.reset()
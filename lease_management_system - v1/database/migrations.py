@@ -0,0 +1,583 @@
+"""
+数据库迁移模块 - 基于 PRAGMA user_version 的版本化表结构迁移
+"""
+import re
+import sqlite3
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from database.log_partitions import create_partition, rebuild_view
+from database.summaries import (DATE_ORDINAL_COLUMNS, DATE_ORDINAL_SUFFIX, DEPOSIT_BALANCE_TABLE, MONEY_COLUMNS,
+                                PERIOD_COLUMN, PERIOD_TABLES, SUMMARIES, cents_sql, create_deposit_balances,
+                                create_summary_tables, drop_summary_tables, money_definition, ordinal_sql,
+                                period_expr, rebuild_deposit_balances, rebuild_summaries)
+from utils.logging import get_logger
+
+logger = get_logger("Migrations")
+
+
+@dataclass(frozen=True)
+class Migration:
+    """单个迁移步骤"""
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+    rebuilds_tables: Tuple[str, ...] = ()   # 重建的表（执行期间需关闭外键约束，完成后检查这些表的外键）
+
+
+# 已注册的迁移，按版本号升序执行
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str, rebuilds_tables: Tuple[str, ...] = ()):
+    """注册迁移步骤的装饰器，版本号必须连续递增"""
+    def decorator(func: Callable[[sqlite3.Connection], None]):
+        expected = MIGRATIONS[-1].version + 1 if MIGRATIONS else 1
+        if version != expected:
+            raise ValueError(f"迁移版本号不连续: 期望 {expected}，实际 {version}")
+        MIGRATIONS.append(Migration(version, description, func, tuple(rebuilds_tables)))
+        return func
+    return decorator
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """读取当前数据库的表结构版本"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version() -> int:
+    """最新的表结构版本"""
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def run_migrations(conn: sqlite3.Connection, target: Optional[int] = None) -> int:
+    """
+    将数据库迁移到最新版本（或指定的 target 版本，用于验证迁移前后的数据一致性）
+    表结构已是最新时不执行任何 DDL；每个迁移步骤在独立事务中执行并同步更新 user_version
+    :return: 迁移后的版本号
+    """
+    current = get_schema_version(conn)
+    target = latest_version() if target is None else target
+    if current >= target:
+        return current
+
+    for step in MIGRATIONS:
+        if step.version <= current or step.version > target:
+            continue
+        foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+        try:
+            # 重建表时删除旧表不能触发级联删除/置空，外键开关只能在事务外切换
+            if step.rebuilds_tables and foreign_keys:
+                conn.execute("PRAGMA foreign_keys = OFF")
+            # IMMEDIATE 事务防止多个进程同时迁移；加锁后重新确认版本
+            conn.execute("BEGIN IMMEDIATE")
+            if get_schema_version(conn) >= step.version:
+                conn.rollback()
+                continue
+            step.apply(conn)
+            # 只检查本步骤重建的表：其他表中早期版本遗留的不一致与本次重建无关，不阻止迁移
+            violations = [row for table in step.rebuilds_tables
+                          for row in conn.execute(f"PRAGMA foreign_key_check({table})").fetchall()]
+            if violations:
+                raise sqlite3.IntegrityError(f"重建后存在 {len(violations)} 处外键不一致，例如 {tuple(violations[0])}")
+            conn.execute(f"PRAGMA user_version = {step.version}")
+            conn.commit()
+            logger.info(f"数据库迁移完成: v{step.version} {step.description}")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"数据库迁移失败: v{step.version} {step.description}, 错误={str(e)}")
+            raise
+        finally:
+            if step.rebuilds_tables and foreign_keys:
+                conn.execute("PRAGMA foreign_keys = ON")
+    return get_schema_version(conn)
+
+
+@migration(1, "核心业务表与初始管理员")
+def _create_core_tables(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+
+    # 创建用户表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('admin', 'operator', 'viewer')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 创建合同表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contracts (
+            contract_id TEXT PRIMARY KEY,
+            customer_name TEXT NOT NULL,
+            room_number TEXT NOT NULL,
+            area REAL DEFAULT 0,
+            total_rent REAL DEFAULT 0,
+            initial_total_rent REAL DEFAULT 0,
+            payment_name TEXT NOT NULL,
+            eas_code TEXT NOT NULL,
+            tax_rate REAL DEFAULT 0.05,
+            need_adjust_income INTEGER DEFAULT 0,
+            deposit_amount REAL DEFAULT 0,
+            create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            initial_stamp_duty REAL DEFAULT 0,
+            created_by TEXT NOT NULL,
+            is_effective INTEGER NOT NULL DEFAULT 0,
+            effective_date DATE,
+            contract_type TEXT NOT NULL CHECK(contract_type IN ('新增', '续租', '变更')),
+            original_contract_id TEXT,
+            FOREIGN KEY (original_contract_id) REFERENCES contracts(contract_id) ON DELETE SET NULL
+        )
+    ''')
+
+    # 创建租金期表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rent_periods (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contract_id TEXT NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            monthly_rent REAL NOT NULL,
+            FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # 创建免租期表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS free_periods (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contract_id TEXT NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # 创建收款记录表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payment_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contract_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            amount REAL NOT NULL,
+            payment_type TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by TEXT NOT NULL,
+            FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # 创建押金记录表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS deposit_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contract_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            amount REAL NOT NULL,
+            record_type TEXT NOT NULL CHECK(record_type IN ('收取', '退还')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by TEXT NOT NULL,
+            remark TEXT DEFAULT "",
+            FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # 创建开票记录表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contract_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            amount REAL NOT NULL,
+            tax_amount REAL DEFAULT 0,
+            invoice_number TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by TEXT NOT NULL,
+            FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # 创建操作日志表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS operation_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user TEXT NOT NULL,
+            operation_type TEXT NOT NULL,
+            target_type TEXT NOT NULL,
+            target_id TEXT NOT NULL,
+            details TEXT,
+            operation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 添加初始管理员用户
+    cursor.execute("SELECT * FROM users WHERE username = 'admin'")
+    if not cursor.fetchone():
+        admin_hash = hashlib.sha256("admin123".encode()).hexdigest()
+        cursor.execute('''
+            INSERT INTO users (username, password_hash, role)
+            VALUES ('admin', ?, 'admin')
+        ''', (admin_hash,))
+        logger.info("初始管理员用户创建成功")
+
+
+@migration(2, "核算模块表")
+def _create_accounting_tables(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+
+    # 1. 月度收入表（存储会计/税法口径不含税收入）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS monthly_income (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        contract_id TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        accounting_income REAL DEFAULT 0.0,  -- 会计不含税收入
+        tax_income REAL DEFAULT 0.0,         -- 税法不含税收入
+        tax_rate REAL NOT NULL,              -- 适用税率（如0.05）
+        is_adjust INTEGER NOT NULL,          -- 1=需调整收入，0=无需调整
+        calculate_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE,
+        UNIQUE(contract_id, year, month)     -- 同一合同每月仅一条记录
+    )
+    ''')
+
+    # 2. 收入记录表
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS income_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        contract_id TEXT NOT NULL,
+        income_date DATE NOT NULL,  -- 收入确认日期
+        accounting_income REAL NOT NULL,  -- 会计收入
+        tax_income REAL NOT NULL,         -- 税法收入
+        source_type TEXT NOT NULL,  -- 来源：monthly（月度自动）/manual（手动调整）
+        source_id INTEGER,          -- 关联月度收入表ID
+        is_invoiced INTEGER DEFAULT 0,  -- 是否已开票
+        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+    )
+    ''')
+
+    # 3. 增值税记录表（收款/开票/应收孰早原则）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS vat_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        contract_id TEXT NOT NULL,
+        relate_type TEXT NOT NULL,  -- 触发类型：receivable(应收)/payment(收款)/invoice(开票)/overpaid/overpaid_reverse
+        relate_id TEXT NOT NULL,    -- 关联ID（UUID或对应表ID）
+        vat_amount REAL NOT NULL,   -- 增值税额（保留2位小数）
+        tax_obligation_date DATE NOT NULL,  -- 纳税义务日期（孰早）
+        status TEXT NOT NULL DEFAULT 'pending',  -- pending=待缴，paid=已缴
+        payment_date DATE,          -- 实际缴税日期（可为NULL）
+        remark TEXT,                -- 备注
+        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+    )
+    ''')
+
+    # 4. 税会差异表（含递延所得税和待转销项税额）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tax_diff (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        contract_id TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        accounting_income REAL NOT NULL,  -- 会计不含税收入
+        tax_income REAL NOT NULL,         -- 税法不含税收入
+        diff_amount REAL NOT NULL,        -- 税会差异（会计-税法）
+        deferred_tax REAL NOT NULL,       -- 递延所得税（差异×25%）
+        to_be_settled_vat REAL NOT NULL,  -- 待转销项税额（会计收入×税率）
+        adjust_vat REAL NOT NULL,         -- 冲减待转销项税额（税法收入×税率）
+        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE,
+        UNIQUE(contract_id, year, month)
+    )
+    ''')
+
+    # 5. 开票详情表（扩展原有开票记录，增加关联字段）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS invoice_details (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        invoice_number TEXT NOT NULL UNIQUE,  -- 发票号（唯一，避免重复开票）
+        contract_id TEXT NOT NULL,
+        invoice_date DATE NOT NULL,          -- 开票日期
+        total_amount REAL NOT NULL,          -- 发票含税总金额
+        vat_amount REAL NOT NULL,            -- 发票增值税额
+        relate_payment_id INTEGER,           -- 关联收款记录ID（关联payment_records.id）
+        relate_income_year INTEGER,          -- 关联收入年份（如2025）
+        relate_income_month INTEGER,         -- 关联收入月份（如6）
+        status TEXT NOT NULL DEFAULT 'valid', -- valid=有效，invalid=红冲
+        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE,
+        FOREIGN KEY (relate_payment_id) REFERENCES payment_records(id) ON DELETE SET NULL
+    )
+    ''')
+
+    # 6. 押金明细表（区分应付/实付，补充原有押金记录）
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS deposit_details (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        contract_id TEXT NOT NULL,
+        planned_deposit REAL NOT NULL,  -- 应付押金（合同约定金额）
+        actual_deposit REAL NOT NULL,   -- 实付押金（实际收取金额）
+        deposit_date DATE,              -- 实付押金日期（可为NULL）
+        remark TEXT,                    -- 备注（如"2025-06-10银行转账"）
+        FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE,
+        UNIQUE(contract_id)  -- 一个合同仅一条押金明细
+    )
+    ''')
+
+    # 创建唯一索引
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_vat_unique 
+    ON vat_records (contract_id, relate_type, relate_id, tax_obligation_date)
+    ''')
+
+
+@migration(3, "热点查询索引")
+def _create_performance_indexes(conn: sqlite3.Connection):
+    indexes = [
+        # 合同列表按创建时间倒序
+        "CREATE INDEX IF NOT EXISTS idx_contracts_create_time ON contracts (create_time)",
+        # 合同关联的租金期/免租期按开始日期加载
+        "CREATE INDEX IF NOT EXISTS idx_rent_periods_contract ON rent_periods (contract_id, start_date)",
+        "CREATE INDEX IF NOT EXISTS idx_free_periods_contract ON free_periods (contract_id, start_date)",
+        # 单合同收款/押金/开票记录按日期排序
+        "CREATE INDEX IF NOT EXISTS idx_payment_records_contract_date ON payment_records (contract_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_deposit_records_contract_date ON deposit_records (contract_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_invoice_records_contract_date ON invoice_records (contract_id, date)",
+        # 月度汇总的覆盖索引：按日期范围过滤后无需回表
+        "CREATE INDEX IF NOT EXISTS idx_payment_records_date ON payment_records (date, payment_type, amount)",
+        "CREATE INDEX IF NOT EXISTS idx_deposit_records_date ON deposit_records (date, record_type, amount)",
+        "CREATE INDEX IF NOT EXISTS idx_invoice_records_date ON invoice_records (date, amount, tax_amount)",
+        # 操作日志按时间清理和倒序查看
+        "CREATE INDEX IF NOT EXISTS idx_operation_logs_time ON operation_logs (operation_time)",
+        # 增值税按纳税义务日期查询，待缴记录使用部分索引
+        "CREATE INDEX IF NOT EXISTS idx_vat_records_date ON vat_records (tax_obligation_date)",
+        "CREATE INDEX IF NOT EXISTS idx_vat_records_pending "
+        "ON vat_records (contract_id, relate_type, tax_obligation_date) WHERE status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS idx_invoice_details_contract_date ON invoice_details (contract_id, invoice_date)",
+        "CREATE INDEX IF NOT EXISTS idx_income_records_contract_date ON income_records (contract_id, income_date)",
+    ]
+    for sql in indexes:
+        conn.execute(sql)
+    # 为新索引收集统计信息，帮助查询规划器选择索引
+    conn.execute("ANALYZE")
+
+
+@migration(4, "外键子表索引")
+def _create_foreign_key_indexes(conn: sqlite3.Connection):
+    # 删除收款记录/合同时 ON DELETE SET NULL 需按外键列查找子表行，缺少索引会整表扫描
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoice_details_payment ON invoice_details (relate_payment_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_contracts_original ON contracts (original_contract_id)")
+
+
+@migration(5, "操作日志按月分区")
+def _partition_operation_logs(conn: sqlite3.Connection):
+    # 原 operation_logs 表按操作时间的月份拆入 operation_logs_YYYYMM 分区，保留原 id，再以同名视图合并
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'operation_logs'").fetchone()
+    if legacy:
+        conn.execute("ALTER TABLE operation_logs RENAME TO operation_logs_legacy")
+        time_expr = "COALESCE(operation_time, CURRENT_TIMESTAMP)"
+        month_expr = f"substr({time_expr}, 1, 4) || substr({time_expr}, 6, 2)"
+        months = [row[0] for row in conn.execute(f"SELECT DISTINCT {month_expr} FROM operation_logs_legacy")]
+        for month in sorted(months):
+            name = f"operation_logs_{month}"
+            create_partition(conn, name)
+            conn.execute(f'''
+                INSERT INTO {name} (id, user, operation_type, target_type, target_id, details, operation_time)
+                SELECT id, user, operation_type, target_type, target_id, details, operation_time
+                FROM operation_logs_legacy WHERE {month_expr} = ?
+            ''', (month,))
+        conn.execute("DROP TABLE operation_logs_legacy")
+    rebuild_view(conn)
+
+
+# 合同全文索引覆盖的列（与 ContractService.search 一致）
+CONTRACT_FTS_COLUMNS = ("contract_id", "customer_name", "room_number", "payment_name", "eas_code")
+
+
+@migration(6, "合同全文检索索引")
+def _create_contract_fts(conn: sqlite3.Connection):
+    # 外部内容表：索引不重复存储列值；trigram 分词支持中文及任意子串检索（至少 3 个字符）
+    columns = ", ".join(CONTRACT_FTS_COLUMNS)
+    old_values = ", ".join(f"old.{column}" for column in CONTRACT_FTS_COLUMNS)
+    new_values = ", ".join(f"new.{column}" for column in CONTRACT_FTS_COLUMNS)
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS contracts_fts USING fts5(
+                {columns}, content='contracts', content_rowid='rowid', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite 未编译 FTS5 时跳过，合同搜索退化为 LIKE 匹配
+        logger.warning(f"当前 SQLite 不支持 FTS5 全文索引，合同搜索将使用 LIKE 匹配: {str(e)}")
+        return
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contracts_fts_insert AFTER INSERT ON contracts BEGIN
+            INSERT INTO contracts_fts (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contracts_fts_delete AFTER DELETE ON contracts BEGIN
+            INSERT INTO contracts_fts (contracts_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contracts_fts_update AFTER UPDATE OF {columns} ON contracts BEGIN
+            INSERT INTO contracts_fts (contracts_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO contracts_fts (rowid, {columns}) VALUES (new.rowid, {new_values});
+        END
+    ''')
+    conn.execute("INSERT INTO contracts_fts (contracts_fts) VALUES ('rebuild')")
+
+
+def repair_orphan_rows(conn: sqlite3.Connection, tables: Sequence[str]) -> Dict[str, int]:
+    """
+    补做早期版本遗漏的外键删除动作：早期版本未开启外键约束，删除合同/收款时明细未级联删除、关联未置空，
+    遗留的行会使按外键约束写入的汇总表、重建后的外键检查失败。引用已不存在父记录的行按外键定义处理：
+    ON DELETE CASCADE 的删除，ON DELETE SET NULL 的置空关联列；按 tables 的顺序处理（父表在前）
+    :return: 表名 -> 处理的行数
+    """
+    result = {}
+    for table in tables:
+        actions = {row[0]: (row[6].upper(), row[3]) for row in conn.execute(f"PRAGMA foreign_key_list({table})")}
+        touched = set()
+        for _, rowid, parent, fkid in conn.execute(f"PRAGMA foreign_key_check({table})").fetchall():
+            action, column = actions[fkid]
+            if action == "CASCADE":
+                conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (rowid,))
+            elif action == "SET NULL":
+                conn.execute(f"UPDATE {table} SET {column} = NULL WHERE rowid = ?", (rowid,))
+            else:
+                continue
+            touched.add(rowid)
+        if touched:
+            result[table] = len(touched)
+    if result:
+        logger.warning(f"已清理引用已删除记录的明细（早期版本删除合同时未级联处理）: {result}")
+    return result
+
+
+@migration(7, "收款/押金/开票月度汇总表")
+def _create_monthly_summaries(conn: sqlite3.Connection):
+    # 汇总表由触发器随明细增删改同步维护，建表后按现有明细生成一次；
+    # 汇总表引用合同表，先清理已删除合同遗留的明细
+    repair_orphan_rows(conn, [spec.source for spec in SUMMARIES])
+    create_summary_tables(conn)
+    rebuild_summaries(conn)
+
+
+@migration(8, "合同押金余额表")
+def _create_deposit_balances(conn: sqlite3.Connection):
+    # 押金余额由触发器随押金记录同步维护，余额非负由表约束保证；建表后按现有记录生成一次
+    create_deposit_balances(conn)
+    rebuild_deposit_balances(conn)
+
+
+@migration(9, "明细表月份生成列")
+def _add_period_columns(conn: sqlite3.Connection):
+    # ALTER TABLE 只能添加 VIRTUAL 生成列；月份值由 (yyyymm, contract_id) 索引实际存储，按月查询为索引区间扫描
+    for table in PERIOD_TABLES:
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")}
+        if PERIOD_COLUMN not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {PERIOD_COLUMN} INTEGER "
+                         f"GENERATED ALWAYS AS ({period_expr(table)}) VIRTUAL")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{PERIOD_COLUMN} "
+                     f"ON {table} ({PERIOD_COLUMN}, contract_id)")
+    conn.execute("ANALYZE")
+
+
+def rebuild_table(conn: sqlite3.Connection, table: str, transform: Callable[[str], str],
+                  copy_exprs: Dict[str, str]):
+    """
+    按 SQLite 推荐的步骤重建表（须在关闭外键约束的迁移中调用）：以变换后的建表语句建新表、复制数据、
+    删除旧表、改名，再恢复旧表上的索引和触发器；AUTOINCREMENT 序列保持不变，已删除记录的 id 不会被复用
+    :param transform: 原建表语句 -> 新建表语句（表名不变）
+    :param copy_exprs: 新表列 -> 由旧表取值的表达式；未列出的普通列按同名复制
+    """
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,))]
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+
+    staging = f"{table}_rebuild"
+    new_sql = re.sub(rf"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?[\"`]?{table}\b[\"`]?", f"CREATE TABLE {staging}",
+                     transform(sql), count=1, flags=re.I)
+    conn.execute(new_sql)
+    old_columns = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})") if row[6] == 0}
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_xinfo({staging})")
+               if row[6] == 0 and (row[1] in copy_exprs or row[1] in old_columns)]
+    conn.execute(f"INSERT INTO {staging} ({', '.join(columns)}) "
+                 f"SELECT {', '.join(copy_exprs.get(name, name) for name in columns)} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+    for dependent in dependents:
+        conn.execute(dependent)
+    if sequence:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence[0], table))
+
+
+# 迁移为整数分存储的明细表（汇总表、押金余额表由触发器维护，删除后按新结构重建）
+LEDGER_TABLES = ("payment_records", "deposit_records", "invoice_records", "invoice_details", "vat_records")
+
+
+@migration(10, "金额改为整数分存储", rebuilds_tables=LEDGER_TABLES)
+def _store_money_as_cents(conn: sqlite3.Connection):
+    # 旧的 REAL 金额列改为 <列名>_cents 整数列，同名列保留为生成列，按元读取金额的旧语句不需修改；
+    # 重建后检查外键，先清理早期版本遗留的、引用已删除合同/收款的明细
+    drop_summary_tables(conn)
+    repair_orphan_rows(conn, LEDGER_TABLES)
+    for table in LEDGER_TABLES:
+        columns = MONEY_COLUMNS[table]
+
+        def transform(sql: str, columns=columns) -> str:
+            for column in columns:
+                sql = re.sub(rf"(?m)^(\s*){column}\s+REAL\b([^,\n]*?)(\s*)(?=,|$)",
+                             lambda m: f"{m.group(1)}{money_definition(column, m.group(2).strip())}"
+                                       f"{m.group(3)}", sql, count=1)
+            return sql
+
+        rebuild_table(conn, table, transform, {f"{column}_cents": cents_sql(column) for column in columns})
+    create_summary_tables(conn)
+    rebuild_summaries(conn)
+    create_deposit_balances(conn)
+    rebuild_deposit_balances(conn)
+    conn.execute("ANALYZE")
+
+
+@migration(11, "日期序数生成列")
+def _add_date_ordinal_columns(conn: sqlite3.Connection):
+    # 文本日期旁增加整数日期序数列（VIRTUAL，由索引实际存储）：加载时按序数构建 date 对象，日期区间按整数比较
+    for table, columns in DATE_ORDINAL_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")}
+        for column in columns:
+            if column + DATE_ORDINAL_SUFFIX not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}{DATE_ORDINAL_SUFFIX} INTEGER "
+                             f"GENERATED ALWAYS AS ({ordinal_sql(column)}) VIRTUAL")
+    # 按日期文本排序/过滤的索引改为按序数
+    replaced = [
+        ("idx_rent_periods_contract", "idx_rent_periods_contract_ord", "rent_periods (contract_id, start_date_ord)"),
+        ("idx_free_periods_contract", "idx_free_periods_contract_ord", "free_periods (contract_id, start_date_ord)"),
+    ]
+    for table in ("payment_records", "deposit_records", "invoice_records"):
+        replaced += [
+            (f"idx_{table}_contract_date", f"idx_{table}_contract_date_ord", f"{table} (contract_id, date_ord)"),
+            # 月度金额汇总已由汇总表提供，原 (date, 类型, 金额) 覆盖索引只用于跨合同的日期区间查询
+            (f"idx_{table}_date", f"idx_{table}_date_ord", f"{table} (date_ord)"),
+        ]
+    for old, new, target in replaced:
+        conn.execute(f"DROP INDEX IF EXISTS {old}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {new} ON {target}")
+    conn.execute("ANALYZE")
+
+
+@migration(12, "押金余额历史差额列")
+def _add_deposit_adjustment(conn: sqlite3.Connection):
+    # 历史押金记录退还多于收取的合同此前以负余额写入，之后的收取/退还都会违反非负约束；
+    # 余额表增加差额列后按新结构重建，超额部分记入差额列
+    drop_summary_tables(conn, [DEPOSIT_BALANCE_TABLE])
+    create_deposit_balances(conn)
+    rebuild_deposit_balances(conn)
@@ -0,0 +1,223 @@
+"""
+数据库连接池模块
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+from contextlib import contextmanager
+
+from utils.logging import get_logger
+
+logger = get_logger("ConnectionPool")
+
+
+# 平台默认的磁盘 VFS；memdb 主库上 ATTACH 磁盘文件时须显式指定，否则附加库沿用主库的 memdb VFS
+DISK_VFS = "win32" if os.name == "nt" else "unix"
+
+
+def memory_database_uri(name: Optional[str] = None) -> str:
+    """
+    进程内内存数据库的 URI：memdb VFS 下同名 URI 的连接共享同一个库，
+    锁行为与文件库相同（busy_timeout 生效），不会出现共享缓存模式下的表级锁冲突
+    """
+    return f"file:/{name or 'lease_' + uuid.uuid4().hex}?vfs=memdb"
+
+
+class _PooledConnection:
+    """连接池内的单个连接及其状态"""
+
+    def __init__(self, conn: sqlite3.Connection, owner: Optional[threading.Thread], pooled: bool = True):
+        self.conn = conn
+        self.owner = owner
+        self.pooled = pooled
+        self.depth = 0
+        self.closed = False
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    按线程持有的持久连接池
+    每个线程复用自己的连接，连接数超过上限时退化为临时连接
+    """
+
+    def __init__(self, db_name: str, max_size: int = 5, health_check_interval: float = 30.0,
+                 pragmas: Optional[Dict[str, Any]] = None, uri: bool = False):
+        self.db_name = db_name
+        self.uri = uri
+        self.max_size = max_size
+        self.health_check_interval = health_check_interval
+        self.pragmas = dict(pragmas or {})
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[int, _PooledConnection] = {}
+        # 排空控制：_active 为正在使用连接的线程数，排空期间新的使用者等待 resume()
+        self._gate = threading.Condition(threading.Lock())
+        self._active = 0
+        self._draining = False
+        self._drainer: Optional[int] = None
+
+    def create_connection(self) -> sqlite3.Connection:
+        """创建新的数据库连接"""
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, uri=self.uri)
+        conn.row_factory = sqlite3.Row
+        self._apply_pragmas(conn)
+        return conn
+
+    def _apply_pragmas(self, conn: sqlite3.Connection):
+        """在新连接上依次执行 PRAGMA 配置，单项失败只记录警告"""
+        for name, value in self.pragmas.items():
+            try:
+                conn.execute(f"PRAGMA {name} = {value}").fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"设置 PRAGMA {name}={value} 失败: {str(e)}")
+
+    @contextmanager
+    def connection(self):
+        """获取当前线程连接的上下文管理器"""
+        current = getattr(self._local, "entry", None)
+        outermost = current is None or current.closed or current.depth == 0
+        if outermost:
+            self._enter()
+        try:
+            entry = self._acquire()
+        except Exception:
+            if outermost:
+                self._leave()
+            raise
+        entry.depth += 1
+        try:
+            yield entry.conn
+        except Exception:
+            # 仅最外层负责回滚，内层异常不能破坏外层的工作单元
+            if entry.depth == 1 and entry.conn.in_transaction:
+                entry.conn.rollback()
+            raise
+        finally:
+            entry.depth -= 1
+            entry.last_used = time.monotonic()
+            if entry.depth == 0:
+                self._release(entry)
+            if outermost:
+                self._leave()
+
+    def _enter(self):
+        """登记一个连接使用者；排空期间（发起排空的线程除外）等待恢复"""
+        with self._gate:
+            while self._draining and self._drainer != threading.get_ident():
+                self._gate.wait()
+            self._active += 1
+
+    def _leave(self):
+        with self._gate:
+            self._active -= 1
+            self._gate.notify_all()
+
+    def drain(self, timeout: Optional[float] = 30.0) -> bool:
+        """
+        排空连接池：阻止新的连接使用者，等待正在进行的操作结束后关闭全部连接
+        成功后连接池保持暂停状态，直到调用 resume()；超时返回 False 并自动恢复
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._gate:
+            self._draining = True
+            self._drainer = threading.get_ident()
+            while self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._draining = False
+                    self._drainer = None
+                    self._gate.notify_all()
+                    logger.warning(f"连接池排空超时，仍有 {self._active} 个操作未结束")
+                    return False
+                self._gate.wait(remaining)
+        self.close_all()
+        return True
+
+    def resume(self):
+        """结束排空状态，放行等待中的连接使用者"""
+        with self._gate:
+            self._draining = False
+            self._drainer = None
+            self._gate.notify_all()
+
+    def _acquire(self) -> _PooledConnection:
+        """取得当前线程的连接，必要时新建"""
+        entry = getattr(self._local, "entry", None)
+        if entry is not None and not entry.closed:
+            if entry.depth == 0:
+                self._check_health(entry)
+            return entry
+
+        current = threading.current_thread()
+        with self._lock:
+            if len(self._connections) >= self.max_size:
+                self._prune_dead_threads()
+            if len(self._connections) < self.max_size:
+                entry = _PooledConnection(self.create_connection(), current)
+                self._connections[current.ident] = entry
+                self._local.entry = entry
+                return entry
+
+        # 连接池已满：使用一次性连接，用完即关闭（使用期间同线程的嵌套调用共用该连接）
+        logger.debug(f"连接池已满({self.max_size})，线程 {current.name} 使用临时连接")
+        entry = _PooledConnection(self.create_connection(), current, pooled=False)
+        self._local.entry = entry
+        return entry
+
+    def _release(self, entry: _PooledConnection):
+        """归还连接：丢弃未提交的残留事务，临时连接直接关闭"""
+        try:
+            if entry.conn.in_transaction:
+                entry.conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"回滚残留事务失败: {str(e)}")
+        if not entry.pooled:
+            entry.conn.close()
+            entry.closed = True
+
+    def _check_health(self, entry: _PooledConnection):
+        """空闲超过间隔的连接在复用前做一次健康检查"""
+        if time.monotonic() - entry.last_used < self.health_check_interval:
+            return
+        try:
+            entry.conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"连接健康检查失败，重新建立连接: {str(e)}")
+            try:
+                entry.conn.close()
+            except sqlite3.Error:
+                pass
+            entry.conn = self.create_connection()
+        entry.last_used = time.monotonic()
+
+    def _prune_dead_threads(self):
+        """回收已结束线程遗留的连接（调用方需持有锁）"""
+        for ident, entry in list(self._connections.items()):
+            if entry.owner is not None and not entry.owner.is_alive():
+                self._close_entry(entry)
+                del self._connections[ident]
+
+    def _close_entry(self, entry: _PooledConnection):
+        try:
+            entry.conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"关闭连接失败: {str(e)}")
+        entry.closed = True
+
+    def close_all(self):
+        """关闭池内全部连接，之后的调用会按需重新建立连接"""
+        with self._lock:
+            for entry in self._connections.values():
+                self._close_entry(entry)
+            count = len(self._connections)
+            self._connections.clear()
+        logger.info(f"连接池已关闭 {count} 个连接")
+
+    @property
+    def size(self) -> int:
+        """当前持有的持久连接数"""
+        return len(self._connections)
@@ -0,0 +1,77 @@
+"""
+查询结果行模式模块 - 按需选择开销最低的结果形态
+"""
+import datetime
+import sqlite3
+from collections import namedtuple
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class RowMode(Enum):
+    """查询结果形态"""
+    DICT = "dict"              # 每行一个字典（默认，兼容原有调用）
+    TUPLE = "tuple"            # 每行一个普通元组，开销最低
+    NAMEDTUPLE = "namedtuple"  # 每行一个具名元组或预先声明的行类
+    COLUMNAR = "columnar"      # 按列返回 {列名: [值, ...]}
+
+
+@lru_cache(maxsize=256)
+def namedtuple_for(columns: Tuple[str, ...]) -> type:
+    """按列名生成（并缓存）具名元组类型"""
+    return namedtuple("Row", columns, rename=True)
+
+
+def column_names(cursor: sqlite3.Cursor) -> Tuple[str, ...]:
+    """游标结果集的列名"""
+    return tuple(desc[0] for desc in cursor.description or ())
+
+
+def row_converter(mode: RowMode, columns: Tuple[str, ...],
+                  row_type: Optional[type] = None) -> Optional[Callable[[Sequence[Any]], Any]]:
+    """
+    返回把原始元组行转换为目标形态的函数；TUPLE 模式返回 None 表示无需转换
+    row_type 可为 namedtuple 类或任意按位置参数构造的类（如声明了 __slots__ 的行类）
+    """
+    if mode is RowMode.TUPLE:
+        return None
+    if mode is RowMode.DICT:
+        return lambda row: dict(zip(columns, row))
+    if mode is RowMode.NAMEDTUPLE:
+        row_type = row_type or namedtuple_for(columns)
+        make = getattr(row_type, "_make", None)
+        return make if make is not None else (lambda row: row_type(*row))
+    raise ValueError(f"行模式 {mode.value} 不支持逐行转换")
+
+
+def to_columns(columns: Tuple[str, ...], rows: List[Sequence[Any]]) -> Dict[str, List[Any]]:
+    """把元组行转置为按列存储的字典"""
+    if not rows:
+        return {name: [] for name in columns}
+    return {name: list(values) for name, values in zip(columns, zip(*rows))}
+
+
+def convert_rows(mode: RowMode, columns: Tuple[str, ...], rows: List[Sequence[Any]],
+                 row_type: Optional[type] = None):
+    """把 fetch 得到的元组行整体转换为目标形态"""
+    if mode is RowMode.COLUMNAR:
+        return to_columns(columns, rows)
+    converter = row_converter(mode, columns, row_type)
+    if converter is None:
+        return rows
+    return list(map(converter, rows))
+
+
+# 日期序数 -> datetime.date 缓存：业务日期集中在少数年份，同一日期的对象在各行间共享（date 不可变）
+_DATES: Dict[int, datetime.date] = {}
+
+
+def ordinal_date(ordinal: Optional[int]) -> Optional[datetime.date]:
+    """按日期序数列（date.toordinal()）的值构建 date 对象，替代逐行 strptime 解析文本日期"""
+    if ordinal is None:
+        return None
+    value = _DATES.get(ordinal)
+    if value is None:
+        value = _DATES[ordinal] = datetime.date.fromordinal(ordinal)
+    return value
@@ -0,0 +1,332 @@
+"""
+月度汇总表模块 - 收款/押金/开票按合同和月份预聚合，押金按合同维护当前余额，
+均由触发器在明细增删改时同步维护；金额以整数分累加，汇总结果精确无误差
+"""
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from utils.logging import get_logger
+
+logger = get_logger("MonthlySummaries")
+
+
+@dataclass(frozen=True)
+class SummarySpec:
+    """一张汇总表的定义"""
+    table: str                          # 汇总表名
+    source: str                         # 明细表名
+    type_column: Optional[str]          # 分类列（按类型细分），None 表示不细分
+    amounts: Tuple[Tuple[str, str], ...]  # (明细金额列, 汇总列)，汇总表中存为 <汇总列>_cents 整数分
+
+
+SUMMARIES = (
+    SummarySpec("payment_monthly_summary", "payment_records", "payment_type", (("amount", "total_amount"),)),
+    SummarySpec("deposit_monthly_summary", "deposit_records", "record_type", (("amount", "total_amount"),)),
+    SummarySpec("invoice_monthly_summary", "invoice_records", None,
+                (("amount", "total_amount"), ("tax_amount", "total_tax"))),
+)
+
+
+def month_key(date_expr: str) -> str:
+    """日期（YYYY-MM-DD）对应的月份键 YYYYMM（整数）的 SQL 表达式"""
+    return f"CAST(substr({date_expr}, 1, 4) || substr({date_expr}, 6, 2) AS INTEGER)"
+
+
+# 带月份生成列 yyyymm 的明细表 -> 所依据的日期列
+PERIOD_COLUMN = "yyyymm"
+PERIOD_TABLES = {
+    "payment_records": "date",
+    "deposit_records": "date",
+    "invoice_records": "date",
+    "vat_records": "tax_obligation_date",
+    "invoice_details": "invoice_date",
+}
+
+
+def period_expr(table: str) -> str:
+    """明细表月份生成列的表达式（归档库中的旧表补列时据此回填）"""
+    return month_key(PERIOD_TABLES[table])
+
+
+# 带日期序数生成列 <日期列>_ord 的表 -> 日期列；序数与 datetime.date.toordinal() 一致，按整数比较和建索引
+DATE_ORDINAL_SUFFIX = "_ord"
+DATE_ORDINAL_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "payment_records": ("date",),
+    "deposit_records": ("date",),
+    "invoice_records": ("date",),
+    "rent_periods": ("start_date", "end_date"),
+    "free_periods": ("start_date", "end_date"),
+}
+
+
+def ordinal_sql(expr: str) -> str:
+    """日期（YYYY-MM-DD）对应的日期序数的 SQL 表达式（0001-01-01 为 1）"""
+    return f"CAST(julianday({expr}) - 1721424.5 AS INTEGER)"
+
+
+def cents_sql(expr: str) -> str:
+    """金额（元）换算为整数分的 SQL 表达式，与 models.entities.to_cents 的结果一致"""
+    return f"CAST(ROUND({expr} * 100) AS INTEGER)"
+
+
+def money_definition(column: str, constraint: str = "NOT NULL DEFAULT 0") -> str:
+    """金额列的定义：<列名>_cents 存整数分，同名 REAL 生成列兼容按元读取的旧语句"""
+    return (f"{column}_cents INTEGER {constraint}".rstrip() + ", "
+            f"{column} REAL GENERATED ALWAYS AS ({column}_cents / 100.0) VIRTUAL")
+
+
+def stored_cents(conn: sqlite3.Connection, table: str, column: str, row: str = "") -> Tuple[str, str]:
+    """
+    明细表金额列按整数分读取：已迁移为 *_cents 列时直接读取，否则由元换算（早期版本的迁移步骤使用）
+    :param row: 列名前缀，如触发器中的 "new."
+    :return: (实际存储的列名, 整数分表达式)
+    """
+    columns = {info[1] for info in conn.execute(f"PRAGMA table_xinfo({table})")}
+    if f"{column}_cents" in columns:
+        return f"{column}_cents", f"COALESCE({row}{column}_cents, 0)"
+    return column, cents_sql(f"COALESCE({row}{column}, 0)")
+
+
+def _key_columns(spec: SummarySpec) -> Tuple[str, ...]:
+    return ("contract_id", "yyyymm") + ((spec.type_column,) if spec.type_column else ())
+
+
+def _key_values(spec: SummarySpec, row: str) -> Tuple[str, ...]:
+    """触发器中 new/old 行对应的汇总键表达式"""
+    values = (f"{row}.contract_id", month_key(f"{row}.date"))
+    if spec.type_column:
+        values += (f"COALESCE({row}.{spec.type_column}, '')",)
+    return values
+
+
+def _add_statement(conn: sqlite3.Connection, spec: SummarySpec, row: str) -> str:
+    """把一行明细累加进汇总表（不存在则新建）"""
+    keys = _key_columns(spec)
+    totals = [f"{total}_cents" for _, total in spec.amounts]
+    values = list(_key_values(spec, row)) + [stored_cents(conn, spec.source, amount, f"{row}.")[1]
+                                             for amount, _ in spec.amounts]
+    updates = ", ".join(f"{total} = {total} + excluded.{total}" for total in totals)
+    return (f"INSERT INTO {spec.table} ({', '.join(keys + tuple(totals))}, record_count) "
+            f"VALUES ({', '.join(values)}, 1) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}, record_count = record_count + 1;")
+
+
+def _subtract_statements(conn: sqlite3.Connection, spec: SummarySpec, row: str) -> str:
+    """从汇总表中减去一行明细，记录数归零的汇总行删除"""
+    where = " AND ".join(f"{key} = {value}" for key, value in zip(_key_columns(spec), _key_values(spec, row)))
+    updates = ", ".join(f"{total}_cents = {total}_cents - {stored_cents(conn, spec.source, amount, f'{row}.')[1]}"
+                        for amount, total in spec.amounts)
+    return (f"UPDATE {spec.table} SET {updates}, record_count = record_count - 1 WHERE {where};\n"
+            f"DELETE FROM {spec.table} WHERE {where} AND record_count <= 0;")
+
+
+DEPOSIT_BALANCE_TABLE = "deposit_balances"
+
+# 以整数分存储的金额列：表名 -> 金额列（存为 <列名>_cents，同名列为按元读取的生成列）
+MONEY_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "payment_records": ("amount",),
+    "deposit_records": ("amount",),
+    "invoice_records": ("amount", "tax_amount"),
+    "invoice_details": ("total_amount", "vat_amount"),
+    "vat_records": ("vat_amount",),
+    **{spec.table: tuple(total for _, total in spec.amounts) for spec in SUMMARIES},
+    DEPOSIT_BALANCE_TABLE: ("received", "returned", "adjustment", "balance"),
+}
+
+
+def derived_column(table: str, name: str) -> Optional[str]:
+    """
+    可由同表其他列推算的列的 SQL 表达式（月份列、日期序数列、整数分金额列），其余返回 None；
+    归档库中早于对应迁移的表缺少这些列，补列回填和合并视图据此计算
+    """
+    if name == PERIOD_COLUMN and table in PERIOD_TABLES:
+        return period_expr(table)
+    if name.endswith(DATE_ORDINAL_SUFFIX) and name[:-len(DATE_ORDINAL_SUFFIX)] in DATE_ORDINAL_COLUMNS.get(table, ()):
+        return ordinal_sql(name[:-len(DATE_ORDINAL_SUFFIX)])
+    if name.endswith("_cents") and name[:-len("_cents")] in MONEY_COLUMNS.get(table, ()):
+        return cents_sql(name[:-len("_cents")])
+    return None
+
+
+def _deposit_delta(row: str, target: str, cents: str) -> Tuple[str, str, str]:
+    """
+    一行押金记录对 target 合同余额各列的增量表达式（记录不属于 target 时为 0）
+    :param cents: 该行金额（整数分）的表达式
+    :return: (收取增量, 退还增量, 记录数增量)
+    """
+    belongs = f"({row}.contract_id = {target})"
+    return (f"{belongs} * (CASE {row}.record_type WHEN '收取' THEN {cents} ELSE 0 END)",
+            f"{belongs} * (CASE {row}.record_type WHEN '收取' THEN 0 ELSE {cents} END)",
+            belongs)
+
+
+def _deposit_apply(conn: sqlite3.Connection, rows: Tuple[Tuple[str, int], ...]) -> str:
+    """
+    把若干行押金记录的增减（(new/old, +1/-1)）合并为一条 UPDATE：
+    修改记录时先减后加若分两步执行，中间状态可能触发余额非负检查，因此在同一语句中完成
+    """
+    target = f"{DEPOSIT_BALANCE_TABLE}.contract_id"
+    deltas = [(("+" if sign > 0 else "-"),
+               _deposit_delta(row, target, stored_cents(conn, "deposit_records", "amount", f"{row}.")[1]))
+              for row, sign in rows]
+    received, returned, count = (" ".join(f"{op} {delta[i]}" for op, delta in deltas) for i in range(3))
+    contracts = ", ".join(f"{row}.contract_id" for row, _ in rows)
+    return (f"UPDATE {DEPOSIT_BALANCE_TABLE} SET "
+            f"received_cents = received_cents {received}, "
+            f"returned_cents = returned_cents {returned}, "
+            f"record_count = record_count {count} "
+            f"WHERE contract_id IN ({contracts});")
+
+
+def create_deposit_balances(conn: sqlite3.Connection):
+    """
+    创建押金余额表及维护触发器
+    余额非负由表上的 CHECK 约束保证：任何使余额为负的写入（超额退还、删除已被退还的收取记录等）整条语句失败；
+    adjustment_cents 为重建时历史记录已超额退还的差额（见 rebuild_deposit_balances），余额从 0 起算，之后照常收取/退还；
+    删除合同级联删除押金记录时合同已不存在，触发器跳过，余额行随合同一起级联删除
+    """
+    column, _ = stored_cents(conn, "deposit_records", "amount")
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {DEPOSIT_BALANCE_TABLE} (
+            contract_id TEXT PRIMARY KEY,
+            received_cents INTEGER NOT NULL DEFAULT 0,
+            returned_cents INTEGER NOT NULL DEFAULT 0,
+            adjustment_cents INTEGER NOT NULL DEFAULT 0,
+            balance_cents INTEGER GENERATED ALWAYS AS (received_cents - returned_cents + adjustment_cents) VIRTUAL,
+            received REAL GENERATED ALWAYS AS (received_cents / 100.0) VIRTUAL,
+            returned REAL GENERATED ALWAYS AS (returned_cents / 100.0) VIRTUAL,
+            adjustment REAL GENERATED ALWAYS AS (adjustment_cents / 100.0) VIRTUAL,
+            balance REAL GENERATED ALWAYS AS ((received_cents - returned_cents + adjustment_cents) / 100.0) VIRTUAL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            CHECK (received_cents + adjustment_cents >= returned_cents),
+            FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {DEPOSIT_BALANCE_TABLE}_insert AFTER INSERT ON deposit_records BEGIN
+            INSERT OR IGNORE INTO {DEPOSIT_BALANCE_TABLE} (contract_id) VALUES (new.contract_id);
+            {_deposit_apply(conn, (("new", 1),))}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {DEPOSIT_BALANCE_TABLE}_delete AFTER DELETE ON deposit_records
+        WHEN EXISTS (SELECT 1 FROM contracts WHERE contract_id = old.contract_id) BEGIN
+            {_deposit_apply(conn, (("old", -1),))}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {DEPOSIT_BALANCE_TABLE}_update
+        AFTER UPDATE OF contract_id, {column}, record_type ON deposit_records BEGIN
+            INSERT OR IGNORE INTO {DEPOSIT_BALANCE_TABLE} (contract_id) VALUES (new.contract_id);
+            {_deposit_apply(conn, (("old", -1), ("new", 1)))}
+        END
+    ''')
+
+
+def rebuild_deposit_balances(conn: sqlite3.Connection) -> int:
+    """
+    由押金记录重新生成押金余额表（不提交，由调用方提交），返回生成的余额行数
+    历史数据中退还多于收取的合同不能按负余额写入（之后该合同的每次收取/退还都会违反非负约束），
+    超出部分记入 adjustment_cents 使余额为 0，并记录警告，待人工核对押金记录；
+    已删除合同遗留的押金记录（早期版本删除合同时未级联删除）不计入
+    """
+    _, cents = stored_cents(conn, "deposit_records", "amount")
+    conn.execute(f"DELETE FROM {DEPOSIT_BALANCE_TABLE}")
+    cursor = conn.execute(f'''
+        INSERT INTO {DEPOSIT_BALANCE_TABLE} (contract_id, received_cents, returned_cents, adjustment_cents, record_count)
+        SELECT contract_id, received, returned, MAX(returned - received, 0), record_count
+        FROM (
+            SELECT contract_id,
+                   SUM(CASE record_type WHEN '收取' THEN {cents} ELSE 0 END) AS received,
+                   SUM(CASE record_type WHEN '收取' THEN 0 ELSE {cents} END) AS returned,
+                   COUNT(*) AS record_count
+            FROM deposit_records
+            WHERE contract_id IN (SELECT contract_id FROM contracts)
+            GROUP BY contract_id
+        )
+    ''')
+    deficits = conn.execute(f'''
+        SELECT contract_id, adjustment FROM {DEPOSIT_BALANCE_TABLE} WHERE adjustment_cents > 0 ORDER BY contract_id
+    ''').fetchall()
+    if deficits:
+        logger.warning("以下合同的押金记录退还多于收取，余额按 0 计，差额记入调整列，请核对押金记录: "
+                       + ", ".join(f"{contract_id}（{amount:.2f}元）" for contract_id, amount in deficits))
+    return cursor.rowcount
+
+
+def create_summary_tables(conn: sqlite3.Connection):
+    """创建汇总表、月份索引及维护触发器"""
+    for spec in SUMMARIES:
+        keys = _key_columns(spec)
+        type_definition = f"{spec.type_column} TEXT NOT NULL, " if spec.type_column else ""
+        totals = "".join(f"{money_definition(total)}, " for _, total in spec.amounts)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {spec.table} (
+                contract_id TEXT NOT NULL,
+                yyyymm INTEGER NOT NULL,
+                {type_definition}{totals}record_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({', '.join(keys)}),
+                FOREIGN KEY (contract_id) REFERENCES contracts(contract_id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        ''')
+        # 按月汇总的覆盖索引：月份范围过滤后直接读取分类与合计
+        index_columns = (("yyyymm",) + keys[2:] + tuple(f"{total}_cents" for _, total in spec.amounts)
+                         + ("record_count",))
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{spec.table}_month ON {spec.table} ({', '.join(index_columns)})")
+
+        stored = tuple(stored_cents(conn, spec.source, amount)[0] for amount, _ in spec.amounts)
+        watched = ", ".join(("contract_id", "date") + keys[2:] + stored)
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {spec.table}_insert AFTER INSERT ON {spec.source} BEGIN
+                {_add_statement(conn, spec, "new")}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {spec.table}_delete AFTER DELETE ON {spec.source} BEGIN
+                {_subtract_statements(conn, spec, "old")}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {spec.table}_update AFTER UPDATE OF {watched} ON {spec.source} BEGIN
+                {_subtract_statements(conn, spec, "old")}
+                {_add_statement(conn, spec, "new")}
+            END
+        ''')
+
+
+def drop_summary_tables(conn: sqlite3.Connection, tables: Optional[Sequence[str]] = None):
+    """
+    删除汇总表、押金余额表及其维护触发器（表结构变更后重新创建并重建）
+    :param tables: 要删除的表，默认全部
+    """
+    for table in tables or [spec.table for spec in SUMMARIES] + [DEPOSIT_BALANCE_TABLE]:
+        for event in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_{event}")
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def rebuild_summaries(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    由明细表重新生成全部汇总表（不提交，由调用方提交）
+    已删除合同遗留的明细（早期版本删除合同时未级联删除）不计入，汇总表只包含现有合同
+    :return: 汇总表名 -> 生成的汇总行数
+    """
+    result = {}
+    for spec in SUMMARIES:
+        keys = _key_columns(spec)
+        key_values = ("contract_id", month_key("date")) + (
+            (f"COALESCE({spec.type_column}, '')",) if spec.type_column else ())
+        totals = [f"{total}_cents" for _, total in spec.amounts]
+        sums = [f"SUM({stored_cents(conn, spec.source, amount)[1]})" for amount, _ in spec.amounts]
+        conn.execute(f"DELETE FROM {spec.table}")
+        cursor = conn.execute(f'''
+            INSERT INTO {spec.table} ({', '.join(keys + tuple(totals))}, record_count)
+            SELECT {', '.join(key_values + tuple(sums))}, COUNT(*)
+            FROM {spec.source}
+            WHERE contract_id IN (SELECT contract_id FROM contracts)
+            GROUP BY {', '.join(str(i) for i in range(1, len(keys) + 1))}
+        ''')
+        result[spec.table] = cursor.rowcount
+    logger.info(f"月度汇总表重建完成: {result}")
+    return result
@@ -2,8 +2,8 @@
 """
 数据库适配器 - 为核算模块提供兼容接口
 """
-import sqlite3
 from database.manager import DatabaseManager
+from database.instrumentation import InstrumentedCursor
 from utils.logging import get_logger
 
 logger = get_logger("DatabaseAdapter")
@@ -23,10 +23,10 @@ class DatabaseAdapter:
     def connect(self):
         """建立数据库连接"""
         try:
-            # 创建一个持久连接
-            self.conn = sqlite3.connect(self.db_manager.db_name)
-            self.conn.row_factory = sqlite3.Row
-            self.cursor = self.conn.cursor()
+            # 创建一个持久连接（与连接池使用相同的连接配置）
+            self.conn = self.db_manager.pool.create_connection()
+            # 游标经过计时代理，直接使用游标的语句同样计入查询统计
+            self.cursor = InstrumentedCursor(self.conn.cursor(), self.db_manager.profiler)
             self._is_connected = True
             logger.info("数据库适配器连接建立")
         except Exception as e:
@@ -63,6 +63,14 @@ class DatabaseAdapter:
     def execute_command(self, sql: str, params: tuple = ()):
         """执行命令（兼容方法）"""
         return self.db_manager.execute_command(sql, params)
+    
+    def transaction(self):
+        """工作单元（兼容方法，委托给 DatabaseManager.transaction）"""
+        return self.db_manager.transaction()
+    
+    def dump_query_stats(self, top_n=None):
+        """输出查询统计报表（兼容方法，委托给 DatabaseManager.dump_query_stats）"""
+        return self.db_manager.dump_query_stats(top_n)
 
 def create_compatible_db(db_manager: DatabaseManager):
     """
@@ -4,6 +4,11 @@
 import datetime
 import calendar
 import uuid
+from typing import Any, Dict, List, Mapping, Optional
+
+from models import portfolio
+from models.entities import to_cents
+from services.portfolio_service import PortfolioService
 from utils.logging import get_logger
 
 logger = get_logger("LeaseAccounting")
@@ -14,6 +19,7 @@ class LeaseAccounting:
     租赁合同核算核心类：接收lease_base的LeaseContract实例，实现核算逻辑
     不修改原有LeaseContract，通过组合模式复用基础数据
     """
+    INCOME_TAX_RATE = 0.25  # 企业所得税税率（默认25%，可配置）
     
     def __init__(self, contract, db):
         # 验证合同数据完整性
@@ -28,7 +34,7 @@ class LeaseAccounting:
         self.contract_id = contract.contract_id
         self.tax_rate = contract.tax_rate
         self.is_adjust_income = contract.need_adjust_income
-        self.income_tax_rate = 0.25  # 企业所得税税率（默认25%，可配置）
+        self.income_tax_rate = self.INCOME_TAX_RATE
 
     def calculate_monthly_income(self, target_year: int, target_month: int) -> tuple[float, float]:
         """计算指定月份的会计和税法收入"""
@@ -86,18 +92,18 @@ class LeaseAccounting:
         base_vat_id = -1
         if base_vat > 0:
             base_vat_id = self.db.execute_return_id('''
-            INSERT INTO vat_records (contract_id, relate_type, relate_id, vat_amount, tax_obligation_date, status)
+            INSERT INTO vat_records (contract_id, relate_type, relate_id, vat_amount_cents, tax_obligation_date, status)
             VALUES (?, ?, ?, ?, ?, 'pending')
-            ''', (self.contract_id, relate_type, str(relate_id), base_vat, tax_obligation_date.strftime("%Y-%m-%d")))
+            ''', (self.contract_id, relate_type, str(relate_id), to_cents(base_vat), tax_obligation_date.strftime("%Y-%m-%d")))
 
         # 存储超收增值税记录
         overpaid_vat_id = -1
         if overpaid_vat > 0:
             overpaid_relate_id = str(uuid.uuid4())
             overpaid_vat_id = self.db.execute_return_id('''
-            INSERT INTO vat_records (contract_id, relate_type, relate_id, vat_amount, tax_obligation_date, status, remark)
+            INSERT INTO vat_records (contract_id, relate_type, relate_id, vat_amount_cents, tax_obligation_date, status, remark)
             VALUES (?, 'overpaid', ?, ?, ?, 'pending', ?)
-            ''', (self.contract_id, overpaid_relate_id, overpaid_vat, 
+            ''', (self.contract_id, overpaid_relate_id, to_cents(overpaid_vat), 
                   tax_obligation_date.strftime("%Y-%m-%d"), f"超收租金增值税（收款{amount:.2f}元）"))
             logger.info(f"合同{self.contract_id}生成超收增值税记录：{overpaid_vat:.2f}元，关联ID：{overpaid_relate_id}")
 
@@ -137,6 +143,82 @@ class LeaseAccounting:
             "is_adjust": self.is_adjust_income
         }
 
+    @classmethod
+    def calculate_portfolio_tax_diff(cls, contracts: Mapping[str, Any], db, year: int, month: int,
+                                     snapshot: Optional[portfolio.PortfolioSnapshot] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        整个合同组合指定月份的税会差异：在列式快照上一次算出所有合同，结果与逐合同 calculate_tax_diff 相同
+        只计算 contracts 中已到租期的合同（快照中的其他合同不核算、不写入）；月度收入、收入记录、税会差异按批写入（已存在的月份不重复写入），
+        超收增值税冲回只对有待冲回记录的合同逐个处理
+        :param contracts: 合同ID -> LeaseContract，即本次核算的合同（冲回超收增值税时使用）
+        :param snapshot: 已构建的组合快照，默认按数据库当前数据构建
+        :return: 各合同的税会差异（键同 calculate_tax_diff），未安装 NumPy 或快照构建失败时返回 None
+        """
+        if snapshot is None:
+            snapshot = PortfolioService(db).load_snapshot()
+        if snapshot is None:
+            return None
+
+        _, month_last, _ = portfolio.month_span(year, month)
+        starts, _ = portfolio.contract_span(snapshot)
+        # 与逐合同计算一致：只算传入的合同，无租金期或未到租期的合同不计算；税率无效的合同无法核算，跳过
+        selected = snapshot.mask(contracts.keys()) & snapshot.has_rent_periods & (starts <= month_last)
+        invalid = selected & (snapshot.tax_rate <= 0)
+        if invalid.any():
+            logger.warning(f"{int(invalid.sum())}个合同税率无效，已跳过{year}年{month}月核算")
+            selected &= ~invalid
+
+        result = portfolio.tax_diff(snapshot, year, month, cls.INCOME_TAX_RATE)
+        positions = selected.nonzero()[0]
+        columns = {name: result[name][positions].tolist() for name in (
+            "accounting_income", "tax_income", "diff_amount", "deferred_tax", "to_be_settled_vat", "adjust_vat")}
+        tax_rates = snapshot.tax_rate[positions].tolist()
+        adjusts = snapshot.need_adjust_income[positions].tolist()
+        rows = []
+        for i, position in enumerate(positions.tolist()):
+            row = {"contract_id": snapshot.contract_ids[position],
+                   "customer_name": snapshot.customer_names[position],
+                   "room_number": snapshot.room_numbers[position],
+                   "year": year, "month": month}
+            row.update((name, values[i]) for name, values in columns.items())
+            row["is_adjust"] = adjusts[i]
+            rows.append(row)
+
+        income_date = datetime.date(year, month, calendar.monthrange(year, month)[1]).strftime("%Y-%m-%d")
+        with db.transaction() as conn:
+            # 本次新增的月度收入 id 均大于写入前的最大 id，据此一次生成对应的收入记录
+            last_income_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM monthly_income").fetchone()[0]
+            conn.executemany('''
+            INSERT OR IGNORE INTO monthly_income (contract_id, year, month, accounting_income, tax_income, tax_rate, is_adjust)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(row["contract_id"], year, month, row["accounting_income"], row["tax_income"], tax_rate,
+                   1 if row["is_adjust"] else 0) for row, tax_rate in zip(rows, tax_rates)])
+            conn.execute('''
+            INSERT INTO income_records (
+                contract_id, income_date, accounting_income, tax_income,
+                source_type, source_id
+            )
+            SELECT contract_id, ?, accounting_income, tax_income, 'monthly', id
+            FROM monthly_income WHERE id > ?
+            ''', (income_date, last_income_id))
+            conn.executemany('''
+            INSERT OR IGNORE INTO tax_diff (contract_id, year, month, accounting_income, tax_income,
+                                           diff_amount, deferred_tax, to_be_settled_vat, adjust_vat)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(row["contract_id"], year, month, row["accounting_income"], row["tax_income"], row["diff_amount"],
+                   row["deferred_tax"], row["to_be_settled_vat"], row["adjust_vat"]) for row in rows])
+            overpaid = {contract_id for contract_id, in conn.execute(
+                "SELECT DISTINCT contract_id FROM vat_records WHERE relate_type = 'overpaid' AND status = 'pending'")}
+
+        # 超收增值税冲回：只有存在待冲回超收记录的合同需要逐个处理
+        for row in rows:
+            contract = contracts.get(row["contract_id"]) if row["contract_id"] in overpaid else None
+            if contract is not None and row["tax_income"] > 0:
+                cls(contract, db)._calculate_overpaid_vat_reverse(year, month, row["tax_income"])
+
+        logger.info(f"{year}年{month}月合同组合核算完成：{len(rows)}个已到租期合同")
+        return rows
+
     def calculate_stamp_duty(self) -> float:
         """计算合同印花税：合同含税总租金 × 0.001"""
         total_contract_rent = self.contract.total_rent
@@ -165,11 +247,11 @@ class LeaseAccounting:
             self.db.connect()
             invoice_id = self.db.execute_return_id('''
             INSERT INTO invoice_details (
-                invoice_number, contract_id, invoice_date, total_amount, vat_amount,
+                invoice_number, contract_id, invoice_date, total_amount_cents, vat_amount_cents,
                 relate_payment_id, relate_income_year, relate_income_month
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (invoice_number, self.contract_id, invoice_date.strftime("%Y-%m-%d"),
-                  total_amount, vat_amount, relate_payment_id,
+                  to_cents(total_amount), to_cents(vat_amount), relate_payment_id,
                   relate_income_year, relate_income_month))
             
             # 调用calculate_vat生成invoice类型增值税记录
@@ -353,13 +435,13 @@ class LeaseAccounting:
             
             self.db.execute_return_id('''
             INSERT INTO vat_records (
-                contract_id, relate_type, relate_id, vat_amount, 
+                contract_id, relate_type, relate_id, vat_amount_cents, 
                 tax_obligation_date, status, remark
             ) VALUES (?, 'overpaid_reverse', ?, ?, ?, 'pending', ?)
             ''', (
                 self.contract_id,
                 str(record['id']),
-                reverse_vat_neg,
+                to_cents(reverse_vat_neg),
                 tax_obligation_date.strftime("%Y-%m-%d"),
                 f"冲回超收增值税：原超收记录ID={record['id']}，对应{target_year}年{target_month}月收入"
             ))
@@ -371,47 +453,54 @@ class LeaseAccounting:
 
     def _save_monthly_income(self, year: int, month: int, accounting_income: float, tax_income: float):
         """存储月度收入到数据库"""
-        existing = self.db.execute_query(
-            "SELECT id FROM monthly_income WHERE contract_id=? AND year=? AND month=?",
-            (self.contract_id, year, month)
-        )
-        if existing:
-            return  # 已存在，不重复存储
-
-        # 插入新记录并获取 ID（假设 execute_command 支持返回插入 ID）
-        monthly_income_id = self.db.execute_return_id('''  # 修改：使用返回 ID 的方法
-        INSERT INTO monthly_income (contract_id, year, month, accounting_income, tax_income, tax_rate, is_adjust)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (self.contract_id, year, month, accounting_income, tax_income,
-              self.tax_rate, 1 if self.is_adjust_income else 0))
-
-        income_date = datetime.date(year, month, calendar.monthrange(year, month)[1])
-        self.db.execute_command('''
-        INSERT INTO income_records (
-            contract_id, income_date, accounting_income, tax_income,
-            source_type, source_id
-        ) VALUES (?, ?, ?, ?, 'monthly', ?)
-        ''', (self.contract_id, income_date.strftime("%Y-%m-%d"),
-              accounting_income, tax_income,
-              monthly_income_id  # 使用上面获取的 ID
-             ))
+        with self.db.transaction():
+            existing = self.db.execute_query(
+                "SELECT id FROM monthly_income WHERE contract_id=? AND year=? AND month=?",
+                (self.contract_id, year, month)
+            )
+            if existing:
+                return  # 已存在，不重复存储
+
+            # 插入新记录并获取 ID（使用返回 ID 的方法）
+            monthly_income_id = self.db.execute_return_id('''
+            INSERT INTO monthly_income (contract_id, year, month, accounting_income, tax_income, tax_rate, is_adjust)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (self.contract_id, year, month, accounting_income, tax_income,
+                  self.tax_rate, 1 if self.is_adjust_income else 0))
+            # execute_* 出错时返回 None/False 而不抛出，需在此抛出以回滚整个工作单元
+            if monthly_income_id is None:
+                raise Exception(f"合同{self.contract_id}保存{year}年{month}月月度收入失败")
+
+            income_date = datetime.date(year, month, calendar.monthrange(year, month)[1])
+            if not self.db.execute_command('''
+            INSERT INTO income_records (
+                contract_id, income_date, accounting_income, tax_income,
+                source_type, source_id
+            ) VALUES (?, ?, ?, ?, 'monthly', ?)
+            ''', (self.contract_id, income_date.strftime("%Y-%m-%d"),
+                  accounting_income, tax_income,
+                  monthly_income_id  # 使用上面获取的 ID
+                 )):
+                raise Exception(f"合同{self.contract_id}保存{year}年{month}月收入记录失败")
 
     def _save_tax_diff(self, year: int, month: int, accounting_income: float, tax_income: float,
                       diff_amount: float, deferred_tax: float, to_be_settled_vat: float, adjust_vat: float):
         """存储税会差异记录到数据库"""
-        existing = self.db.execute_query(
-            "SELECT id FROM tax_diff WHERE contract_id=? AND year=? AND month=?",
-            (self.contract_id, year, month)
-        )
-        if existing:
-            return
-
-        self.db.execute_command('''
-        INSERT INTO tax_diff (contract_id, year, month, accounting_income, tax_income, 
-                             diff_amount, deferred_tax, to_be_settled_vat, adjust_vat)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (self.contract_id, year, month, accounting_income, tax_income,
-              diff_amount, deferred_tax, to_be_settled_vat, adjust_vat))
+        with self.db.transaction():
+            existing = self.db.execute_query(
+                "SELECT id FROM tax_diff WHERE contract_id=? AND year=? AND month=?",
+                (self.contract_id, year, month)
+            )
+            if existing:
+                return
+
+            if not self.db.execute_command('''
+            INSERT INTO tax_diff (contract_id, year, month, accounting_income, tax_income, 
+                                 diff_amount, deferred_tax, to_be_settled_vat, adjust_vat)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (self.contract_id, year, month, accounting_income, tax_income,
+                  diff_amount, deferred_tax, to_be_settled_vat, adjust_vat)):
+                raise Exception(f"合同{self.contract_id}保存{year}年{month}月税会差异失败")
 
     def _get_free_days_in_period(self, start_date: datetime.date, end_date: datetime.date) -> int:
         """计算指定时间段内的免租期总天数"""
@@ -137,22 +137,16 @@ def query_monthly_income(app):
         total_to_be_settled = 0.0
         total_adjust = 0.0
 
-        for contract in app.contracts.values():
-            # 过滤未到租期的合同
-            if not contract.rent_periods:
-                logger.warning(f"合同 {contract.contract_id} 没有租金期数据，已跳过")
-                continue
-                
-            contract_start = min(rp.start_date for rp in contract.rent_periods)
-
-            # 若合同起始日 > 查询月份最后一天 → 跳过，不计算收入
-            if contract_start > query_month_last_day:
-                continue  # 未到租期，跳过该合同
-
-            # 对已到租期的合同，正常计算收入和税差
-            accounting_obj = LeaseAccounting(contract, app.db)
-            tax_diff_data = accounting_obj.calculate_tax_diff(year, month)
-
+        # 整个组合在列式快照上一次核算；未安装 NumPy 时逐合同核算
+        tax_diffs = LeaseAccounting.calculate_portfolio_tax_diff(app.contracts, app.db, year, month)
+        if tax_diffs is None:
+            tax_diffs = _iter_contract_tax_diffs(app, year, month, query_month_last_day)
+        else:
+            # 与逐合同核算相同，按合同列表的顺序显示
+            order = {contract_id: i for i, contract_id in enumerate(app.contracts)}
+            tax_diffs.sort(key=lambda data: order.get(data["contract_id"], len(order)))
+
+        for tax_diff_data in tax_diffs:
             # 跳过无收入的合同
             if tax_diff_data["accounting_income"] == 0 and tax_diff_data["tax_income"] == 0:
                 continue
@@ -200,6 +194,25 @@ def query_monthly_income(app):
         messagebox.showerror("错误", f"查询收入失败：{str(e)}")
 
 
+def _iter_contract_tax_diffs(app, year: int, month: int, query_month_last_day: datetime.date):
+    """逐合同计算已到租期合同的税会差异"""
+    for contract in app.contracts.values():
+        # 过滤未到租期的合同
+        if not contract.rent_periods:
+            logger.warning(f"合同 {contract.contract_id} 没有租金期数据，已跳过")
+            continue
+            
+        contract_start = min(rp.start_date for rp in contract.rent_periods)
+
+        # 若合同起始日 > 查询月份最后一天 → 跳过，不计算收入
+        if contract_start > query_month_last_day:
+            continue  # 未到租期，跳过该合同
+
+        # 对已到租期的合同，正常计算收入和税差
+        accounting_obj = LeaseAccounting(contract, app.db)
+        yield accounting_obj.calculate_tax_diff(year, month)
+
+
 def export_income_table(app):
     """导出收入明细到Excel"""
     try:
@@ -4,11 +4,11 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import datetime
-import calendar
 import pandas as pd
 
 from tkcalendar import DateEntry
-from models.entities import InvoiceRecord
+from models.entities import InvoiceRecord, to_cents
+from database.rows import RowMode
 from .core import LeaseAccounting
 from utils.logging import get_logger
 
@@ -285,11 +285,11 @@ def open_invoice_dialog(app):
             contract.add_invoice(invoice, app.db, app.current_user['username'])
             app.db.execute('''
             INSERT INTO invoice_details (
-                invoice_number, contract_id, invoice_date, total_amount, vat_amount,
+                invoice_number, contract_id, invoice_date, total_amount_cents, vat_amount_cents,
                 relate_payment_id, relate_income_year, relate_income_month, status
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'valid')
             ''', (invoice_number, contract_id, invoice_date.strftime("%Y-%m-%d"),
-                  invoice_amount, vat_amount, relate_payment_id,
+                  to_cents(invoice_amount), to_cents(vat_amount), relate_payment_id,
                   relate_income_year, relate_income_month))
 
             # 提示成功+刷新界面
@@ -322,13 +322,8 @@ def query_vat_records(app):
         year = int(app.vat_year_var.get())
         month = int(app.vat_month_var.get())
         
-        # 1. 修复日期格式生成（确保月份补零正确）
-        tax_start_date = f"{year}-{month:02d}-01"
-        last_day = calendar.monthrange(year, month)[1]
-        tax_end_date = f"{year}-{month:02d}-{last_day:02d}"  # 确保天数补零
-        
-        # 2. 优化查询条件：精确匹配年月（而非仅日期范围，避免跨月边界问题）
-        vat_records = app.db.execute_query('''  # 注意：使用execute_query而非query
+        # 按纳税义务月份过滤（月份生成列，走 idx_vat_records_yyyymm 索引），月度收入按年月常量关联
+        vat_records = app.db.execute_query('''
             SELECT DISTINCT
                 vr.id AS vat_id, 
                 vr.contract_id, 
@@ -346,18 +341,17 @@ def query_vat_records(app):
             LEFT JOIN contracts c ON vr.contract_id = c.contract_id
             LEFT JOIN payment_records pr 
                 ON vr.relate_type = 'payment' 
-                AND vr.relate_id = CAST(pr.id AS TEXT)
+                AND pr.id = vr.relate_id
             LEFT JOIN invoice_details id 
                 ON vr.relate_type = 'invoice' 
                 AND vr.relate_id = id.invoice_number
             LEFT JOIN monthly_income mi 
                 ON vr.contract_id = mi.contract_id 
-                AND mi.year = strftime('%Y', vr.tax_obligation_date)
-                AND mi.month = strftime('%m', vr.tax_obligation_date)
+                AND mi.year = ?
+                AND mi.month = ?
             WHERE 
-                strftime('%Y', vr.tax_obligation_date) = ?  # 精确匹配年份
-                AND strftime('%m', vr.tax_obligation_date) = ?  # 精确匹配月份
-        ''', (str(year), f"{month:02d}"))  # 传递字符串格式的年月，与strftime结果一致
+                vr.yyyymm = ?
+        ''', (year, month, year * 100 + month), row_mode=RowMode.NAMEDTUPLE)  # 具名元组行，省去逐行字典
 
         # 处理特殊情形
         def get_special_case(relate_type, relate_date, tax_date, contract_id):
@@ -384,8 +378,8 @@ def query_vat_records(app):
             elif relate_type == "receivable":
                 has_payment = app.db.execute_query('''
                 SELECT id FROM payment_records 
-                WHERE contract_id=? AND date > ? AND amount>0
-                ''', (contract_id, tax_date))
+                WHERE contract_id=? AND date_ord > ? AND amount>0
+                ''', (contract_id, tax_date_obj.toordinal()))
                 has_invoice = app.db.execute_query('''
                 SELECT id FROM invoice_details 
                 WHERE contract_id=? AND invoice_date > ? AND total_amount>0
@@ -405,25 +399,25 @@ def query_vat_records(app):
         paid_vat = 0.0
         
         for record in vat_records:
-            if record["relate_type"] == "payment":
-                relate_date = record["payment_relate_date"] if record["payment_relate_date"] else None
-                total_amount = round(float(record["payment_total_amount"]) if record["payment_total_amount"] else 0.0, 2)
-            elif record["relate_type"] == "invoice":
-                relate_date = record["invoice_relate_date"] if (
-                    record["invoice_relate_date"] and str(record["invoice_relate_date"]).strip() != "None"
-                ) else record["tax_date"]
+            if record.relate_type == "payment":
+                relate_date = record.payment_relate_date if record.payment_relate_date else None
+                total_amount = round(float(record.payment_total_amount) if record.payment_total_amount else 0.0, 2)
+            elif record.relate_type == "invoice":
+                relate_date = record.invoice_relate_date if (
+                    record.invoice_relate_date and str(record.invoice_relate_date).strip() != "None"
+                ) else record.tax_date
                 try:
-                    invoice_total = float(record["invoice_total_amount"]) if (
-                        record["invoice_total_amount"] and str(record["invoice_total_amount"]).strip() != "None"
+                    invoice_total = float(record.invoice_total_amount) if (
+                        record.invoice_total_amount and str(record.invoice_total_amount).strip() != "None"
                     ) else 0.0
                 except (ValueError, TypeError):
                     invoice_total = 0.0
                 total_amount = round(invoice_total, 2)
-            elif record["relate_type"] == "receivable":
-                relate_date = record["tax_date"] if record["tax_date"] else "未确定"
+            elif record.relate_type == "receivable":
+                relate_date = record.tax_date if record.tax_date else "未确定"
                 try:
-                    receivable_total = float(record["receivable_total_amount"]) if (
-                        record["receivable_total_amount"] and str(record["receivable_total_amount"]).strip() != "None"
+                    receivable_total = float(record.receivable_total_amount) if (
+                        record.receivable_total_amount and str(record.receivable_total_amount).strip() != "None"
                     ) else 0.0
                 except (ValueError, TypeError):
                     receivable_total = 0.0
@@ -431,28 +425,28 @@ def query_vat_records(app):
                 
             # 处理特殊情形
             special_case = get_special_case(
-                record["relate_type"], relate_date, record["tax_date"], record["contract_id"]
+                record.relate_type, relate_date, record.tax_date, record.contract_id
             )
             
             # 累加合计
-            vat_amount = round(float(record["vat_amount"]), 2)
+            vat_amount = round(float(record.vat_amount), 2)
             total_vat += vat_amount
-            if record["status"] == "pending":
+            if record.status == "pending":
                 pending_vat += vat_amount
             else:
                 paid_vat += vat_amount
             
             # 插入表格
             app.vat_tree.insert("", tk.END, values=(
-                record["vat_id"],
-                record["contract_id"],
-                record["customer_name"] or "未知客户",
-                record["relate_type"],
+                record.vat_id,
+                record.contract_id,
+                record.customer_name or "未知客户",
+                record.relate_type,
                 relate_date,
                 f"{total_amount:.2f}",
                 f"{vat_amount:.2f}",
-                record["tax_date"],
-                record["status"],
+                record.tax_date,
+                record.status,
                 special_case
             ))
         
@@ -269,7 +269,6 @@ def main():
                     def integrate_import_export():
                         import pandas as pd
                         import os
-                        import shutil
                         from tkinter import filedialog
                         
                         def export_contracts():
@@ -330,20 +329,17 @@ def main():
                                 file_path = filedialog.askopenfilename(
                                     title="选择备份文件",
                                     initialdir=backup_dir,
-                                    filetypes=[("数据库文件", "*.db")]
+                                    filetypes=[("备份文件", "*.db *.json")]
                                 )
                                 if not file_path:
                                     return
                                 
                                 if messagebox.askyesno("确认恢复", "确定要恢复备份吗？当前数据将被覆盖！"):
-                                    current_db = "lease.db"
-                                    backup_current = f"lease_backup_before_restore_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-                                    
-                                    if os.path.exists(current_db):
-                                        shutil.copy2(current_db, backup_current)
-                                    
-                                    shutil.copy2(file_path, current_db)
-                                    messagebox.showinfo("恢复成功", "数据已恢复，请重启程序")
+                                    # 热恢复：校验、安全备份、排空连接池后通过备份 API 写入，无需重启
+                                    safety_path = app.db_manager.restore_backup(file_path, app.current_user.username)
+                                    # 原地刷新 app.contracts，核算模块持有的字典引用保持有效
+                                    app.reload_data()
+                                    messagebox.showinfo("恢复成功", f"数据已恢复，无需重启程序\n恢复前数据已备份到：{os.path.basename(safety_path)}")
                             except Exception as e:
                                 messagebox.showerror("恢复失败", f"恢复失败:\n{str(e)}")
                         
@@ -367,10 +363,10 @@ def main():
                         init_extended_db, add_income_tab, 
                         add_vat_tab, check_quarterly_stamp_duty
                     )
+                    from database.instrumentation import InstrumentedCursor
                     
                     # 创建数据库适配器（完整版本）
                     print("正在创建数据库适配器...")
-                    import sqlite3
                     
                     class DatabaseAdapter:
                         """数据库适配器类 - 完整版本"""
@@ -383,9 +379,8 @@ def main():
                         def connect(self):
                             """建立数据库连接"""
                             try:
-                                self.conn = sqlite3.connect(self.db_manager.db_name)
-                                self.conn.row_factory = sqlite3.Row
-                                self.cursor = self.conn.cursor()
+                                self.conn = self.db_manager.pool.create_connection()
+                                self.cursor = InstrumentedCursor(self.conn.cursor(), self.db_manager.profiler)
                                 self._is_connected = True
                                 print("✓ 适配器数据库连接建立")
                             except Exception as e:
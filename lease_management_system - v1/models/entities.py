@@ -1,13 +1,15 @@
 """
-实体模型定义
+实体模型定义（实体声明 __slots__，大量加载时每个对象不再附带属性字典）
 """
 import datetime
 import calendar
+import math
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable
 from enum import Enum
 
 from config.settings import config
+from models.relations import LazyRelation
 
 
 class ContractType(Enum):
@@ -29,6 +31,60 @@ class PaymentType(Enum):
     DEPOSIT = "押金"
 
 
+def to_cents(value: float) -> int:
+    """
+    金额（元）换算为整数分，四舍五入（远离零）
+    与数据库中 CAST(ROUND(x * 100) AS INTEGER) 的结果一致，两位小数的金额换算后精确无误差
+    """
+    return int(math.copysign(math.floor(abs(value) * 100 + 0.5), value))
+
+
+@dataclass(frozen=True, order=True)
+class Money:
+    """
+    金额值对象：以整数分保存（对应数据库中的 *_cents 列），
+    加减与汇总按整数运算，不需要逐笔 round(..., 2)，也不会累积浮点误差
+    """
+    cents: int = 0
+
+    @classmethod
+    def from_yuan(cls, value: Optional[float]) -> "Money":
+        return cls(to_cents(value)) if value else cls()
+
+    @classmethod
+    def total(cls, values: Iterable["Money"]) -> "Money":
+        """合计若干金额"""
+        return cls(sum(value.cents for value in values))
+
+    @property
+    def yuan(self) -> float:
+        """以元为单位的浮点值（仅用于显示和兼容旧接口）"""
+        return self.cents / 100
+
+    def __add__(self, other: "Money") -> "Money":
+        return Money(self.cents + other.cents)
+
+    def __sub__(self, other: "Money") -> "Money":
+        return Money(self.cents - other.cents)
+
+    def __neg__(self) -> "Money":
+        return Money(-self.cents)
+
+    def __mul__(self, factor: float) -> "Money":
+        """乘以税率等系数，结果四舍五入到分"""
+        product = self.cents * factor
+        return Money(int(math.copysign(math.floor(abs(product) + 0.5), product)))
+
+    def __bool__(self) -> bool:
+        return self.cents != 0
+
+    def __float__(self) -> float:
+        return self.yuan
+
+    def __str__(self) -> str:
+        return f"{self.cents / 100:.2f}"
+
+
 @dataclass
 class User:
     """用户实体"""
@@ -43,7 +99,7 @@ class User:
         return self.role in ['admin', 'operator']
 
 
-@dataclass
+@dataclass(slots=True)
 class RentPeriod:
     """租金期实体"""
     start_date: datetime.date
@@ -66,7 +122,7 @@ class RentPeriod:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class FreeRentPeriod:
     """免租期实体"""
     start_date: datetime.date
@@ -85,7 +141,7 @@ class FreeRentPeriod:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class PaymentRecord:
     """收款记录实体"""
     date: datetime.date
@@ -112,7 +168,7 @@ class PaymentRecord:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class DepositRecord:
     """押金记录实体"""
     date: datetime.date
@@ -143,7 +199,7 @@ class DepositRecord:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class InvoiceRecord:
     """开票记录实体"""
     date: datetime.date
@@ -176,7 +232,7 @@ class InvoiceRecord:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class LeaseContract:
     """租赁合同实体"""
     contract_id: str
@@ -200,7 +256,7 @@ class LeaseContract:
     initial_total_rent: float = field(default=0.0, init=False)
     initial_stamp_duty: float = field(default=0.0, init=False)
     
-    # 关联数据
+    # 关联数据（由数据库加载的合同中租金期/免租期为 LazyRelation，首次访问时查询）
     rent_periods: List[RentPeriod] = field(default_factory=list, init=False)
     free_rent_periods: List[FreeRentPeriod] = field(default_factory=list, init=False)
     payment_records: List[PaymentRecord] = field(default_factory=list, init=False)
@@ -274,21 +330,29 @@ class LeaseContract:
                 else:
                     current_date = datetime.date(current_date.year, current_date.month + 1, 1)
         
-        self.total_rent = round(total, 2)
+        total_rent = Money.from_yuan(total)
+        self.total_rent = total_rent.yuan
         self.initial_total_rent = self.total_rent
-        self.initial_stamp_duty = round(self.initial_total_rent * config.business.stamp_duty_rate, 2)
+        self.initial_stamp_duty = (total_rent * config.business.stamp_duty_rate).yuan
         
         return self.total_rent
     
     def get_deposit_balance(self) -> float:
-        """计算押金余额"""
-        balance = 0.0
+        """按已加载的押金记录计算押金余额（已保存合同的余额请使用 PaymentService.get_deposit_balance）"""
+        balance = Money()
         for deposit in self.deposit_records:
             if deposit.record_type == RecordType.RECEIVE.value:
-                balance += deposit.amount
+                balance += Money.from_yuan(deposit.amount)
             else:
-                balance -= deposit.amount
-        return round(balance, 2)
+                balance -= Money.from_yuan(deposit.amount)
+        return balance.yuan
+    
+    def release_relations(self):
+        """释放已加载的延迟关联数据（再次访问时重新查询），直接赋值的列表不受影响"""
+        for relation in (self.rent_periods, self.free_rent_periods, self.payment_records,
+                         self.deposit_records, self.invoice_records):
+            if isinstance(relation, LazyRelation):
+                relation.release()
     
     def mark_effective(self, effective_date: datetime.date):
         """标记合同生效"""
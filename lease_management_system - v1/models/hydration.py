@@ -0,0 +1,114 @@
+"""
+实体批量构建模块 - 按批次把数据库中的行直接构建为实体对象
+数据库中的行在写入时已经校验，构建时不经过 __init__/__post_init__ 的逐行校验
+（__post_init__ 中为 None 字段补的默认值需由 null_defaults 给出）；
+转换函数对批次内每个不同取值只调用一次，重复出现的字符串（类型、创建人等）在各对象间共享同一驻留对象
+"""
+import dataclasses
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class _ValueCache(dict):
+    """
+    批次内的取值 -> 转换结果，首次遇到某个取值时才调用转换函数
+    NULL 不转换：有 null_default 时取其返回值（批次内调用一次），否则仍为 None
+    """
+    __slots__ = ("convert", "null_default")
+
+    def __init__(self, convert: Callable[[Any], Any], null_default: Optional[Callable[[], Any]] = None):
+        super().__init__()
+        self.convert = convert
+        self.null_default = null_default
+
+    def __missing__(self, key):
+        if key is None:
+            value = None if self.null_default is None else self.null_default()
+        else:
+            value = self.convert(key)
+        self[key] = value
+        return value
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _share(value: Any) -> Any:
+    """字符串驻留，同值的字符串在所有批次间共享同一对象"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def _compile_builder(entity: type, fields: Tuple[str, ...], cached: Tuple[str, ...]) -> Callable[..., List[Any]]:
+    """
+    生成整批构建实体的函数 build(rows, *caches)：逐行解包、不调用 __init__，按字段直接赋值，
+    cached 中的字段经对应的取值缓存转换；实体中不由查询提供的字段按 dataclass 的默认值补齐
+    （default_factory 每个对象各调用一次）
+    """
+    constants: Dict[str, Any] = {"_new": object.__new__, "_entity": entity}
+    lines = [f"def build(rows{''.join(f', c_{name}' for name in cached)}):",
+             "    result = []",
+             "    append = result.append",
+             f"    for {', '.join(f'v_{name}' for name in fields)}, in rows:",
+             "        obj = _new(_entity)"]
+    lines += [f"        obj.{name} = c_{name}[v_{name}]" if name in cached else f"        obj.{name} = v_{name}"
+              for name in fields]
+    for item in dataclasses.fields(entity):
+        if item.name in fields:
+            continue
+        if item.default_factory is not dataclasses.MISSING:
+            constants[f"_factory_{item.name}"] = item.default_factory
+            lines.append(f"        obj.{item.name} = _factory_{item.name}()")
+        elif item.default is not dataclasses.MISSING:
+            constants[f"_default_{item.name}"] = item.default
+            lines.append(f"        obj.{item.name} = _default_{item.name}")
+        else:
+            raise ValueError(f"{entity.__name__}.{item.name} 没有默认值，必须由查询列提供")
+    lines += ["        append(obj)", "    return result"]
+    # 与 dataclasses 生成 __init__ 的方式相同：字段名均为实体的合法属性名
+    namespace: Dict[str, Any] = {}
+    exec("\n".join(lines), constants, namespace)
+    return namespace["build"]
+
+
+class EntityHydrator:
+    """
+    实体批量构建器
+    columns 给出 实体字段 -> 查询列名，select_list 即按此顺序拼出的 SELECT 列表；
+    from_rows 接收按该列顺序的元组行（RowMode.TUPLE），from_columns 接收按列名取值的列批次（RowMode.COLUMNAR）
+    """
+
+    def __init__(self, entity: type, columns: Dict[str, str],
+                 converters: Optional[Dict[str, Callable[[Any], Any]]] = None, shared: Iterable[str] = (),
+                 null_defaults: Optional[Dict[str, Callable[[], Any]]] = None):
+        """
+        :param converters: 字段 -> 数据库值到实体值的转换函数（如日期序数 -> date），NULL 不转换
+        :param shared: 在对象间共享驻留字符串的字段（取值重复度高的类型、创建人、合同编号等）
+        :param null_defaults: 字段 -> 取值为 NULL 时的默认值工厂（对应实体 __post_init__ 中的补值，如创建时间取当前时间），
+                              每批调用一次
+        """
+        self.entity = entity
+        self.fields = tuple(columns)
+        self.columns = tuple(columns.values())
+        # 字段 -> 转换函数（含共享字符串的字段）
+        self.converters = dict(converters or {})
+        self.converters.update({name: _share for name in shared if name not in self.converters})
+        self.null_defaults = dict(null_defaults or {})
+        self.converters.update({name: _identity for name in self.null_defaults if name not in self.converters})
+        self._build = _compile_builder(entity, self.fields, tuple(self.converters))
+
+    @property
+    def select_list(self) -> str:
+        """SELECT 列表（列顺序即 from_rows 期望的元组顺序）"""
+        return ", ".join(self.columns)
+
+    def from_rows(self, rows: Iterable[Sequence[Any]]) -> List[Any]:
+        """由元组行（列顺序同 select_list）构建实体列表"""
+        return self._build(rows, *(_ValueCache(convert, self.null_defaults.get(name))
+                                   for name, convert in self.converters.items()))
+
+    def from_columns(self, batch: Dict[str, List[Any]]) -> List[Any]:
+        """由列批次 {列名: [值, ...]} 构建实体列表（可包含多余的列）"""
+        if not batch:
+            return []
+        return self.from_rows(zip(*(batch[column] for column in self.columns)))
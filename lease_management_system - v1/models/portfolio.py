@@ -0,0 +1,316 @@
+"""
+合同组合列式快照模块 - 把整个合同组合展开为按合同对齐的 NumPy 数组，按月份整批计算租金、有效天数、收入与印花税
+租金期/免租期按合同顺序拼接为扁平数组，第 i 份合同的期间位于 offsets[i]:offsets[i + 1]，日期以序数（date.toordinal()）保存；
+各计算函数与 LeaseAccounting 的逐合同口径一致。NumPy 为可选依赖，未安装时 NUMPY_AVAILABLE 为 False，调用方回退到逐合同计算
+"""
+import calendar
+import datetime
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 组合快照依赖 NumPy，未安装时由调用方回退到逐合同计算
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+# 日期序数与 datetime64[D]（1970-01-01 起的天数）之间的差值
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def month_span(year: int, month: int) -> Tuple[int, int, int]:
+    """指定月份的 (首日序数, 末日序数, 当月天数)"""
+    days = calendar.monthrange(year, month)[1]
+    first = datetime.date(year, month, 1).toordinal()
+    return first, first + days - 1, days
+
+
+def _offsets(owners: "np.ndarray", count: int) -> "np.ndarray":
+    """按合同下标排好序的期间 -> 长度 count + 1 的偏移数组"""
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners, minlength=count), out=offsets[1:])
+    return offsets
+
+
+@dataclass
+class PortfolioSnapshot:
+    """
+    合同组合列式快照：合同属性为按合同对齐的并行数组，租金期/免租期为扁平数组加偏移
+    只需合同属性的统计（印花税、合同总租金等）可不带期间（with_periods=False）
+    """
+    contract_ids: List[str]
+    customer_names: List[str]
+    room_numbers: List[str]
+    tax_rate: "np.ndarray"
+    need_adjust_income: "np.ndarray"
+    is_effective: "np.ndarray"
+    total_rent: "np.ndarray"
+    initial_total_rent: "np.ndarray"
+    # 租金期：第 i 份合同位于 rent_offsets[i]:rent_offsets[i + 1]，同一合同内按开始日期排序
+    rent_offsets: "np.ndarray"
+    rent_start: "np.ndarray"
+    rent_end: "np.ndarray"
+    rent_monthly: "np.ndarray"
+    # 免租期：第 i 份合同位于 free_offsets[i]:free_offsets[i + 1]
+    free_offsets: "np.ndarray"
+    free_start: "np.ndarray"
+    free_end: "np.ndarray"
+    # 各租金期/免租期所属合同的下标
+    rent_owner: "np.ndarray" = field(init=False, repr=False)
+    free_owner: "np.ndarray" = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if np is None:
+            raise RuntimeError("合同组合快照需要安装 NumPy")
+        contracts = np.arange(len(self.contract_ids))
+        self.rent_owner = np.repeat(contracts, np.diff(self.rent_offsets))
+        self.free_owner = np.repeat(contracts, np.diff(self.free_offsets))
+
+    def __len__(self) -> int:
+        return len(self.contract_ids)
+
+    @classmethod
+    def from_columns(cls, contracts: Dict[str, List[Any]], rent_periods: Optional[Dict[str, List[Any]]] = None,
+                     free_periods: Optional[Dict[str, List[Any]]] = None) -> "PortfolioSnapshot":
+        """
+        由列批次（RowMode.COLUMNAR）构建：期间批次含 contract_id、start_date_ord、end_date_ord（租金期另含 monthly_rent），
+        同一合同的租金期按开始日期排列；不属于快照中任何合同的期间被忽略
+        """
+        ids = list(contracts.get("contract_id", []))
+        index = {contract_id: i for i, contract_id in enumerate(ids)}
+
+        def periods(batch: Optional[Dict[str, List[Any]]], columns: Sequence[str]):
+            if not batch:
+                return _offsets(np.zeros(0, dtype=np.int64), len(ids)), [np.zeros(0) for _ in columns]
+            owners = np.fromiter((index.get(contract_id, -1) for contract_id in batch["contract_id"]),
+                                 dtype=np.int64, count=len(batch["contract_id"]))
+            keep = np.flatnonzero(owners >= 0)
+            # 稳定排序：按合同聚集，同一合同内保持查询给出的顺序
+            keep = keep[np.argsort(owners[keep], kind="stable")]
+            return _offsets(owners[keep], len(ids)), [np.asarray(batch[column])[keep] for column in columns]
+
+        rent_offsets, (rent_start, rent_end, rent_monthly) = periods(
+            rent_periods, ("start_date_ord", "end_date_ord", "monthly_rent"))
+        free_offsets, (free_start, free_end) = periods(free_periods, ("start_date_ord", "end_date_ord"))
+        return cls(
+            contract_ids=ids,
+            customer_names=list(contracts.get("customer_name", [])),
+            room_numbers=list(contracts.get("room_number", [])),
+            tax_rate=np.asarray(contracts.get("tax_rate", []), dtype=np.float64),
+            need_adjust_income=np.asarray(contracts.get("need_adjust_income", []), dtype=bool),
+            is_effective=np.asarray(contracts.get("is_effective", []), dtype=bool),
+            total_rent=np.asarray(contracts.get("total_rent", []), dtype=np.float64),
+            initial_total_rent=np.asarray(contracts.get("initial_total_rent", []), dtype=np.float64),
+            rent_offsets=rent_offsets,
+            rent_start=rent_start.astype(np.int64),
+            rent_end=rent_end.astype(np.int64),
+            rent_monthly=rent_monthly.astype(np.float64),
+            free_offsets=free_offsets,
+            free_start=free_start.astype(np.int64),
+            free_end=free_end.astype(np.int64),
+        )
+
+    @classmethod
+    def from_contracts(cls, contracts: Iterable[Any], with_periods: bool = False) -> "PortfolioSnapshot":
+        """
+        由内存中的 LeaseContract 构建（界面已持有的合同列表）
+        with_periods=True 时读取各合同的租金期/免租期（延迟关联的合同会逐个查询，整个组合请使用 PortfolioService）
+        """
+        contracts = list(contracts)
+        columns = {name: [getattr(c, name) for c in contracts] for name in (
+            "contract_id", "customer_name", "room_number", "tax_rate", "need_adjust_income", "is_effective",
+            "total_rent", "initial_total_rent")}
+        rent_periods = free_periods = None
+        if with_periods:
+            rent_periods = {"contract_id": [], "start_date_ord": [], "end_date_ord": [], "monthly_rent": []}
+            free_periods = {"contract_id": [], "start_date_ord": [], "end_date_ord": []}
+            for contract in contracts:
+                for rp in sorted(contract.rent_periods, key=lambda x: x.start_date):
+                    rent_periods["contract_id"].append(contract.contract_id)
+                    rent_periods["start_date_ord"].append(rp.start_date.toordinal())
+                    rent_periods["end_date_ord"].append(rp.end_date.toordinal())
+                    rent_periods["monthly_rent"].append(rp.monthly_rent)
+                for fp in contract.free_rent_periods:
+                    free_periods["contract_id"].append(contract.contract_id)
+                    free_periods["start_date_ord"].append(fp.start_date.toordinal())
+                    free_periods["end_date_ord"].append(fp.end_date.toordinal())
+        return cls.from_columns(columns, rent_periods, free_periods)
+
+    @property
+    def has_rent_periods(self) -> "np.ndarray":
+        """各合同是否有租金期"""
+        return np.diff(self.rent_offsets) > 0
+
+    def mask(self, contract_ids: Iterable[str]) -> "np.ndarray":
+        """指定合同编号对应的布尔掩码（快照中不存在的编号被忽略）"""
+        wanted = set(contract_ids)
+        return np.fromiter((contract_id in wanted for contract_id in self.contract_ids), dtype=bool,
+                           count=len(self.contract_ids))
+
+
+def round_cents(values: "np.ndarray") -> "np.ndarray":
+    """
+    按元保留两位小数，与逐合同计算中的 round(x, 2) 逐值一致
+    np.round 先乘 100 再取整，乘积的舍入误差会让接近半分的金额舍入方向与 round 不同；
+    这里用 Veltkamp 拆分精确求出乘积的误差，乘积恰为半分时按误差方向取舍
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100
+    split = values * 134217729.0  # 2^27 + 1
+    high = split - (split - values)
+    error = (high * 100 - scaled) + (values - high) * 100
+    floor = np.floor(scaled)
+    tie = (scaled - floor == 0.5) & (error != 0)
+    return np.where(tie, floor + (error > 0), np.rint(scaled)) / 100
+
+
+def _free_days(snapshot: PortfolioSnapshot, start: "np.ndarray", end: "np.ndarray",
+               periods: "np.ndarray") -> "np.ndarray":
+    """
+    periods 中各租金期在 [start, end]（与 periods 对齐的序数区间）内与同一合同免租期重叠的天数，
+    按 (租金期, 同合同免租期) 展开为配对数组后一次计算
+    """
+    owners = snapshot.rent_owner[periods]
+    counts = np.diff(snapshot.free_offsets)[owners]
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(len(periods), dtype=np.int64)
+    pair = np.repeat(np.arange(len(periods)), counts)
+    # 配对在所属合同免租期内的位置
+    position = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    free = np.repeat(snapshot.free_offsets[owners], counts) + position
+    overlap_start = np.maximum(start[pair], snapshot.free_start[free])
+    overlap_end = np.minimum(end[pair], snapshot.free_end[free])
+    days = np.maximum(overlap_end - overlap_start + 1, 0)
+    return np.bincount(pair, weights=days, minlength=len(periods)).astype(np.int64)
+
+
+def month_rent(snapshot: PortfolioSnapshot, year: int, month: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    各合同指定月份的 (有效租赁天数, 税法口径含税租金)，与 LeaseAccounting._get_valid_rent_data 一致：
+    租金期与当月重叠的天数扣除其中的免租期天数为有效天数，含税租金 = 月租金 × 有效天数 / 当月总天数
+    """
+    first, last, days = month_span(year, month)
+    count = len(snapshot)
+    overlap_start = np.maximum(snapshot.rent_start, first)
+    overlap_end = np.minimum(snapshot.rent_end, last)
+    periods = np.flatnonzero(overlap_start <= overlap_end)
+    overlap_start, overlap_end = overlap_start[periods], overlap_end[periods]
+    free_days = _free_days(snapshot, overlap_start, overlap_end, periods)
+    valid = np.maximum(overlap_end - overlap_start + 1 - free_days, 0)
+    owners = snapshot.rent_owner[periods]
+    valid_days = np.bincount(owners, weights=valid, minlength=count).astype(np.int64)
+    tax_rent = np.bincount(owners, weights=snapshot.rent_monthly[periods] * valid / days, minlength=count)
+    return valid_days, round_cents(tax_rent)
+
+
+def valid_days(snapshot: PortfolioSnapshot, year: int, month: int) -> "np.ndarray":
+    """各合同指定月份的有效租赁天数（扣除免租期）"""
+    return month_rent(snapshot, year, month)[0]
+
+
+def contract_span(snapshot: PortfolioSnapshot) -> Tuple["np.ndarray", "np.ndarray"]:
+    """各合同租期的 (起始日序数, 结束日序数)，无租金期的合同为 (0, 0)"""
+    starts = np.zeros(len(snapshot), dtype=np.int64)
+    ends = np.zeros(len(snapshot), dtype=np.int64)
+    has = snapshot.has_rent_periods
+    if has.any():
+        first = snapshot.rent_offsets[:-1][has]
+        # 同一合同内按开始日期排序，首个租金期即最早开始
+        starts[has] = snapshot.rent_start[first]
+        ends[has] = np.maximum.reduceat(snapshot.rent_end, first)
+    return starts, ends
+
+
+def _month_parts(ordinals: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """序数日期 -> (1970 年 1 月起的月份序号, 当月首日序数, 当月天数)"""
+    months = (ordinals - _EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]")
+    first = months.astype("datetime64[D]").astype(np.int64) + _EPOCH_ORDINAL
+    following = (months + 1).astype("datetime64[D]").astype(np.int64) + _EPOCH_ORDINAL
+    return months.astype(np.int64), first, following - first
+
+
+def adjusted_income(snapshot: PortfolioSnapshot, year: int, month: int) -> "np.ndarray":
+    """
+    各合同指定月份的会计口径（调整后）不含税收入，与 LeaseAccounting._calculate_adjusted_income 一致：
+    合同总租金不含税后按租赁月数（首尾月按天折算）平均分摊，未到租期或无租金期的合同为 0
+    """
+    _, last, _ = month_span(year, month)
+    starts, ends = contract_span(snapshot)
+    started = snapshot.has_rent_periods & (starts <= last)
+    income = np.zeros(len(snapshot), dtype=np.float64)
+    if not started.any():
+        return income
+    start_month, start_first, start_days = _month_parts(starts[started])
+    end_month, end_first, end_days = _month_parts(ends[started])
+    first_ratio = (start_first + start_days - starts[started]) / start_days
+    last_ratio = (ends[started] - end_first + 1) / end_days
+    middle = np.maximum(end_month - start_month - 1, 0)
+    lease_months = first_ratio + middle + last_ratio
+    tax_rate = snapshot.tax_rate[started]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        monthly = (snapshot.total_rent[started] / (1 + tax_rate)) / lease_months
+    income[started] = np.where((lease_months > 0) & np.isfinite(monthly), round_cents(monthly), 0.0)
+    return income
+
+
+def monthly_income(snapshot: PortfolioSnapshot, year: int, month: int) -> Dict[str, "np.ndarray"]:
+    """
+    各合同指定月份的有效天数、含税租金与会计/税法口径不含税收入（对应 LeaseAccounting.calculate_monthly_income 的计算部分）
+    无需调整收入的合同会计收入与税法收入一致
+    """
+    days, tax_rent = month_rent(snapshot, year, month)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tax_income = np.where(snapshot.tax_rate != -1, round_cents(tax_rent / (1 + snapshot.tax_rate)), 0.0)
+    accounting_income = tax_income.copy()
+    adjust = snapshot.need_adjust_income
+    if adjust.any():
+        accounting_income[adjust] = adjusted_income(snapshot, year, month)[adjust]
+    return {"valid_days": days, "tax_rent": tax_rent,
+            "accounting_income": accounting_income, "tax_income": tax_income}
+
+
+def tax_diff(snapshot: PortfolioSnapshot, year: int, month: int,
+             income_tax_rate: float = 0.25) -> Dict[str, "np.ndarray"]:
+    """各合同指定月份的税会差异、递延所得税、待转销项税额与冲减待转销项税额（对应 LeaseAccounting.calculate_tax_diff）"""
+    result = monthly_income(snapshot, year, month)
+    accounting_income, tax_income = result["accounting_income"], result["tax_income"]
+    diff_amount = round_cents(accounting_income - tax_income)
+    result.update({
+        "diff_amount": diff_amount,
+        "to_be_settled_vat": round_cents(accounting_income * snapshot.tax_rate),
+        "adjust_vat": round_cents(tax_income * snapshot.tax_rate),
+        "deferred_tax": round_cents(diff_amount * income_tax_rate),
+    })
+    return result
+
+
+def stamp_duty(rent: "np.ndarray", rate: float) -> "np.ndarray":
+    """各合同印花税：合同含税总租金 × 印花税率，保留两位小数"""
+    return round_cents(rent * rate)
+
+
+def totals(columns: Dict[str, "np.ndarray"], mask: Optional["np.ndarray"] = None) -> Dict[str, float]:
+    """各列（可按掩码筛选合同）的合计"""
+    return {name: float(values[mask].sum() if mask is not None else values.sum()) for name, values in columns.items()}
+
+
+def stamp_statistics(snapshot: PortfolioSnapshot, rate: float,
+                     mask: Optional["np.ndarray"] = None) -> Dict[str, float]:
+    """
+    印花税统计（合同数、合同总租金合计、印花税合计/平均/最高/最低），
+    印花税按初始合同总租金 × 印花税率计算，与印花税标签页逐行显示的口径一致
+    """
+    rent = snapshot.total_rent if mask is None else snapshot.total_rent[mask]
+    duties = (snapshot.initial_total_rent if mask is None else snapshot.initial_total_rent[mask]) * rate
+    count = len(duties)
+    total_duty = float(duties.sum())
+    return {
+        "total_contracts": count,
+        "total_rent": float(rent.sum()),
+        "total_stamp_duty": total_duty,
+        "avg_stamp_duty": total_duty / count if count else 0.0,
+        "max_stamp_duty": float(duties.max()) if count else 0.0,
+        "min_stamp_duty": float(duties.min()) if count else 0.0,
+    }
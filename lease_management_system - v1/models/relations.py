@@ -0,0 +1,71 @@
+"""
+关联数据延迟加载模块 - 合同的租金期/免租期等关联列表在首次访问时才查询，用完可释放
+"""
+from collections.abc import MutableSequence
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+
+class LazyRelation(MutableSequence):
+    """
+    关联列表的延迟加载代理：首次访问时调用 loader(key) 查询并缓存结果，release() 释放已加载的数据，
+    之后再访问时重新查询；其余用法与 list 相同（修改前先加载，只修改内存中的列表，不写回数据库）
+    """
+    __slots__ = ("_loader", "_key", "_items")
+    __hash__ = None
+
+    def __init__(self, loader: Callable[[Any], Iterable[Any]], key: Any):
+        self._loader = loader
+        self._key = key
+        self._items: Optional[List[Any]] = None
+
+    @property
+    def loaded(self) -> bool:
+        """是否已加载"""
+        return self._items is not None
+
+    @property
+    def items(self) -> List[Any]:
+        """已加载的列表（未加载时先查询）"""
+        if self._items is None:
+            self._items = list(self._loader(self._key))
+        return self._items
+
+    def release(self):
+        """释放已加载的数据"""
+        self._items = None
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __setitem__(self, index, value):
+        self.items[index] = value
+
+    def __delitem__(self, index):
+        del self.items[index]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.items)
+
+    def __contains__(self, value) -> bool:
+        return value in self.items
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LazyRelation):
+            other = other.items
+        return self.items == other
+
+    def insert(self, index: int, value):
+        self.items.insert(index, value)
+
+    def append(self, value):
+        self.items.append(value)
+
+    def extend(self, values: Iterable[Any]):
+        self.items.extend(values)
+
+    def __repr__(self) -> str:
+        # 打印合同时不触发查询
+        return repr(self._items) if self._items is not None else f"<未加载 {self._key}>"
@@ -2,89 +2,117 @@
 合同业务逻辑服务
 """
 import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Sequence
 
 from database.manager import DatabaseManager
+from database.migrations import CONTRACT_FTS_COLUMNS
+from database.rows import RowMode, ordinal_date
 from models.entities import LeaseContract, RentPeriod, FreeRentPeriod, ContractType
+from models.hydration import EntityHydrator
+from models.relations import LazyRelation
 from utils.logging import get_logger
 
 logger = get_logger("ContractService")
 
+# 合同及关联期间的批量构建器：实体字段 -> 查询列（合同表的列与实体字段同名）
+CONTRACT_HYDRATOR = EntityHydrator(LeaseContract, {name: name for name in (
+    "contract_id", "customer_name", "room_number", "payment_name", "eas_code", "created_by", "area", "tax_rate",
+    "need_adjust_income", "deposit_amount", "create_time", "contract_type", "original_contract_id", "is_effective",
+    "effective_date", "total_rent", "initial_total_rent", "initial_stamp_duty")}, {
+    "need_adjust_income": bool,
+    "is_effective": bool,
+    "create_time": datetime.datetime.fromisoformat,
+    "effective_date": datetime.date.fromisoformat,
+}, shared=("created_by", "contract_type"), null_defaults={
+    # 与 LeaseContract.__post_init__ 一致：缺少创建时间的历史数据取当前时间
+    "create_time": datetime.datetime.now,
+})
+RENT_PERIOD_HYDRATOR = EntityHydrator(RentPeriod, {
+    "id": "id", "start_date": "start_date_ord", "end_date": "end_date_ord", "monthly_rent": "monthly_rent",
+}, {"start_date": ordinal_date, "end_date": ordinal_date})
+FREE_PERIOD_HYDRATOR = EntityHydrator(FreeRentPeriod, {
+    "id": "id", "start_date": "start_date_ord", "end_date": "end_date_ord",
+}, {"start_date": ordinal_date, "end_date": ordinal_date})
+
 
 class ContractService:
     """合同业务逻辑服务"""
     
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
+        # 延迟关联的查询函数（各合同的代理共用同一个绑定方法对象）
+        self._rent_period_loader = self._query_rent_periods
+        self._free_period_loader = self._query_free_periods
     
     def create_contract(self, contract_data: Dict[str, Any], user: str) -> LeaseContract:
         """创建新合同"""
         try:
-            # 验证合同ID唯一性
-            if self.get_contract_by_id(contract_data["contract_id"]):
-                raise ValueError(f"合同ID {contract_data['contract_id']} 已存在")
-            
-            # 验证续租/变更合同的原合同
-            if contract_data.get("contract_type") in [ContractType.RENEWAL.value, ContractType.CHANGE.value]:
-                original_id = contract_data.get("original_contract_id")
-                if not original_id:
-                    raise ValueError("续租/变更类型需要指定原合同ID")
-                if not self.get_contract_by_id(original_id):
-                    raise ValueError(f"原合同{original_id}不存在")
-            
-            # 创建合同实体
-            contract = LeaseContract(
-                contract_id=contract_data["contract_id"],
-                customer_name=contract_data["customer_name"],
-                room_number=contract_data["room_number"],
-                payment_name=contract_data["payment_name"],
-                eas_code=contract_data["eas_code"],
-                created_by=user,
-                area=contract_data.get("area", 0.0),
-                tax_rate=contract_data.get("tax_rate", 0.05),
-                need_adjust_income=contract_data.get("need_adjust_income", False),
-                deposit_amount=contract_data.get("deposit_amount", 0.0),
-                contract_type=contract_data.get("contract_type", ContractType.NEW.value),
-                original_contract_id=contract_data.get("original_contract_id"),
-                create_time=contract_data.get("create_time", datetime.datetime.now())
-            )
-            
-            # 保存到数据库
-            contract_dict = contract.to_dict()
-            sql = '''
-                INSERT INTO contracts (
-                    contract_id, customer_name, room_number, area, total_rent,
-                    initial_total_rent, payment_name, eas_code, tax_rate,
-                    need_adjust_income, deposit_amount, create_time,
-                    initial_stamp_duty, created_by, contract_type, original_contract_id,
-                    is_effective, effective_date
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            '''
-            
-            if not self.db.execute_command(sql, (
-                contract_dict['contract_id'],
-                contract_dict['customer_name'],
-                contract_dict['room_number'],
-                contract_dict['area'],
-                contract_dict['total_rent'],
-                contract_dict['initial_total_rent'],
-                contract_dict['payment_name'],
-                contract_dict['eas_code'],
-                contract_dict['tax_rate'],
-                contract_dict['need_adjust_income'],
-                contract_dict['deposit_amount'],
-                contract_dict['create_time'],
-                contract_dict['initial_stamp_duty'],
-                contract_dict['created_by'],
-                contract_dict['contract_type'],
-                contract_dict['original_contract_id'],
-                contract_dict['is_effective'],
-                contract_dict['effective_date']
-            )):
-                raise Exception("保存合同到数据库失败")
-            
-            # 记录操作日志
-            self.db.log_operation(user, 'create', 'contract', contract.contract_id, '创建新合同')
+            with self.db.transaction():
+                # 验证合同ID唯一性
+                if self.get_contract_by_id(contract_data["contract_id"]):
+                    raise ValueError(f"合同ID {contract_data['contract_id']} 已存在")
+                
+                # 验证续租/变更合同的原合同
+                if contract_data.get("contract_type") in [ContractType.RENEWAL.value, ContractType.CHANGE.value]:
+                    original_id = contract_data.get("original_contract_id")
+                    if not original_id:
+                        raise ValueError("续租/变更类型需要指定原合同ID")
+                    if not self.get_contract_by_id(original_id):
+                        raise ValueError(f"原合同{original_id}不存在")
+                
+                # 创建合同实体
+                contract = LeaseContract(
+                    contract_id=contract_data["contract_id"],
+                    customer_name=contract_data["customer_name"],
+                    room_number=contract_data["room_number"],
+                    payment_name=contract_data["payment_name"],
+                    eas_code=contract_data["eas_code"],
+                    created_by=user,
+                    area=contract_data.get("area", 0.0),
+                    tax_rate=contract_data.get("tax_rate", 0.05),
+                    need_adjust_income=contract_data.get("need_adjust_income", False),
+                    deposit_amount=contract_data.get("deposit_amount", 0.0),
+                    contract_type=contract_data.get("contract_type", ContractType.NEW.value),
+                    original_contract_id=contract_data.get("original_contract_id"),
+                    create_time=contract_data.get("create_time", datetime.datetime.now())
+                )
+                
+                # 保存到数据库
+                contract_dict = contract.to_dict()
+                sql = '''
+                    INSERT INTO contracts (
+                        contract_id, customer_name, room_number, area, total_rent,
+                        initial_total_rent, payment_name, eas_code, tax_rate,
+                        need_adjust_income, deposit_amount, create_time,
+                        initial_stamp_duty, created_by, contract_type, original_contract_id,
+                        is_effective, effective_date
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                '''
+                
+                if not self.db.execute_command(sql, (
+                    contract_dict['contract_id'],
+                    contract_dict['customer_name'],
+                    contract_dict['room_number'],
+                    contract_dict['area'],
+                    contract_dict['total_rent'],
+                    contract_dict['initial_total_rent'],
+                    contract_dict['payment_name'],
+                    contract_dict['eas_code'],
+                    contract_dict['tax_rate'],
+                    contract_dict['need_adjust_income'],
+                    contract_dict['deposit_amount'],
+                    contract_dict['create_time'],
+                    contract_dict['initial_stamp_duty'],
+                    contract_dict['created_by'],
+                    contract_dict['contract_type'],
+                    contract_dict['original_contract_id'],
+                    contract_dict['is_effective'],
+                    contract_dict['effective_date']
+                )):
+                    raise Exception("保存合同到数据库失败")
+                
+                # 记录操作日志
+                self.db.log_operation(user, 'create', 'contract', contract.contract_id, '创建新合同')
             logger.info(f"用户 {user} 创建了新合同: {contract.contract_id}")
             
             return contract
@@ -96,15 +124,14 @@ class ContractService:
     def get_contract_by_id(self, contract_id: str) -> Optional[LeaseContract]:
         """根据ID获取合同"""
         try:
-            contracts = self.db.execute_query(
+            contracts = CONTRACT_HYDRATOR.from_columns(self.db.execute_query(
                 "SELECT * FROM contracts WHERE contract_id = ?",
-                (contract_id,)
-            )
+                (contract_id,), row_mode=RowMode.COLUMNAR
+            ))
             if not contracts:
                 return None
             
-            contract_data = contracts[0]
-            contract = self._build_contract_from_dict(contract_data)
+            contract = contracts[0]
             self._load_contract_relations(contract)
             return contract
             
@@ -113,15 +140,13 @@ class ContractService:
             return None
     
     def get_all_contracts(self) -> List[LeaseContract]:
-        """获取所有合同"""
+        """获取所有合同（租金期/免租期在首次访问时加载）"""
         try:
-            contracts = self.db.execute_query("SELECT * FROM contracts ORDER BY create_time DESC")
-            result = []
+            result = CONTRACT_HYDRATOR.from_columns(self.db.execute_query(
+                "SELECT * FROM contracts ORDER BY create_time DESC", row_mode=RowMode.COLUMNAR))
             
-            for contract_data in contracts:
-                contract = self._build_contract_from_dict(contract_data)
+            for contract in result:
                 self._load_contract_relations(contract)
-                result.append(contract)
             
             return result
             
@@ -129,6 +154,63 @@ class ContractService:
             logger.error(f"获取所有合同失败: {str(e)}")
             return []
     
+    def iter_contracts(self, batch_size: int = 200) -> Iterator[LeaseContract]:
+        """流式获取所有合同（含关联期间），供导出等逐条处理的场景使用"""
+        sql = "SELECT * FROM contracts ORDER BY create_time DESC"
+        for batch in self.db.iter_query(sql, (), batch_size, row_mode=RowMode.COLUMNAR):
+            for contract in CONTRACT_HYDRATOR.from_columns(batch):
+                self._load_contract_relations(contract)
+                yield contract
+    
+    def search(self, query: str, limit: int = 100,
+               columns: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        全文检索合同，返回按相关度排序的合同编号
+        查询按空白拆分为多个词，每个词须在任一检索列中作为子串出现（不区分大小写）；
+        不少于 3 个字符的词走 FTS5 trigram 索引，更短的词在候选结果上按 LIKE 过滤
+        :param columns: 限定检索的列（默认全部检索列）
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        columns = [column for column in (columns or CONTRACT_FTS_COLUMNS) if column in CONTRACT_FTS_COLUMNS]
+        if not columns:
+            return []
+        
+        try:
+            use_fts = bool(self.db.execute_query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contracts_fts'"))
+            table = "contracts_fts" if use_fts else "contracts"
+            long_terms = [term for term in terms if use_fts and len(term) >= 3]
+            conditions, params = [], []
+            if long_terms:
+                column_filter = "{" + " ".join(columns) + "}"
+                phrases = " AND ".join('"' + term.replace('"', '""') + '"' for term in long_terms)
+                conditions.append("contracts_fts MATCH ?")
+                params.append(f"{column_filter} : ({phrases})")
+            for term in terms:
+                if term in long_terms:
+                    continue
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                conditions.append("(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in columns) + ")")
+                params.extend([pattern] * len(columns))
+            order = "rank" if long_terms else "rowid DESC"
+            sql = f"SELECT contract_id FROM {table} WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?"
+            rows = self.db.execute_query(sql, tuple(params) + (limit,), row_mode=RowMode.TUPLE)
+            return [row[0] for row in rows]
+        except Exception as e:
+            logger.error(f"搜索合同失败: query={query}, 错误={str(e)}")
+            return []
+    
+    def get_customer_names(self, include_archive: bool = False) -> Dict[str, str]:
+        """合同编号到客户名称的映射，include_archive=True 时包含已归档的合同"""
+        sql = "SELECT contract_id, customer_name FROM contracts"
+        if include_archive:
+            rows = self.db.archive.execute_query(sql, row_mode=RowMode.TUPLE)
+        else:
+            rows = self.db.execute_query(sql, row_mode=RowMode.TUPLE)
+        return dict(rows)
+    
     def update_contract(self, contract_id: str, update_data: Dict[str, Any], user: str) -> bool:
         """更新合同"""
         try:
@@ -173,7 +255,7 @@ class ContractService:
                 raise Exception("删除合同失败")
             
             # 记录操作日志
-            self.db.log_operation(user, 'delete', 'contract', contract_id, '删除合同及关联数据')
+            self.db.log_operation(user, 'delete', 'contract', contract_id, '删除合同及关联数据', sync=True)
             logger.info(f"用户 {user} 删除了合同: {contract_id}")
             
             return True
@@ -211,40 +293,42 @@ class ContractService:
     def add_rent_period(self, contract_id: str, rent_period: RentPeriod, user: str) -> bool:
         """添加租金期"""
         try:
-            contract = self.get_contract_by_id(contract_id)
-            if not contract:
-                raise ValueError(f"合同 {contract_id} 不存在")
-            
-            # 检查期间重叠
-            self._check_period_overlap(rent_period, contract.rent_periods, "租金期")
-            
-            # 保存到数据库
-            sql = '''
-                INSERT INTO rent_periods (contract_id, start_date, end_date, monthly_rent)
-                VALUES (?, ?, ?, ?)
-            '''
-            
-            if not self.db.execute_command(sql, (
-                contract_id,
-                rent_period.start_date.strftime("%Y-%m-%d"),
-                rent_period.end_date.strftime("%Y-%m-%d"),
-                rent_period.monthly_rent
-            )):
-                raise Exception("保存租金期失败")
-            
-            # 重新计算合同总租金
-            contract.rent_periods.append(rent_period)
-            total_rent = contract.calculate_total_rent()
-            
-            # 更新合同总租金
-            self.db.execute_command(
-                "UPDATE contracts SET total_rent = ?, initial_total_rent = ?, initial_stamp_duty = ? WHERE contract_id = ?",
-                (total_rent, contract.initial_total_rent, contract.initial_stamp_duty, contract_id)
-            )
-            
-            # 记录操作日志
-            self.db.log_operation(user, 'create', 'rent_period', contract_id, 
-                                f'添加租金期：{rent_period.start_date} - {rent_period.end_date}')
+            with self.db.transaction():
+                contract = self.get_contract_by_id(contract_id)
+                if not contract:
+                    raise ValueError(f"合同 {contract_id} 不存在")
+                
+                # 检查期间重叠
+                self._check_period_overlap(rent_period, contract.rent_periods, "租金期")
+                
+                # 保存到数据库
+                sql = '''
+                    INSERT INTO rent_periods (contract_id, start_date, end_date, monthly_rent)
+                    VALUES (?, ?, ?, ?)
+                '''
+                
+                if not self.db.execute_command(sql, (
+                    contract_id,
+                    rent_period.start_date.strftime("%Y-%m-%d"),
+                    rent_period.end_date.strftime("%Y-%m-%d"),
+                    rent_period.monthly_rent
+                )):
+                    raise Exception("保存租金期失败")
+                
+                # 重新计算合同总租金
+                contract.rent_periods.append(rent_period)
+                total_rent = contract.calculate_total_rent()
+                
+                # 更新合同总租金（失败时整个工作单元回滚）
+                if not self.db.execute_command(
+                    "UPDATE contracts SET total_rent = ?, initial_total_rent = ?, initial_stamp_duty = ? WHERE contract_id = ?",
+                    (total_rent, contract.initial_total_rent, contract.initial_stamp_duty, contract_id)
+                ):
+                    raise Exception("更新合同总租金失败")
+                
+                # 记录操作日志
+                self.db.log_operation(user, 'create', 'rent_period', contract_id, 
+                                    f'添加租金期：{rent_period.start_date} - {rent_period.end_date}')
             logger.info(f"用户 {user} 为合同 {contract_id} 添加了租金期")
             
             return True
@@ -256,39 +340,41 @@ class ContractService:
     def add_free_rent_period(self, contract_id: str, free_period: FreeRentPeriod, user: str) -> bool:
         """添加免租期"""
         try:
-            contract = self.get_contract_by_id(contract_id)
-            if not contract:
-                raise ValueError(f"合同 {contract_id} 不存在")
-            
-            # 检查期间重叠
-            self._check_period_overlap(free_period, contract.free_rent_periods, "免租期")
-            
-            # 保存到数据库
-            sql = '''
-                INSERT INTO free_periods (contract_id, start_date, end_date)
-                VALUES (?, ?, ?)
-            '''
-            
-            if not self.db.execute_command(sql, (
-                contract_id,
-                free_period.start_date.strftime("%Y-%m-%d"),
-                free_period.end_date.strftime("%Y-%m-%d")
-            )):
-                raise Exception("保存免租期失败")
-            
-            # 重新计算合同总租金
-            contract.free_rent_periods.append(free_period)
-            total_rent = contract.calculate_total_rent()
-            
-            # 更新合同总租金
-            self.db.execute_command(
-                "UPDATE contracts SET total_rent = ?, initial_total_rent = ?, initial_stamp_duty = ? WHERE contract_id = ?",
-                (total_rent, contract.initial_total_rent, contract.initial_stamp_duty, contract_id)
-            )
-            
-            # 记录操作日志
-            self.db.log_operation(user, 'create', 'free_period', contract_id,
-                                f'添加免租期：{free_period.start_date} - {free_period.end_date}')
+            with self.db.transaction():
+                contract = self.get_contract_by_id(contract_id)
+                if not contract:
+                    raise ValueError(f"合同 {contract_id} 不存在")
+                
+                # 检查期间重叠
+                self._check_period_overlap(free_period, contract.free_rent_periods, "免租期")
+                
+                # 保存到数据库
+                sql = '''
+                    INSERT INTO free_periods (contract_id, start_date, end_date)
+                    VALUES (?, ?, ?)
+                '''
+                
+                if not self.db.execute_command(sql, (
+                    contract_id,
+                    free_period.start_date.strftime("%Y-%m-%d"),
+                    free_period.end_date.strftime("%Y-%m-%d")
+                )):
+                    raise Exception("保存免租期失败")
+                
+                # 重新计算合同总租金
+                contract.free_rent_periods.append(free_period)
+                total_rent = contract.calculate_total_rent()
+                
+                # 更新合同总租金（失败时整个工作单元回滚）
+                if not self.db.execute_command(
+                    "UPDATE contracts SET total_rent = ?, initial_total_rent = ?, initial_stamp_duty = ? WHERE contract_id = ?",
+                    (total_rent, contract.initial_total_rent, contract.initial_stamp_duty, contract_id)
+                ):
+                    raise Exception("更新合同总租金失败")
+                
+                # 记录操作日志
+                self.db.log_operation(user, 'create', 'free_period', contract_id,
+                                    f'添加免租期：{free_period.start_date} - {free_period.end_date}')
             logger.info(f"用户 {user} 为合同 {contract_id} 添加了免租期")
             
             return True
@@ -297,63 +383,25 @@ class ContractService:
             logger.error(f"添加免租期失败: contract_id={contract_id}, 错误={str(e)}")
             return False
     
-    def _build_contract_from_dict(self, data: Dict[str, Any]) -> LeaseContract:
-        """从字典构建合同对象"""
-        contract = LeaseContract(
-            contract_id=data['contract_id'],
-            customer_name=data['customer_name'],
-            room_number=data['room_number'],
-            payment_name=data['payment_name'],
-            eas_code=data['eas_code'],
-            created_by=data['created_by'],
-            area=data.get('area', 0.0),
-            tax_rate=data.get('tax_rate', 0.05),
-            need_adjust_income=bool(data.get('need_adjust_income', 0)),
-            deposit_amount=data.get('deposit_amount', 0.0),
-            create_time=datetime.datetime.fromisoformat(data['create_time']) if data.get('create_time') else datetime.datetime.now(),
-            contract_type=data.get('contract_type', ContractType.NEW.value),
-            original_contract_id=data.get('original_contract_id')
-        )
-        
-        # 设置计算字段
-        contract.total_rent = data.get('total_rent', 0.0)
-        contract.initial_total_rent = data.get('initial_total_rent', 0.0)
-        contract.initial_stamp_duty = data.get('initial_stamp_duty', 0.0)
-        contract.is_effective = bool(data.get('is_effective', 0))
-        
-        if data.get('effective_date'):
-            contract.effective_date = datetime.datetime.strptime(data['effective_date'], "%Y-%m-%d").date()
-        
-        return contract
-    
     def _load_contract_relations(self, contract: LeaseContract):
-        """加载合同关联数据"""
-        # 加载租金期
-        rent_periods = self.db.execute_query(
-            "SELECT * FROM rent_periods WHERE contract_id = ? ORDER BY start_date",
-            (contract.contract_id,)
-        )
-        for rp_data in rent_periods:
-            rent_period = RentPeriod(
-                start_date=datetime.datetime.strptime(rp_data['start_date'], "%Y-%m-%d").date(),
-                end_date=datetime.datetime.strptime(rp_data['end_date'], "%Y-%m-%d").date(),
-                monthly_rent=rp_data['monthly_rent'],
-                id=rp_data['id']
-            )
-            contract.rent_periods.append(rent_period)
-        
-        # 加载免租期
-        free_periods = self.db.execute_query(
-            "SELECT * FROM free_periods WHERE contract_id = ? ORDER BY start_date",
-            (contract.contract_id,)
-        )
-        for fp_data in free_periods:
-            free_period = FreeRentPeriod(
-                start_date=datetime.datetime.strptime(fp_data['start_date'], "%Y-%m-%d").date(),
-                end_date=datetime.datetime.strptime(fp_data['end_date'], "%Y-%m-%d").date(),
-                id=fp_data['id']
-            )
-            contract.free_rent_periods.append(free_period)
+        """挂接合同关联数据：租金期/免租期在首次访问时才查询，可由 contract.release_relations() 释放"""
+        contract.rent_periods = LazyRelation(self._rent_period_loader, contract.contract_id)
+        contract.free_rent_periods = LazyRelation(self._free_period_loader, contract.contract_id)
+    
+    def _query_rent_periods(self, contract_id: str) -> List[RentPeriod]:
+        """查询合同的租金期（查询列顺序同构建器，日期读取序数列）"""
+        return RENT_PERIOD_HYDRATOR.from_rows(self.db.execute_query(
+            "SELECT id, start_date_ord, end_date_ord, monthly_rent FROM rent_periods "
+            "WHERE contract_id = ? ORDER BY start_date_ord",
+            (contract_id,), row_mode=RowMode.TUPLE
+        ))
+    
+    def _query_free_periods(self, contract_id: str) -> List[FreeRentPeriod]:
+        """查询合同的免租期"""
+        return FREE_PERIOD_HYDRATOR.from_rows(self.db.execute_query(
+            "SELECT id, start_date_ord, end_date_ord FROM free_periods WHERE contract_id = ? ORDER BY start_date_ord",
+            (contract_id,), row_mode=RowMode.TUPLE
+        ))
     
     def _check_period_overlap(self, new_period, existing_periods: List, period_type: str):
         """检查期间重叠"""
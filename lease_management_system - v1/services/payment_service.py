@@ -2,14 +2,33 @@
 支付业务逻辑服务
 """
 import datetime
-from typing import List, Dict, Any, Optional
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 
 from database.manager import DatabaseManager
-from models.entities import PaymentRecord, DepositRecord, InvoiceRecord, RecordType
+from database.rows import RowMode, ordinal_date
+from models.entities import Money, PaymentRecord, DepositRecord, InvoiceRecord, RecordType, to_cents
+from models.hydration import EntityHydrator
 from utils.logging import get_logger
 
 logger = get_logger("PaymentService")
 
+# 记录查询的批量构建器：实体字段 -> 查询列，日期读取整数序数列 date_ord
+_RECORD_CONVERTERS = {"date": ordinal_date, "created_at": datetime.datetime.fromisoformat}
+PAYMENT_HYDRATOR = EntityHydrator(PaymentRecord, {
+    "id": "id", "contract_id": "contract_id", "date": "date_ord", "amount": "amount",
+    "payment_type": "payment_type", "created_at": "created_at", "created_by": "created_by",
+}, _RECORD_CONVERTERS, shared=("contract_id", "payment_type", "created_by"))
+DEPOSIT_HYDRATOR = EntityHydrator(DepositRecord, {
+    "id": "id", "contract_id": "contract_id", "date": "date_ord", "amount": "amount",
+    "record_type": "record_type", "created_at": "created_at", "created_by": "created_by", "remark": "remark",
+}, _RECORD_CONVERTERS, shared=("contract_id", "record_type", "created_by", "remark"))
+INVOICE_HYDRATOR = EntityHydrator(InvoiceRecord, {
+    "id": "id", "contract_id": "contract_id", "date": "date_ord", "amount": "amount",
+    "tax_amount": "tax_amount", "invoice_number": "invoice_number", "created_at": "created_at",
+    "created_by": "created_by",
+}, _RECORD_CONVERTERS, shared=("contract_id", "created_by"))
+
 
 class PaymentService:
     """支付业务逻辑服务"""
@@ -21,28 +40,29 @@ class PaymentService:
         """添加收款记录"""
         try:
             sql = '''
-                INSERT INTO payment_records (contract_id, date, amount, payment_type, created_by)
+                INSERT INTO payment_records (contract_id, date, amount_cents, payment_type, created_by)
                 VALUES (?, ?, ?, ?, ?)
             '''
             
-            record_id = self.db.execute_command_with_id(sql, (
-                payment.contract_id,
-                payment.date.strftime("%Y-%m-%d"),
-                payment.amount,
-                payment.payment_type,
-                user
-            ))
-            
-            if record_id is None:
-                raise Exception("保存收款记录失败")
-            
-            payment.id = record_id
-            payment.created_by = user
-            payment.created_at = datetime.datetime.now()
-            
-            # 记录操作日志
-            self.db.log_operation(user, 'create', 'payment', payment.contract_id,
-                                f'添加收款记录：{payment.payment_type} {payment.amount:.2f}元')
+            with self.db.transaction():
+                record_id = self.db.execute_command_with_id(sql, (
+                    payment.contract_id,
+                    payment.date.strftime("%Y-%m-%d"),
+                    to_cents(payment.amount),
+                    payment.payment_type,
+                    user
+                ))
+                
+                if record_id is None:
+                    raise Exception("保存收款记录失败")
+                
+                payment.id = record_id
+                payment.created_by = user
+                payment.created_at = datetime.datetime.now()
+                
+                # 记录操作日志
+                self.db.log_operation(user, 'create', 'payment', payment.contract_id,
+                                    f'添加收款记录：{payment.payment_type} {payment.amount:.2f}元')
             logger.info(f"用户 {user} 添加了收款记录: 合同ID={payment.contract_id}, 金额={payment.amount}")
             
             return True
@@ -51,37 +71,46 @@ class PaymentService:
             logger.error(f"添加收款记录失败: {str(e)}")
             return False
     
-    def add_deposit_record(self, deposit: DepositRecord, user: str, current_balance: float = 0.0) -> bool:
-        """添加押金记录"""
+    def add_deposit_record(self, deposit: DepositRecord, user: str,
+                           current_balance: Optional[float] = None) -> bool:
+        """
+        添加押金记录
+        退还时校验押金余额（未传入 current_balance 时读取押金余额表）；
+        数据库中的余额非负约束兜底并发写入，超额退还的插入整体失败
+        """
         try:
             # 验证押金余额
-            if deposit.record_type == RecordType.RETURN.value and deposit.amount > current_balance:
-                raise ValueError(f"押金余额不足！当前余额: {current_balance:.2f}元，尝试退还: {deposit.amount:.2f}元")
+            if deposit.record_type == RecordType.RETURN.value:
+                if current_balance is None:
+                    current_balance = self.get_deposit_balance(deposit.contract_id)
+                if to_cents(deposit.amount) > to_cents(current_balance):
+                    raise ValueError(f"押金余额不足！当前余额: {current_balance:.2f}元，尝试退还: {deposit.amount:.2f}元")
             
             sql = '''
-                INSERT INTO deposit_records (contract_id, date, amount, record_type, created_by, remark)
+                INSERT INTO deposit_records (contract_id, date, amount_cents, record_type, created_by, remark)
                 VALUES (?, ?, ?, ?, ?, ?)
             '''
             
-            record_id = self.db.execute_command_with_id(sql, (
-                deposit.contract_id,
-                deposit.date.strftime("%Y-%m-%d"),
-                deposit.amount,
-                deposit.record_type,
-                user,
-                deposit.remark
-            ))
-            
-            if record_id is None:
-                raise Exception("保存押金记录失败")
-            
-            deposit.id = record_id
-            deposit.created_by = user
-            deposit.created_at = datetime.datetime.now()
-            
-            # 记录操作日志
-            self.db.log_operation(user, 'create', 'deposit', deposit.contract_id,
-                                f'{deposit.record_type}押金 {deposit.amount:.2f}元')
+            with self.db.transaction():
+                record_id = self.db.execute_command_with_id(sql, (
+                    deposit.contract_id,
+                    deposit.date.strftime("%Y-%m-%d"),
+                    to_cents(deposit.amount),
+                    deposit.record_type,
+                    user,
+                    deposit.remark
+                ))
+                
+                if record_id is None:
+                    raise Exception("保存押金记录失败")
+                
+                deposit.id = record_id
+                deposit.created_by = user
+                deposit.created_at = datetime.datetime.now()
+                
+                # 记录操作日志
+                self.db.log_operation(user, 'create', 'deposit', deposit.contract_id,
+                                    f'{deposit.record_type}押金 {deposit.amount:.2f}元')
             logger.info(f"用户 {user} 添加了押金记录: 合同ID={deposit.contract_id}, {deposit.record_type} {deposit.amount}")
             
             return True
@@ -94,29 +123,30 @@ class PaymentService:
         """添加开票记录"""
         try:
             sql = '''
-                INSERT INTO invoice_records (contract_id, date, amount, tax_amount, invoice_number, created_by)
+                INSERT INTO invoice_records (contract_id, date, amount_cents, tax_amount_cents, invoice_number, created_by)
                 VALUES (?, ?, ?, ?, ?, ?)
             '''
             
-            record_id = self.db.execute_command_with_id(sql, (
-                invoice.contract_id,
-                invoice.date.strftime("%Y-%m-%d"),
-                invoice.amount,
-                invoice.tax_amount,
-                invoice.invoice_number,
-                user
-            ))
-            
-            if record_id is None:
-                raise Exception("保存开票记录失败")
-            
-            invoice.id = record_id
-            invoice.created_by = user
-            invoice.created_at = datetime.datetime.now()
-            
-            # 记录操作日志
-            self.db.log_operation(user, 'create', 'invoice', invoice.contract_id,
-                                f'添加开票记录：发票号 {invoice.invoice_number}')
+            with self.db.transaction():
+                record_id = self.db.execute_command_with_id(sql, (
+                    invoice.contract_id,
+                    invoice.date.strftime("%Y-%m-%d"),
+                    to_cents(invoice.amount),
+                    to_cents(invoice.tax_amount),
+                    invoice.invoice_number,
+                    user
+                ))
+                
+                if record_id is None:
+                    raise Exception("保存开票记录失败")
+                
+                invoice.id = record_id
+                invoice.created_by = user
+                invoice.created_at = datetime.datetime.now()
+                
+                # 记录操作日志
+                self.db.log_operation(user, 'create', 'invoice', invoice.contract_id,
+                                    f'添加开票记录：发票号 {invoice.invoice_number}')
             logger.info(f"用户 {user} 添加了开票记录: 合同ID={invoice.contract_id}, 发票号={invoice.invoice_number}")
             
             return True
@@ -128,28 +158,7 @@ class PaymentService:
     def get_payment_records(self, contract_id: Optional[str] = None) -> List[PaymentRecord]:
         """获取收款记录"""
         try:
-            if contract_id:
-                sql = "SELECT * FROM payment_records WHERE contract_id = ? ORDER BY date DESC"
-                records = self.db.execute_query(sql, (contract_id,))
-            else:
-                sql = "SELECT * FROM payment_records ORDER BY date DESC"
-                records = self.db.execute_query(sql)
-            
-            result = []
-            for record_data in records:
-                payment = PaymentRecord(
-                    date=datetime.datetime.strptime(record_data['date'], "%Y-%m-%d").date(),
-                    amount=record_data['amount'],
-                    contract_id=record_data['contract_id'],
-                    payment_type=record_data['payment_type'],
-                    id=record_data['id'],
-                    created_by=record_data.get('created_by'),
-                    created_at=datetime.datetime.fromisoformat(record_data['created_at']) if record_data.get('created_at') else None
-                )
-                result.append(payment)
-            
-            return result
-            
+            return self._load_records("payment_records", PAYMENT_HYDRATOR, contract_id)
         except Exception as e:
             logger.error(f"获取收款记录失败: {str(e)}")
             return []
@@ -157,29 +166,7 @@ class PaymentService:
     def get_deposit_records(self, contract_id: Optional[str] = None) -> List[DepositRecord]:
         """获取押金记录"""
         try:
-            if contract_id:
-                sql = "SELECT * FROM deposit_records WHERE contract_id = ? ORDER BY date DESC"
-                records = self.db.execute_query(sql, (contract_id,))
-            else:
-                sql = "SELECT * FROM deposit_records ORDER BY date DESC"
-                records = self.db.execute_query(sql)
-            
-            result = []
-            for record_data in records:
-                deposit = DepositRecord(
-                    date=datetime.datetime.strptime(record_data['date'], "%Y-%m-%d").date(),
-                    amount=record_data['amount'],
-                    contract_id=record_data['contract_id'],
-                    record_type=record_data['record_type'],
-                    remark=record_data.get('remark', ''),
-                    id=record_data['id'],
-                    created_by=record_data.get('created_by'),
-                    created_at=datetime.datetime.fromisoformat(record_data['created_at']) if record_data.get('created_at') else None
-                )
-                result.append(deposit)
-            
-            return result
-            
+            return self._load_records("deposit_records", DEPOSIT_HYDRATOR, contract_id)
         except Exception as e:
             logger.error(f"获取押金记录失败: {str(e)}")
             return []
@@ -187,96 +174,142 @@ class PaymentService:
     def get_invoice_records(self, contract_id: Optional[str] = None) -> List[InvoiceRecord]:
         """获取开票记录"""
         try:
-            if contract_id:
-                sql = "SELECT * FROM invoice_records WHERE contract_id = ? ORDER BY date DESC"
-                records = self.db.execute_query(sql, (contract_id,))
-            else:
-                sql = "SELECT * FROM invoice_records ORDER BY date DESC"
-                records = self.db.execute_query(sql)
-            
-            result = []
-            for record_data in records:
-                invoice = InvoiceRecord(
-                    date=datetime.datetime.strptime(record_data['date'], "%Y-%m-%d").date(),
-                    amount=record_data['amount'],
-                    tax_amount=record_data['tax_amount'],
-                    invoice_number=record_data['invoice_number'],
-                    contract_id=record_data['contract_id'],
-                    id=record_data['id'],
-                    created_by=record_data.get('created_by'),
-                    created_at=datetime.datetime.fromisoformat(record_data['created_at']) if record_data.get('created_at') else None
-                )
-                result.append(invoice)
-            
-            return result
-            
+            return self._load_records("invoice_records", INVOICE_HYDRATOR, contract_id)
         except Exception as e:
             logger.error(f"获取开票记录失败: {str(e)}")
             return []
     
+    def iter_payment_records(self, contract_id: Optional[str] = None,
+                             start_date: Optional[datetime.date] = None,
+                             end_date: Optional[datetime.date] = None,
+                             batch_size: int = 500, include_archive: bool = False) -> Iterator[PaymentRecord]:
+        """
+        流式获取收款记录（可按合同和日期范围过滤），内存占用与记录总数无关
+        include_archive=True 时同时读取覆盖该日期范围的历史归档库
+        """
+        return self._iter_records("payment_records", PAYMENT_HYDRATOR, contract_id, start_date, end_date,
+                                  batch_size, include_archive)
+    
+    def iter_deposit_records(self, contract_id: Optional[str] = None,
+                             start_date: Optional[datetime.date] = None,
+                             end_date: Optional[datetime.date] = None,
+                             batch_size: int = 500, include_archive: bool = False) -> Iterator[DepositRecord]:
+        """流式获取押金记录（可按合同和日期范围过滤）"""
+        return self._iter_records("deposit_records", DEPOSIT_HYDRATOR, contract_id, start_date, end_date,
+                                  batch_size, include_archive)
+    
+    def iter_invoice_records(self, contract_id: Optional[str] = None,
+                             start_date: Optional[datetime.date] = None,
+                             end_date: Optional[datetime.date] = None,
+                             batch_size: int = 500, include_archive: bool = False) -> Iterator[InvoiceRecord]:
+        """流式获取开票记录（可按合同和日期范围过滤）"""
+        return self._iter_records("invoice_records", INVOICE_HYDRATOR, contract_id, start_date, end_date,
+                                  batch_size, include_archive)
+    
+    def _load_records(self, table: str, hydrator: EntityHydrator, contract_id: Optional[str]) -> List[Any]:
+        """一次取回全部记录，整批构建实体"""
+        sql, params = self._build_record_query(table, hydrator.columns, contract_id, None, None)
+        return hydrator.from_rows(self.db.execute_query(sql, params, row_mode=RowMode.TUPLE))
+    
+    def _iter_records(self, table: str, hydrator: EntityHydrator, contract_id: Optional[str],
+                      start_date: Optional[datetime.date], end_date: Optional[datetime.date],
+                      batch_size: int, include_archive: bool) -> Iterator[Any]:
+        """按需从主库或主库+历史归档库流式读取记录，每 batch_size 行整批构建实体"""
+        sql, params = self._build_record_query(table, hydrator.columns, contract_id, start_date, end_date)
+        if include_archive:
+            rows = self.db.archive.iter_query(sql, params, start_date, batch_size, row_mode=RowMode.TUPLE)
+        else:
+            rows = self.db.iter_query(sql, params, batch_size, row_mode=RowMode.TUPLE)
+        while True:
+            batch = hydrator.from_rows(islice(rows, batch_size))
+            if not batch:
+                break
+            yield from batch
+    
     def get_deposit_balance(self, contract_id: str) -> float:
-        """获取押金余额"""
+        """获取押金余额（读取触发器维护的押金余额表，单行主键查找）"""
         try:
-            deposits = self.get_deposit_records(contract_id)
-            balance = 0.0
-            
-            for deposit in deposits:
-                if deposit.record_type == RecordType.RECEIVE.value:
-                    balance += deposit.amount
-                else:
-                    balance -= deposit.amount
-            
-            return round(balance, 2)
+            rows = self.db.execute_query(
+                "SELECT balance_cents FROM deposit_balances WHERE contract_id = ?", (contract_id,),
+                row_mode=RowMode.TUPLE)
+            return Money(rows[0][0]).yuan if rows else 0.0
             
         except Exception as e:
             logger.error(f"计算押金余额失败: contract_id={contract_id}, 错误={str(e)}")
             return 0.0
     
-    def get_monthly_summary(self, year: int, month: int) -> Dict[str, Any]:
-        """获取月度收支汇总"""
+    def get_deposit_balances(self, include_zero: bool = False) -> Dict[str, float]:
+        """
+        批量获取所有合同的押金余额（合同ID -> 余额），用于押金总览和押金负债统计
+        :param include_zero: 是否包含已全部退还（余额为 0）的合同
+        """
+        try:
+            sql = "SELECT contract_id, balance_cents FROM deposit_balances"
+            if not include_zero:
+                sql += " WHERE balance_cents > 0"
+            return {contract_id: Money(cents).yuan
+                    for contract_id, cents in self.db.execute_query(sql, row_mode=RowMode.TUPLE)}
+        except Exception as e:
+            logger.error(f"获取押金余额失败: {str(e)}")
+            return {}
+    
+    def get_monthly_summary(self, year: int, month: int, include_archive: bool = False) -> Dict[str, Any]:
+        """获取月度收支汇总（include_archive=True 时包含历史归档库中的记录）"""
+        return self.get_period_summary(year, month, year, month, include_archive)
+    
+    def get_period_summary(self, start_year: int, start_month: int, end_year: int, end_month: int,
+                           include_archive: bool = False) -> Dict[str, Any]:
+        """
+        获取若干整月的收支汇总
+        读取触发器维护的月度汇总表，按月份索引查找，耗时与历史明细的数量无关；
+        金额按整数分求和，结果换算为元时不再逐项舍入
+        """
         try:
-            # 计算月份的起止日期
-            start_date = f"{year}-{month:02d}-01"
-            if month == 12:
-                end_date = f"{year}-12-31"
+            start = start_year * 100 + start_month
+            end = end_year * 100 + end_month
+            if include_archive:
+                query = lambda sql, params: self.db.archive.execute_query(
+                    sql, params, datetime.date(start_year, start_month, 1))
             else:
-                next_month = datetime.date(year, month + 1, 1)
-                end_date = (next_month - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+                query = self.db.execute_query
             
             # 收款汇总
             payment_sql = '''
-                SELECT payment_type, SUM(amount) as total_amount
-                FROM payment_records 
-                WHERE date BETWEEN ? AND ?
+                SELECT payment_type, SUM(total_amount_cents) as total_cents
+                FROM payment_monthly_summary 
+                WHERE yyyymm BETWEEN ? AND ?
                 GROUP BY payment_type
             '''
-            payments = self.db.execute_query(payment_sql, (start_date, end_date))
+            payments = query(payment_sql, (start, end))
             
             # 押金汇总
             deposit_sql = '''
-                SELECT record_type, SUM(amount) as total_amount
-                FROM deposit_records 
-                WHERE date BETWEEN ? AND ?
+                SELECT record_type, SUM(total_amount_cents) as total_cents
+                FROM deposit_monthly_summary 
+                WHERE yyyymm BETWEEN ? AND ?
                 GROUP BY record_type
             '''
-            deposits = self.db.execute_query(deposit_sql, (start_date, end_date))
+            deposits = query(deposit_sql, (start, end))
             
             # 开票汇总
             invoice_sql = '''
-                SELECT COUNT(*) as count, SUM(amount) as total_amount, SUM(tax_amount) as total_tax
-                FROM invoice_records 
-                WHERE date BETWEEN ? AND ?
+                SELECT COALESCE(SUM(record_count), 0) as count, COALESCE(SUM(total_amount_cents), 0) as total_cents,
+                       COALESCE(SUM(total_tax_cents), 0) as tax_cents
+                FROM invoice_monthly_summary 
+                WHERE yyyymm BETWEEN ? AND ?
             '''
-            invoices = self.db.execute_query(invoice_sql, (start_date, end_date))
+            invoices = query(invoice_sql, (start, end))
+            invoice = invoices[0] if invoices else {'count': 0, 'total_cents': 0, 'tax_cents': 0}
             
             return {
-                'payments': {p['payment_type']: p['total_amount'] for p in payments},
-                'deposits': {d['record_type']: d['total_amount'] for d in deposits},
-                'invoices': invoices[0] if invoices else {'count': 0, 'total_amount': 0, 'total_tax': 0}
+                'payments': {p['payment_type']: Money(p['total_cents']).yuan for p in payments},
+                'deposits': {d['record_type']: Money(d['total_cents']).yuan for d in deposits},
+                'invoices': {'count': invoice['count'], 'total_amount': Money(invoice['total_cents']).yuan,
+                             'total_tax': Money(invoice['tax_cents']).yuan}
             }
             
         except Exception as e:
-            logger.error(f"获取月度汇总失败: year={year}, month={month}, 错误={str(e)}")
+            logger.error(f"获取收支汇总失败: {start_year}-{start_month:02d} ~ {end_year}-{end_month:02d}, 错误={str(e)}")
             return {'payments': {}, 'deposits': {}, 'invoices': {'count': 0, 'total_amount': 0, 'total_tax': 0}}
     
     def delete_payment_record(self, record_id: int, user: str) -> bool:
@@ -286,7 +319,7 @@ class PaymentService:
                 raise Exception("删除收款记录失败")
             
             # 记录操作日志
-            self.db.log_operation(user, 'delete', 'payment', str(record_id), '删除收款记录')
+            self.db.log_operation(user, 'delete', 'payment', str(record_id), '删除收款记录', sync=True)
             logger.info(f"用户 {user} 删除了收款记录: ID={record_id}")
             
             return True
@@ -302,7 +335,7 @@ class PaymentService:
                 raise Exception("删除押金记录失败")
             
             # 记录操作日志
-            self.db.log_operation(user, 'delete', 'deposit', str(record_id), '删除押金记录')
+            self.db.log_operation(user, 'delete', 'deposit', str(record_id), '删除押金记录', sync=True)
             logger.info(f"用户 {user} 删除了押金记录: ID={record_id}")
             
             return True
@@ -318,11 +351,42 @@ class PaymentService:
                 raise Exception("删除开票记录失败")
             
             # 记录操作日志
-            self.db.log_operation(user, 'delete', 'invoice', str(record_id), '删除开票记录')
+            self.db.log_operation(user, 'delete', 'invoice', str(record_id), '删除开票记录', sync=True)
             logger.info(f"用户 {user} 删除了开票记录: ID={record_id}")
             
             return True
             
         except Exception as e:
             logger.error(f"删除开票记录失败: record_id={record_id}, 错误={str(e)}")
-            return False
\ No newline at end of file
+            return False
+    
+    def _build_record_query(self, table: str, columns: Tuple[str, ...], contract_id: Optional[str],
+                            start_date: Optional[datetime.date],
+                            end_date: Optional[datetime.date]) -> Tuple[str, tuple]:
+        """
+        构建收款/押金/开票记录查询（按日期倒序）
+        区间端点落在月初/月末时按月份列 yyyymm 过滤，走 (yyyymm, contract_id) 索引区间扫描，
+        其余端点按日期序数列 date_ord 做整数比较
+        """
+        conditions = []
+        params = []
+        if contract_id:
+            conditions.append("contract_id = ?")
+            params.append(contract_id)
+        if start_date:
+            if start_date.day == 1:
+                conditions.append("yyyymm >= ?")
+                params.append(start_date.year * 100 + start_date.month)
+            else:
+                conditions.append("date_ord >= ?")
+                params.append(start_date.toordinal())
+        if end_date:
+            if (end_date + datetime.timedelta(days=1)).day == 1:
+                conditions.append("yyyymm <= ?")
+                params.append(end_date.year * 100 + end_date.month)
+            else:
+                conditions.append("date_ord <= ?")
+                params.append(end_date.toordinal())
+        
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY date_ord DESC", tuple(params)
@@ -0,0 +1,50 @@
+"""
+合同组合快照服务 - 整批读取合同及其租金期/免租期，构建列式快照供按月份整批核算
+"""
+from typing import Optional
+
+from database.manager import DatabaseManager
+from database.rows import RowMode
+from models.portfolio import NUMPY_AVAILABLE, PortfolioSnapshot
+from utils.logging import get_logger
+
+logger = get_logger("PortfolioService")
+
+
+class PortfolioService:
+    """合同组合快照服务"""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    def load_snapshot(self, with_periods: bool = True) -> Optional[PortfolioSnapshot]:
+        """
+        构建全部合同的列式快照：合同、租金期、免租期各一条按合同编号有序的整表查询（按列读取），
+        日期读取序数列；未安装 NumPy 或读取失败时返回 None，调用方回退到逐合同计算
+        :param with_periods: 是否读取租金期/免租期（只统计合同属性时可省去）
+        """
+        if not NUMPY_AVAILABLE:
+            logger.info("未安装 NumPy，不构建合同组合快照")
+            return None
+        try:
+            contracts = self.db.execute_query(
+                "SELECT contract_id, customer_name, room_number, tax_rate, need_adjust_income, is_effective, "
+                "total_rent, initial_total_rent FROM contracts ORDER BY contract_id",
+                row_mode=RowMode.COLUMNAR)
+            rent_periods = free_periods = None
+            if with_periods:
+                rent_periods = self.db.execute_query(
+                    "SELECT contract_id, start_date_ord, end_date_ord, monthly_rent FROM rent_periods "
+                    "ORDER BY contract_id, start_date_ord",
+                    row_mode=RowMode.COLUMNAR)
+                free_periods = self.db.execute_query(
+                    "SELECT contract_id, start_date_ord, end_date_ord FROM free_periods "
+                    "ORDER BY contract_id, start_date_ord",
+                    row_mode=RowMode.COLUMNAR)
+            snapshot = PortfolioSnapshot.from_columns(contracts, rent_periods, free_periods)
+            logger.info(f"合同组合快照构建完成：{len(snapshot)} 份合同，{len(snapshot.rent_start)} 个租金期，"
+                        f"{len(snapshot.free_start)} 个免租期")
+            return snapshot
+        except Exception as e:
+            logger.error(f"构建合同组合快照失败: {str(e)}")
+            return None
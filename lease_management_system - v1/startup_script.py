@@ -11,8 +11,8 @@ from pathlib import Path
 
 def check_python_version():
     """检查Python版本"""
-    if sys.version_info < (3, 9):
-        print("错误：需要Python 3.9或更高版本")
+    if sys.version_info < (3, 10):
+        print("错误：需要Python 3.10或更高版本")
         print(f"当前Python版本：{sys.version}")
         return False
     return True
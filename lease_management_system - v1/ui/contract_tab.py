@@ -19,6 +19,8 @@ logger = get_logger("ContractTab")
 class ContractTab(ttk.Frame):
     """合同管理标签页"""
     
+    SEARCH_LIMIT = 500  # 搜索结果最多显示条数
+    
     def __init__(self, parent, contract_service: ContractService, current_user: User):
         super().__init__(parent)
         
@@ -302,14 +304,15 @@ class ContractTab(ttk.Frame):
         for item in self.contract_tree.get_children():
             self.contract_tree.delete(item)
         
+        # 有搜索词时通过全文索引按相关度取匹配的合同
+        contracts = self.contracts
+        if search_term:
+            contract_map = {c.contract_id: c for c in self.contracts}
+            contract_ids = self.contract_service.search(search_term, self.SEARCH_LIMIT)
+            contracts = [contract_map[cid] for cid in contract_ids if cid in contract_map]
+        
         # 添加合同数据
-        for contract in self.contracts:
-            # 搜索过滤
-            if search_term and search_term not in contract.contract_id.lower() and \
-               search_term not in contract.customer_name.lower() and \
-               search_term not in contract.room_number.lower():
-                continue
-            
+        for contract in contracts:
             # 确定状态
             status = "已生效" if contract.is_effective else "未生效"
             
@@ -325,15 +328,19 @@ class ContractTab(ttk.Frame):
         """合同选择事件"""
         selection = self.contract_tree.selection()
         if not selection:
+            if self.selected_contract:
+                self.selected_contract.release_relations()
             self.selected_contract = None
             self._clear_contract_details()
             return
-        
+
         # 获取选中的合同ID
         item = selection[0]
         contract_id = self.contract_tree.item(item, "values")[0]
         
-        # 查找合同对象
+        # 查找合同对象；之前选中合同的租金期/免租期已不再显示，释放后按需重新加载
+        if self.selected_contract and self.selected_contract.contract_id != contract_id:
+            self.selected_contract.release_relations()
         self.selected_contract = next((c for c in self.contracts if c.contract_id == contract_id), None)
         
         if self.selected_contract:
@@ -137,6 +137,18 @@ class DepositTab(ttk.Frame):
         balance_label = ttk.Label(result_frame, textvariable=self.balance_var, foreground="red", font=("SimHei", 10, "bold"))
         balance_label.grid(row=2, column=1, sticky=tk.W, padx=(5, 0), pady=2)
         
+        # 押金总览（所有合同的押金余额合计）
+        overview_frame = ttk.LabelFrame(right_frame, text="押金总览", padding="10")
+        overview_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(overview_frame, text="在押合同数:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        self.holding_count_var = tk.StringVar(value="0")
+        ttk.Label(overview_frame, textvariable=self.holding_count_var, foreground="blue").grid(row=0, column=1, sticky=tk.W, padx=(5, 0), pady=2)
+        
+        ttk.Label(overview_frame, text="押金总余额:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        self.total_balance_var = tk.StringVar(value="0.00 元")
+        ttk.Label(overview_frame, textvariable=self.total_balance_var, foreground="red").grid(row=1, column=1, sticky=tk.W, padx=(5, 0), pady=2)
+        
         # 详细记录框架
         detail_frame = ttk.LabelFrame(right_frame, text="详细记录", padding="10")
         detail_frame.pack(fill=tk.BOTH, expand=True)
@@ -222,11 +234,6 @@ class DepositTab(ttk.Frame):
             try:
                 contract_id, record_type, amount, remark, date = dialog.result
                 
-                # 检查押金余额（如果是退还）
-                current_balance = 0.0
-                if record_type == RecordType.RETURN.value:
-                    current_balance = self.payment_service.get_deposit_balance(contract_id)
-                
                 # 创建押金记录
                 deposit_record = DepositRecord(
                     date=date,
@@ -236,10 +243,13 @@ class DepositTab(ttk.Frame):
                     remark=remark
                 )
                 
-                # 保存记录
-                if self.payment_service.add_deposit_record(deposit_record, self.current_user.username, current_balance):
+                # 保存记录（退还时由服务层按押金余额表校验余额）
+                if self.payment_service.add_deposit_record(deposit_record, self.current_user.username):
                     messagebox.showinfo("成功", "押金记录添加成功")
                     self.refresh()
+                elif record_type == RecordType.RETURN.value:
+                    balance = self.payment_service.get_deposit_balance(contract_id)
+                    messagebox.showerror("错误", f"添加押金记录失败\n当前押金余额: {balance:.2f}元，尝试退还: {amount:.2f}元")
                 else:
                     messagebox.showerror("错误", "添加押金记录失败")
                     
@@ -258,7 +268,7 @@ class DepositTab(ttk.Frame):
                     messagebox.showinfo("成功", "押金记录删除成功")
                     self.refresh()
                 else:
-                    messagebox.showerror("错误", "删除押金记录失败")
+                    messagebox.showerror("错误", "删除押金记录失败\n（删除后押金余额不能为负，请先删除对应的退还记录）")
             except Exception as e:
                 messagebox.showerror("错误", f"删除押金记录失败: {str(e)}")
     
@@ -324,6 +334,10 @@ class DepositTab(ttk.Frame):
             self.deposit_records = self.payment_service.get_deposit_records()
             self._populate_record_list()
             self.selected_record = None
+            
+            balances = self.payment_service.get_deposit_balances()
+            self.holding_count_var.set(str(len(balances)))
+            self.total_balance_var.set(f"{sum(balances.values()):.2f} 元")
         except Exception as e:
             logger.error(f"刷新押金数据失败: {str(e)}")
             messagebox.showerror("错误", f"刷新数据失败: {str(e)}")
@@ -0,0 +1,91 @@
+"""
+备份进度对话框UI模块
+"""
+import tkinter as tk
+from tkinter import ttk, messagebox
+from typing import Callable, Optional
+
+from database.backup import BackupEngine, BackupResult
+from utils.logging import get_logger
+
+logger = get_logger("BackupProgressDialog")
+
+
+class BackupProgressDialog(tk.Toplevel):
+    """
+    备份进度对话框
+    备份在后台线程执行，对话框通过 after 轮询进度，界面不会被阻塞
+    """
+
+    POLL_INTERVAL_MS = 100
+
+    def __init__(self, parent, engine: BackupEngine,
+                 on_done: Optional[Callable[[BackupResult], None]] = None):
+        super().__init__(parent)
+
+        self.parent = parent
+        self.engine = engine
+        self.on_done = on_done
+        self.result: Optional[BackupResult] = None
+
+        # 后台线程只写入以下状态，界面更新统一在主线程完成
+        self._copied = 0
+        self._total = 0
+        self._finished: Optional[BackupResult] = None
+
+        # 配置对话框
+        self.title("数据备份")
+        self.geometry("380x130")
+        self.resizable(False, False)
+        self.transient(parent)
+        self.grab_set()
+        self.protocol("WM_DELETE_WINDOW", lambda: None)  # 备份完成前不允许关闭
+
+        self._create_widgets()
+
+        self.engine.start_backup(progress=self._on_progress, on_done=self._on_finished)
+        self.after(self.POLL_INTERVAL_MS, self._poll)
+
+    def _create_widgets(self):
+        """创建界面组件"""
+        main_frame = ttk.Frame(self, padding="20")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.status_var = tk.StringVar(value="正在备份数据库...")
+        ttk.Label(main_frame, textvariable=self.status_var).pack(anchor=tk.W, pady=(0, 10))
+
+        self.progress = ttk.Progressbar(main_frame, mode="determinate", maximum=100, length=340)
+        self.progress.pack(fill=tk.X)
+
+    def _on_progress(self, copied: int, total: int):
+        """后台线程回调：记录进度"""
+        self._copied, self._total = copied, total
+
+    def _on_finished(self, result: BackupResult):
+        """后台线程回调：记录结果"""
+        self._finished = result
+
+    def _poll(self):
+        """主线程轮询备份进度"""
+        if self._total:
+            self.progress["value"] = self._copied * 100 / self._total
+            self.status_var.set(f"正在备份数据库... {self._copied}/{self._total} 页")
+
+        if self._finished is None:
+            self.after(self.POLL_INTERVAL_MS, self._poll)
+            return
+
+        self.result = self._finished
+        self.grab_release()
+        self.destroy()
+
+        if self.result.ok:
+            message = f"数据已备份到:\n{self.result.path}\n\n已通过完整性校验"
+            if self.result.stored_bytes is not None:
+                message += f"\n本次新增存储 {self.result.stored_bytes / 1024:.1f}KB（未变化的数据块已去重）"
+            messagebox.showinfo("备份成功", message, parent=self.parent)
+        else:
+            messagebox.showerror("备份失败", f"数据备份失败:\n{self.result.error}", parent=self.parent)
+
+        if self.on_done:
+            self.on_done(self.result)
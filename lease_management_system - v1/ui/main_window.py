@@ -7,7 +7,6 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import datetime
 import os
-import shutil
 import pandas as pd
 from typing import Optional
 
@@ -20,6 +19,7 @@ from ui.deposit_tab import DepositTab
 from ui.report_tab import ReportTab
 from ui.stamp_tab import StampTab
 from ui.system_tab import SystemTab
+from ui.dialogs.backup_progress_dialog import BackupProgressDialog
 from services.contract_service import ContractService
 from services.payment_service import PaymentService
 from database.manager import DatabaseManager
@@ -176,30 +176,13 @@ class MainWindow(tk.Tk):
     # ==================== 文件菜单功能 ====================
     
     def _backup_data(self):
-        """备份数据"""
+        """备份数据（后台在线备份，完成后校验完整性并清理过期备份）"""
         try:
-            # 确保备份目录存在
-            backup_dir = config.database.backup_dir
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            # 生成备份文件名
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"lease_backup_{timestamp}.db"
-            backup_path = os.path.join(backup_dir, backup_filename)
+            if self.db_manager.backup_engine.running:
+                messagebox.showinfo("提示", "已有备份正在进行，请稍候")
+                return
+            BackupProgressDialog(self, self.db_manager.backup_engine)
             
-            # 执行备份
-            source_db = config.database.db_name
-            if os.path.exists(source_db):
-                shutil.copy2(source_db, backup_path)
-                
-                # 清理过期备份
-                self._cleanup_old_backups()
-                
-                messagebox.showinfo("备份成功", f"数据已备份到:\n{backup_path}")
-                logger.info(f"数据备份成功: {backup_path}")
-            else:
-                messagebox.showerror("备份失败", "数据库文件不存在")
-                
         except Exception as e:
             logger.error(f"数据备份失败: {str(e)}")
             messagebox.showerror("备份失败", f"数据备份失败:\n{str(e)}")
@@ -207,30 +190,7 @@ class MainWindow(tk.Tk):
     def _cleanup_old_backups(self):
         """清理过期备份"""
         try:
-            backup_dir = config.database.backup_dir
-            max_backups = config.database.max_backups
-            
-            if not os.path.exists(backup_dir):
-                return
-            
-            # 获取所有备份文件
-            backup_files = []
-            for filename in os.listdir(backup_dir):
-                if filename.startswith("lease_backup_") and filename.endswith(".db"):
-                    file_path = os.path.join(backup_dir, filename)
-                    backup_files.append((file_path, os.path.getmtime(file_path)))
-            
-            # 按修改时间排序，删除最旧的文件
-            backup_files.sort(key=lambda x: x[1], reverse=True)
-            
-            if len(backup_files) > max_backups:
-                for file_path, _ in backup_files[max_backups:]:
-                    try:
-                        os.remove(file_path)
-                        logger.info(f"删除过期备份: {file_path}")
-                    except Exception as e:
-                        logger.warning(f"删除备份文件失败: {e}")
-                        
+            self.db_manager.backup_engine.cleanup_old_backups()
         except Exception as e:
             logger.warning(f"清理过期备份失败: {e}")
     
@@ -246,7 +206,7 @@ class MainWindow(tk.Tk):
             file_path = filedialog.askopenfilename(
                 title="选择备份文件",
                 initialdir=backup_dir,
-                filetypes=[("数据库文件", "*.db"), ("所有文件", "*.*")]
+                filetypes=[("备份文件", "*.db *.json"), ("所有文件", "*.*")]
             )
             
             if not file_path:
@@ -258,24 +218,23 @@ class MainWindow(tk.Tk):
                                       "警告：当前数据将被覆盖，建议先备份当前数据！"):
                 return
             
-            # 备份当前数据库
-            current_db = config.database.db_name
-            if os.path.exists(current_db):
-                backup_current = f"lease_backup_before_restore_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-                backup_current_path = os.path.join(backup_dir, backup_current)
-                shutil.copy2(current_db, backup_current_path)
-                logger.info(f"当前数据库已备份到: {backup_current_path}")
+            # 校验备份 -> 安全备份当前数据 -> 排空连接池 -> 通过备份 API 写入 -> 迁移
+            self.config(cursor="watch")
+            self.update_idletasks()
+            try:
+                safety_path = self.db_manager.restore_backup(file_path, self.current_user.username)
+            finally:
+                self.config(cursor="")
             
-            # 恢复备份文件
-            shutil.copy2(file_path, current_db)
+            # 服务对象共用同一个 DatabaseManager，恢复后只需重新加载数据
+            self.reload_data()
             
             messagebox.showinfo("恢复成功", 
-                               f"数据已从备份文件恢复!\n\n"
+                               f"数据已从备份文件恢复，无需重启程序。\n\n"
                                f"备份文件: {os.path.basename(file_path)}\n"
-                               f"当前数据已备份\n\n"
-                               f"请重启程序以加载恢复的数据。")
+                               f"恢复前数据已备份到: {os.path.basename(safety_path)}")
             
-            logger.info(f"数据恢复成功: {file_path} -> {current_db}")
+            logger.info(f"数据恢复成功: {file_path}")
             
         except Exception as e:
             logger.error(f"数据恢复失败: {str(e)}")
@@ -427,12 +386,11 @@ class MainWindow(tk.Tk):
             if not file_path:
                 return
 
-            # 获取所有合同数据
-            contracts = self.contract_service.get_all_contracts()
-            
-            # 整理导出数据
+            # 流式读取合同，单次遍历同时整理合同列表和租金期明细，不保留合同对象
             contract_data = []
-            for contract in contracts:
+            rent_period_data = []
+            deposit_balances = self.payment_service.get_deposit_balances()
+            for contract in self.contract_service.iter_contracts():
                 # 计算统计信息
                 total_payments = sum(p.amount for p in contract.payment_records if p.payment_type == "租金")
                 total_deposits = sum(d.amount for d in contract.deposit_records if d.record_type == "收取")
@@ -459,10 +417,21 @@ class MainWindow(tk.Tk):
                     "创建人": contract.created_by,
                     "累计收款(元)": total_payments,
                     "累计押金(元)": total_deposits,
+                    "押金余额(元)": deposit_balances.get(contract.contract_id, 0.0),
                     "累计开票(元)": total_invoices,
                     "租金期数量": len(contract.rent_periods),
                     "免租期数量": len(contract.free_rent_periods)
                 })
+                
+                # 租金期详情
+                for rp in contract.rent_periods:
+                    rent_period_data.append({
+                        "合同ID": contract.contract_id,
+                        "客户姓名": contract.customer_name,
+                        "开始日期": rp.start_date.strftime('%Y-%m-%d'),
+                        "结束日期": rp.end_date.strftime('%Y-%m-%d'),
+                        "月租金(元)": rp.monthly_rent
+                    })
 
             # 导出到Excel
             with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
@@ -470,24 +439,12 @@ class MainWindow(tk.Tk):
                 contract_df = pd.DataFrame(contract_data)
                 contract_df.to_excel(writer, sheet_name='合同列表', index=False)
                 
-                # 租金期详情
-                rent_period_data = []
-                for contract in contracts:
-                    for rp in contract.rent_periods:
-                        rent_period_data.append({
-                            "合同ID": contract.contract_id,
-                            "客户姓名": contract.customer_name,
-                            "开始日期": rp.start_date.strftime('%Y-%m-%d'),
-                            "结束日期": rp.end_date.strftime('%Y-%m-%d'),
-                            "月租金(元)": rp.monthly_rent
-                        })
-                
                 if rent_period_data:
                     rent_df = pd.DataFrame(rent_period_data)
                     rent_df.to_excel(writer, sheet_name='租金期明细', index=False)
 
-            messagebox.showinfo("导出成功", f"合同列表已导出到:\n{file_path}\n\n共导出 {len(contracts)} 个合同")
-            logger.info(f"成功导出 {len(contracts)} 个合同到: {file_path}")
+            messagebox.showinfo("导出成功", f"合同列表已导出到:\n{file_path}\n\n共导出 {len(contract_data)} 个合同")
+            logger.info(f"成功导出 {len(contract_data)} 个合同到: {file_path}")
 
         except Exception as e:
             logger.error(f"导出合同列表失败: {str(e)}")
@@ -578,22 +535,32 @@ class MainWindow(tk.Tk):
             
             contracts = self.contract_service.get_all_contracts()
             
+            # 流式汇总当月收款/开票：每个合同只保留 [金额, 笔数]，不在内存中保存明细
+            monthly_payments = {}
+            for payment in self.payment_service.iter_payment_records(start_date=month_start, end_date=month_end):
+                totals = monthly_payments.setdefault(payment.contract_id, [0.0, 0])
+                totals[0] += payment.amount
+                totals[1] += 1
+            monthly_invoices = {}
+            for invoice in self.payment_service.iter_invoice_records(start_date=month_start, end_date=month_end):
+                totals = monthly_invoices.setdefault(invoice.contract_id, [0.0, 0])
+                totals[0] += invoice.amount
+                totals[1] += 1
+            
             with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
                 # 1. 月度收款汇总
                 payment_data = []
                 total_payment = 0
                 for contract in contracts:
-                    monthly_payments = [p for p in contract.payment_records 
-                                      if month_start <= p.date <= month_end]
-                    if monthly_payments:
-                        contract_payment = sum(p.amount for p in monthly_payments)
+                    if contract.contract_id in monthly_payments:
+                        contract_payment, payment_count = monthly_payments[contract.contract_id]
                         total_payment += contract_payment
                         payment_data.append({
                             "合同ID": contract.contract_id,
                             "客户姓名": contract.customer_name,
                             "房间号": contract.room_number,
                             "本月收款(元)": contract_payment,
-                            "收款笔数": len(monthly_payments)
+                            "收款笔数": payment_count
                         })
                 
                 # 添加合计行
@@ -613,17 +580,15 @@ class MainWindow(tk.Tk):
                 invoice_data = []
                 total_invoice = 0
                 for contract in contracts:
-                    monthly_invoices = [i for i in contract.invoice_records 
-                                      if month_start <= i.date <= month_end]
-                    if monthly_invoices:
-                        contract_invoice = sum(i.amount for i in monthly_invoices)
+                    if contract.contract_id in monthly_invoices:
+                        contract_invoice, invoice_count = monthly_invoices[contract.contract_id]
                         total_invoice += contract_invoice
                         invoice_data.append({
                             "合同ID": contract.contract_id,
                             "客户姓名": contract.customer_name,
                             "房间号": contract.room_number,
                             "本月开票(元)": contract_invoice,
-                            "开票笔数": len(monthly_invoices)
+                            "开票笔数": invoice_count
                         })
                 
                 if invoice_data:
@@ -817,6 +782,7 @@ class MainWindow(tk.Tk):
         """关闭窗口处理"""
         if messagebox.askyesno("确认", "确定要退出系统吗？"):
             logger.info(f"用户 {self.current_user.username} 退出系统")
+            self.db_manager.close()
             self.destroy()
     
     def refresh_all_tabs(self):
@@ -841,6 +807,16 @@ class MainWindow(tk.Tk):
             logger.error(f"刷新标签页失败: {str(e)}")
             messagebox.showerror("错误", f"刷新数据失败:\n{str(e)}")
     
+    def reload_data(self):
+        """重新加载数据（如热恢复之后）：原地刷新核算模块使用的合同字典并刷新所有标签页"""
+        contracts = getattr(self, 'contracts', None)
+        if isinstance(contracts, dict):
+            # 原地更新，核算模块各标签页持有的是同一个字典对象
+            contracts.clear()
+            contracts.update((contract.contract_id, contract)
+                             for contract in self.contract_service.get_all_contracts())
+        self.refresh_all_tabs()
+    
     # ==================== 公共方法 ====================
     
     def get_current_user(self):
@@ -4,7 +4,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable
 
 from models.entities import User
 from services.contract_service import ContractService
@@ -72,9 +72,14 @@ class ReportTab(ttk.Frame):
         )
         month_combo.grid(row=1, column=1, sticky=tk.W, padx=(10, 0), pady=5)
         
+        # 历史归档数据默认不参与查询，需要历史区间时显式勾选
+        self.include_archive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(query_frame, text="包含已归档合同", variable=self.include_archive_var).grid(
+            row=2, column=0, columnspan=2, sticky=tk.W, pady=5)
+        
         # 查询按钮
         query_button = ttk.Button(query_frame, text="生成报告", command=self._generate_report)
-        query_button.grid(row=2, column=0, columnspan=2, pady=(15, 0), sticky=tk.EW)
+        query_button.grid(row=3, column=0, columnspan=2, pady=(15, 0), sticky=tk.EW)
         
         # 导出按钮框架
         export_frame = ttk.LabelFrame(left_frame, text="报告导出", padding="15")
@@ -107,6 +112,10 @@ class ReportTab(ttk.Frame):
         ttk.Label(stats_frame, text="开票总额:").grid(row=4, column=0, sticky=tk.W, pady=2)
         self.invoice_total_var = tk.StringVar(value="0.00元")
         ttk.Label(stats_frame, textvariable=self.invoice_total_var, foreground="purple").grid(row=4, column=1, sticky=tk.E, pady=2)
+        
+        ttk.Label(stats_frame, text="押金负债(当前):").grid(row=5, column=0, sticky=tk.W, pady=2)
+        self.deposit_liability_var = tk.StringVar(value="0.00元")
+        ttk.Label(stats_frame, textvariable=self.deposit_liability_var, foreground="orange").grid(row=5, column=1, sticky=tk.E, pady=2)
     
     def _create_right_panel(self):
         """创建右侧面板（报告内容）"""
@@ -269,22 +278,18 @@ class ReportTab(ttk.Frame):
             # 更新报告标题
             self.report_title_var.set(f"{year}年{month:02d}月度报告")
             
+            include_archive = self.include_archive_var.get()
+            
             # 获取月度汇总数据
-            monthly_summary = self.payment_service.get_monthly_summary(year, month)
+            monthly_summary = self.payment_service.get_monthly_summary(year, month, include_archive)
             
             # 获取合同数据
             contracts = self.contract_service.get_all_contracts()
+            contract_map = {c.contract_id: c.customer_name for c in contracts}
+            if include_archive:
+                contract_map.update(self.contract_service.get_customer_names(include_archive=True))
             
-            # 获取收款记录
-            payment_records = self.payment_service.get_payment_records()
-            
-            # 获取押金记录
-            deposit_records = self.payment_service.get_deposit_records()
-            
-            # 获取开票记录
-            invoice_records = self.payment_service.get_invoice_records()
-            
-            # 过滤指定月份的数据
+            # 指定月份的日期范围
             start_date = datetime.date(year, month, 1)
             if month == 12:
                 end_date = datetime.date(year, 12, 31)
@@ -292,31 +297,21 @@ class ReportTab(ttk.Frame):
                 next_month = datetime.date(year, month + 1, 1)
                 end_date = next_month - datetime.timedelta(days=1)
             
-            # 过滤收款记录
-            filtered_payments = [
-                p for p in payment_records
-                if start_date <= p.date <= end_date
-            ]
-            
-            # 过滤押金记录
-            filtered_deposits = [
-                d for d in deposit_records
-                if start_date <= d.date <= end_date
-            ]
-            
-            # 过滤开票记录
-            filtered_invoices = [
-                i for i in invoice_records
-                if start_date <= i.date <= end_date
-            ]
+            # 仅流式读取当月的收款、押金、开票记录，边读边填充明细，不再加载全部历史
+            filtered_payments = self.payment_service.iter_payment_records(
+                start_date=start_date, end_date=end_date, include_archive=include_archive)
+            filtered_deposits = self.payment_service.iter_deposit_records(
+                start_date=start_date, end_date=end_date, include_archive=include_archive)
+            filtered_invoices = self.payment_service.iter_invoice_records(
+                start_date=start_date, end_date=end_date, include_archive=include_archive)
             
             # 更新统计信息
             self._update_statistics(contracts, monthly_summary)
             
             # 更新明细列表
-            self._update_payment_details(filtered_payments, contracts)
-            self._update_deposit_details(filtered_deposits, contracts)
-            self._update_invoice_details(filtered_invoices, contracts)
+            self._update_payment_details(filtered_payments, contract_map)
+            self._update_deposit_details(filtered_deposits, contract_map)
+            self._update_invoice_details(filtered_invoices, contract_map)
             self._update_contract_stats(contracts)
             
             logger.info(f"已生成{year}年{month:02d}月的月度报告")
@@ -342,22 +337,23 @@ class ReportTab(ttk.Frame):
         # 开票统计
         invoice_total = monthly_summary.get('invoices', {}).get('total_amount', 0) or 0
         
+        # 押金负债：所有合同当前尚未退还的押金合计
+        deposit_liability = sum(self.payment_service.get_deposit_balances().values())
+        
         # 更新显示
         self.total_contracts_var.set(str(total_contracts))
         self.effective_contracts_var.set(str(effective_contracts))
         self.total_rent_var.set(f"{total_rent_income:.2f}元")
         self.deposit_balance_var.set(f"{deposit_balance:.2f}元")
         self.invoice_total_var.set(f"{invoice_total:.2f}元")
+        self.deposit_liability_var.set(f"{deposit_liability:.2f}元")
     
-    def _update_payment_details(self, payments: List, contracts: List):
+    def _update_payment_details(self, payments: Iterable, contract_map: Dict[str, str]):
         """更新收款明细"""
         # 清空现有数据
         for item in self.payment_detail_tree.get_children():
             self.payment_detail_tree.delete(item)
         
-        # 创建合同ID到客户姓名的映射
-        contract_map = {c.contract_id: c.customer_name for c in contracts}
-        
         # 添加收款明细数据
         for payment in payments:
             customer_name = contract_map.get(payment.contract_id, "未知客户")
@@ -369,15 +365,12 @@ class ReportTab(ttk.Frame):
                 payment.payment_type
             ))
     
-    def _update_deposit_details(self, deposits: List, contracts: List):
+    def _update_deposit_details(self, deposits: Iterable, contract_map: Dict[str, str]):
         """更新押金明细"""
         # 清空现有数据
         for item in self.deposit_detail_tree.get_children():
             self.deposit_detail_tree.delete(item)
         
-        # 创建合同ID到客户姓名的映射
-        contract_map = {c.contract_id: c.customer_name for c in contracts}
-        
         # 添加押金明细数据
         for deposit in deposits:
             customer_name = contract_map.get(deposit.contract_id, "未知客户")
@@ -390,15 +383,12 @@ class ReportTab(ttk.Frame):
                 deposit.remark or ""
             ))
     
-    def _update_invoice_details(self, invoices: List, contracts: List):
+    def _update_invoice_details(self, invoices: Iterable, contract_map: Dict[str, str]):
         """更新开票明细"""
         # 清空现有数据
         for item in self.invoice_detail_tree.get_children():
             self.invoice_detail_tree.delete(item)
         
-        # 创建合同ID到客户姓名的映射
-        contract_map = {c.contract_id: c.customer_name for c in contracts}
-        
         # 添加开票明细数据
         for invoice in invoices:
             customer_name = contract_map.get(invoice.contract_id, "未知客户")
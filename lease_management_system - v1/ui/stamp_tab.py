@@ -6,6 +6,7 @@ from tkinter import ttk, messagebox
 from typing import List
 
 from models.entities import User, LeaseContract
+from models.portfolio import NUMPY_AVAILABLE, PortfolioSnapshot, stamp_statistics
 from services.contract_service import ContractService
 from config.settings import config
 from utils.logging import get_logger
@@ -16,6 +17,8 @@ logger = get_logger("StampTab")
 class StampTab(ttk.Frame):
     """印花税查询标签页"""
     
+    SEARCH_LIMIT = 500  # 搜索结果最多显示条数
+    
     def __init__(self, parent, contract_service: ContractService, current_user: User):
         super().__init__(parent)
         
@@ -181,14 +184,23 @@ class StampTab(ttk.Frame):
         for item in self.stamp_tree.get_children():
             self.stamp_tree.delete(item)
         
+        # 按合同编号、客户名称分别在全文索引中检索，两个条件同时给出时取交集
+        contracts = self.contracts
+        if search_contract_id or search_customer_name:
+            matched = None
+            for term, column in ((search_contract_id, "contract_id"), (search_customer_name, "customer_name")):
+                if term:
+                    ids = self.contract_service.search(term, self.SEARCH_LIMIT, columns=[column])
+                    if matched is None:
+                        matched = ids
+                    else:
+                        id_set = set(ids)
+                        matched = [cid for cid in matched if cid in id_set]
+            contract_map = {c.contract_id: c for c in self.contracts}
+            contracts = [contract_map[cid] for cid in matched if cid in contract_map]
+        
         # 添加合同数据
-        for contract in self.contracts:
-            # 搜索过滤
-            if search_contract_id and search_contract_id not in contract.contract_id.lower():
-                continue
-            if search_customer_name and search_customer_name not in contract.customer_name.lower():
-                continue
-            
+        for contract in contracts:
             # 计算印花税
             stamp_duty = contract.initial_total_rent * config.business.stamp_duty_rate
             
@@ -213,10 +225,11 @@ class StampTab(ttk.Frame):
         try:
             # 获取当前显示的合同（经过搜索过滤的）
             displayed_contracts = []
+            contract_map = {c.contract_id: c for c in self.contracts}
             for item in self.stamp_tree.get_children():
                 values = self.stamp_tree.item(item, "values")
                 contract_id = values[0]
-                contract = next((c for c in self.contracts if c.contract_id == contract_id), None)
+                contract = contract_map.get(contract_id)
                 if contract:
                     displayed_contracts.append(contract)
             
@@ -230,14 +243,24 @@ class StampTab(ttk.Frame):
                 self.min_stamp_duty_var.set("0.00元")
                 return
             
-            # 计算统计数据
-            total_contracts = len(displayed_contracts)
-            total_rent = sum(c.total_rent for c in displayed_contracts)
-            stamp_duties = [c.initial_total_rent * config.business.stamp_duty_rate for c in displayed_contracts]
-            total_stamp_duty = sum(stamp_duties)
-            avg_stamp_duty = total_stamp_duty / total_contracts if total_contracts > 0 else 0
-            max_stamp_duty = max(stamp_duties) if stamp_duties else 0
-            min_stamp_duty = min(stamp_duties) if stamp_duties else 0
+            # 计算统计数据（安装了 NumPy 时按列整批计算）
+            if NUMPY_AVAILABLE:
+                stats = stamp_statistics(PortfolioSnapshot.from_contracts(displayed_contracts),
+                                         config.business.stamp_duty_rate)
+                total_contracts = stats["total_contracts"]
+                total_rent = stats["total_rent"]
+                total_stamp_duty = stats["total_stamp_duty"]
+                avg_stamp_duty = stats["avg_stamp_duty"]
+                max_stamp_duty = stats["max_stamp_duty"]
+                min_stamp_duty = stats["min_stamp_duty"]
+            else:
+                total_contracts = len(displayed_contracts)
+                total_rent = sum(c.total_rent for c in displayed_contracts)
+                stamp_duties = [c.initial_total_rent * config.business.stamp_duty_rate for c in displayed_contracts]
+                total_stamp_duty = sum(stamp_duties)
+                avg_stamp_duty = total_stamp_duty / total_contracts if total_contracts > 0 else 0
+                max_stamp_duty = max(stamp_duties) if stamp_duties else 0
+                min_stamp_duty = min(stamp_duties) if stamp_duties else 0
             
             # 更新显示
             self.total_contracts_var.set(str(total_contracts))
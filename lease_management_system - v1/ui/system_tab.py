@@ -2,15 +2,15 @@
 系统管理标签页UI模块
 """
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import os
-import shutil
 import datetime
 from typing import List, Dict, Any
 
 from models.entities import User
 from database.manager import DatabaseManager
 from config.settings import config
+from ui.dialogs.backup_progress_dialog import BackupProgressDialog
 from utils.logging import get_logger
 
 logger = get_logger("SystemTab")
@@ -19,11 +19,15 @@ logger = get_logger("SystemTab")
 class SystemTab(ttk.Frame):
     """系统管理标签页"""
     
+    LOG_PAGE_SIZE = 200  # 操作日志每页条数
+    
     def __init__(self, parent, db_manager: DatabaseManager, current_user: User):
         super().__init__(parent)
         
         self.db_manager = db_manager
         self.current_user = current_user
+        self._log_cursor = None  # 日志分页游标：已显示的最后一条 (operation_time, id)
+        self._vacuum_result = None  # 后台整理数据库的结果，由主线程轮询
         
         self._create_widgets()
         self.refresh()
@@ -101,7 +105,8 @@ class SystemTab(ttk.Frame):
 数据清理功能：
 • 清理过期的操作日志记录
 • 清理无效的临时数据
-• 优化数据库性能
+• 将已结束的合同归档到按年份划分的历史库（报表中勾选"包含已归档合同"可查询）
+• 整理数据库（统计信息、空闲页回收与 WAL 检查点已由后台定期执行，无需手动操作）
         """
         ttk.Label(cleanup_frame, text=cleanup_info.strip(), justify=tk.LEFT).pack(anchor=tk.W, pady=(0, 15))
         
@@ -109,7 +114,11 @@ class SystemTab(ttk.Frame):
         cleanup_button_frame.pack(fill=tk.X)
         
         ttk.Button(cleanup_button_frame, text="清理操作日志", command=self._cleanup_logs).pack(side=tk.LEFT, padx=(0, 10))
-        ttk.Button(cleanup_button_frame, text="优化数据库", command=self._optimize_database).pack(side=tk.LEFT)
+        ttk.Button(cleanup_button_frame, text="归档过期合同", command=self._archive_contracts).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(cleanup_button_frame, text="重建汇总表", command=self._rebuild_summaries).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(cleanup_button_frame, text="维护状态", command=self._show_maintenance_status).pack(side=tk.LEFT, padx=(0, 10))
+        self.vacuum_button = ttk.Button(cleanup_button_frame, text="整理数据库", command=self._optimize_database)
+        self.vacuum_button.pack(side=tk.LEFT)
     
     def _create_user_management_tab(self):
         """创建用户管理标签页"""
@@ -254,8 +263,10 @@ class SystemTab(ttk.Frame):
         button_frame.pack(side=tk.RIGHT)
         
         ttk.Button(button_frame, text="刷新日志", command=self._refresh_logs).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="更早的日志", command=self._load_more_logs).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="导出日志", command=self._export_logs).pack(side=tk.LEFT, padx=(0, 5))
-        ttk.Button(button_frame, text="清空日志", command=self._clear_logs).pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="清空日志", command=self._clear_logs).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="查询统计", command=self._show_query_stats).pack(side=tk.LEFT)
         
         # 操作日志列表
         log_columns = ("operation_time", "user", "operation_type", "target_type", "target_id", "details")
@@ -283,21 +294,12 @@ class SystemTab(ttk.Frame):
         self.log_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
     
     def _backup_database(self):
-        """备份数据库"""
+        """备份数据库（后台在线备份，完成后校验完整性并清理过期备份）"""
         try:
-            # 创建备份目录
-            os.makedirs(config.database.backup_dir, exist_ok=True)
-            
-            # 生成备份文件名
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"lease_backup_{timestamp}.db"
-            backup_path = os.path.join(config.database.backup_dir, backup_filename)
-            
-            # 复制数据库文件
-            shutil.copy2(config.database.db_path, backup_path)
-            
-            messagebox.showinfo("成功", f"数据库备份成功\n备份文件：{backup_filename}")
-            logger.info(f"数据库备份成功: {backup_path}")
+            if self.db_manager.backup_engine.running:
+                messagebox.showinfo("提示", "已有备份正在进行，请稍候")
+                return
+            BackupProgressDialog(self, self.db_manager.backup_engine)
             
         except Exception as e:
             error_msg = f"数据库备份失败: {str(e)}"
@@ -307,19 +309,16 @@ class SystemTab(ttk.Frame):
     def _view_backups(self):
         """查看备份文件"""
         try:
-            backup_dir = config.database.backup_dir
-            if os.path.exists(backup_dir):
-                # 获取备份文件列表
-                backup_files = [f for f in os.listdir(backup_dir) if f.endswith('.db')]
-                backup_files.sort(reverse=True)  # 按时间倒序
-                
-                if backup_files:
-                    file_list = "\n".join(backup_files[:10])  # 显示最新的10个备份
-                    messagebox.showinfo("备份文件列表", f"最新的备份文件：\n\n{file_list}")
-                else:
-                    messagebox.showinfo("提示", "暂无备份文件")
+            backups = self.db_manager.backup_engine.list_backups()
+            if backups:
+                file_list = "\n".join(os.path.basename(path) for path in backups[:10])  # 显示最新的10个备份
+                store = self.db_manager.backup_engine.store
+                if store is not None:
+                    usage = store.stats()
+                    file_list += f"\n\n去重仓库：{usage['chunks']} 个数据块，占用 {usage['stored_bytes'] / 1024 / 1024:.1f}MB"
+                messagebox.showinfo("备份文件列表", f"最新的备份文件：\n\n{file_list}")
             else:
-                messagebox.showinfo("提示", "备份目录不存在")
+                messagebox.showinfo("提示", "暂无备份文件")
                 
         except Exception as e:
             messagebox.showerror("错误", f"查看备份文件失败: {str(e)}")
@@ -327,31 +326,12 @@ class SystemTab(ttk.Frame):
     def _cleanup_backups(self):
         """清理旧备份"""
         try:
-            backup_dir = config.database.backup_dir
-            if not os.path.exists(backup_dir):
-                messagebox.showinfo("提示", "备份目录不存在")
-                return
-            
-            # 获取备份文件列表
-            backup_files = [f for f in os.listdir(backup_dir) if f.endswith('.db')]
-            backup_files.sort()  # 按时间排序
-            
-            if len(backup_files) <= config.database.max_backups:
+            engine = self.db_manager.backup_engine
+            if len(engine.list_backups()) <= engine.max_backups:
                 messagebox.showinfo("提示", "备份文件数量未超过限制，无需清理")
                 return
             
-            # 删除多余的备份文件
-            files_to_delete = backup_files[:-config.database.max_backups]
-            deleted_count = 0
-            
-            for filename in files_to_delete:
-                file_path = os.path.join(backup_dir, filename)
-                try:
-                    os.remove(file_path)
-                    deleted_count += 1
-                except Exception as e:
-                    logger.warning(f"删除备份文件失败: {file_path}, 错误: {str(e)}")
-            
+            deleted_count = engine.cleanup_old_backups()
             messagebox.showinfo("成功", f"清理完成，删除了 {deleted_count} 个旧备份文件")
             
         except Exception as e:
@@ -370,7 +350,7 @@ class SystemTab(ttk.Frame):
             # 选择备份文件
             file_path = filedialog.askopenfilename(
                 title="选择备份文件",
-                filetypes=[("数据库文件", "*.db"), ("所有文件", "*.*")],
+                filetypes=[("备份文件", "*.db *.json"), ("所有文件", "*.*")],
                 initialdir=config.database.backup_dir
             )
             
@@ -389,10 +369,16 @@ class SystemTab(ttk.Frame):
                                        f"此操作不可撤销！"):
                 return
             
-            # 执行恢复
-            shutil.copy2(file_path, config.database.db_path)
+            # 热恢复：校验备份、安全备份当前数据、排空连接池后通过备份 API 写入
+            safety_path = self.db_manager.restore_backup(file_path, self.current_user.username)
+            
+            main_window = self.winfo_toplevel()
+            if hasattr(main_window, 'reload_data'):
+                main_window.reload_data()
+            else:
+                self.refresh()
             
-            messagebox.showinfo("成功", "数据恢复成功！\n请重启系统以生效。")
+            messagebox.showinfo("成功", f"数据恢复成功，无需重启系统。\n恢复前数据已备份到：{os.path.basename(safety_path)}")
             logger.info(f"数据库恢复成功: 从 {file_path}")
             
         except Exception as e:
@@ -401,40 +387,115 @@ class SystemTab(ttk.Frame):
             logger.error(error_msg)
     
     def _cleanup_logs(self):
-        """清理操作日志"""
-        if not messagebox.askyesno("确认", "确定要清理30天前的操作日志吗？"):
+        """按保留期清理操作日志：整月分区导出为压缩文件后删除"""
+        keep_months = config.database.log_retention_months
+        if not messagebox.askyesno("确认", f"确定要清理 {keep_months} 个月之前的操作日志吗？\n"
+                                         f"日志将先导出到 {config.database.log_export_dir} 目录"):
             return
         
+        result = self.db_manager.purge_logs(keep_months)
+        if result is None:
+            messagebox.showerror("错误", "清理操作日志失败")
+            return
+        removed, exported = result
+        messagebox.showinfo("成功", f"操作日志清理完成，删除 {removed} 条，导出 {len(exported)} 个文件")
+        self._refresh_logs()
+    
+    def _archive_contracts(self):
+        """把截止日期之前结束的合同移入历史归档库"""
+        default = datetime.date(datetime.date.today().year - 1, 1, 1).strftime("%Y-%m-%d")
+        value = simpledialog.askstring("归档过期合同", "归档在此日期之前结束的合同（YYYY-MM-DD）:",
+                                       initialvalue=default, parent=self)
+        if not value:
+            return
         try:
-            # 删除30天前的日志
-            cutoff_date = datetime.datetime.now() - datetime.timedelta(days=30)
-            cutoff_str = cutoff_date.strftime("%Y-%m-%d %H:%M:%S")
-            
-            sql = "DELETE FROM operation_logs WHERE operation_time < ?"
-            if self.db_manager.execute_command(sql, (cutoff_str,)):
-                messagebox.showinfo("成功", "操作日志清理完成")
-                self._refresh_logs()
+            cutoff = datetime.datetime.strptime(value.strip(), "%Y-%m-%d").date()
+        except ValueError:
+            messagebox.showerror("错误", "日期格式不正确，应为 YYYY-MM-DD")
+            return
+        
+        archive = self.db_manager.archive
+        groups = archive.find_expired(cutoff)
+        count = sum(len(ids) for ids in groups.values())
+        if not count:
+            messagebox.showinfo("提示", f"没有 {cutoff} 之前结束的可归档合同")
+            return
+        if not messagebox.askyesno("确认", f"共有 {count} 份合同将移入归档库 {archive.archive_dir}，"
+                                         f"归档后仅在报表勾选\"包含已归档合同\"时可见。确定继续吗？"):
+            return
+        
+        result = archive.archive_contracts(cutoff, self.current_user.username)
+        archived = sum(result.values())
+        if archived == count:
+            messagebox.showinfo("成功", f"已归档 {archived} 份合同")
+        else:
+            messagebox.showwarning("部分完成", f"已归档 {archived}/{count} 份合同，失败原因请查看日志")
+        if archived:
+            main_window = self.winfo_toplevel()
+            if hasattr(main_window, 'reload_data'):
+                main_window.reload_data()
             else:
-                messagebox.showerror("错误", "清理操作日志失败")
-                
-        except Exception as e:
-            messagebox.showerror("错误", f"清理操作日志失败: {str(e)}")
+                self.refresh()
+    
+    def _rebuild_summaries(self):
+        """由明细记录重新生成月度汇总表"""
+        result = self.db_manager.rebuild_summaries()
+        if result is None:
+            messagebox.showerror("错误", "重建月度汇总表失败")
+            return
+        messagebox.showinfo("成功", f"月度汇总表重建完成，共 {sum(result.values())} 条汇总记录")
     
     def _optimize_database(self):
-        """优化数据库"""
-        try:
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("VACUUM")
-                conn.commit()
-            
-            messagebox.showinfo("成功", "数据库优化完成")
-            logger.info("数据库优化完成")
-            
-        except Exception as e:
-            error_msg = f"数据库优化失败: {str(e)}"
-            messagebox.showerror("错误", error_msg)
-            logger.error(error_msg)
+        """整理数据库：在后台线程执行 VACUUM（同时启用增量空闲页回收），界面不阻塞"""
+        if not messagebox.askyesno("确认", "整理数据库会重建整个数据库文件，期间其他写入需要等待。\n确定要继续吗？"):
+            return
+        
+        self._vacuum_result = None
+        self.vacuum_button.configure(state=tk.DISABLED, text="正在整理...")
+        
+        def on_done(result):
+            # 后台线程只记录结果，界面更新由 after 轮询在主线程完成
+            self._vacuum_result = result
+        
+        self.db_manager.maintenance.start_job("vacuum", on_done)
+        self.after(200, self._poll_vacuum)
+    
+    def _poll_vacuum(self):
+        """主线程轮询整理数据库的结果"""
+        result = self._vacuum_result
+        if result is None:
+            self.after(200, self._poll_vacuum)
+            return
+        
+        self.vacuum_button.configure(state=tk.NORMAL, text="整理数据库")
+        if "error" in result:
+            messagebox.showerror("错误", f"整理数据库失败: {result['error']}")
+            return
+        logger.info(f"数据库整理完成: {result}")
+        messagebox.showinfo("成功", f"数据库整理完成\n"
+                                    f"页数 {result['pages_before']} -> {result['pages_after']}，耗时 {result['elapsed']:.1f}s")
+    
+    def _show_maintenance_status(self):
+        """显示后台维护任务最近一次的执行情况"""
+        names = {"checkpoint": "WAL 检查点", "incremental_vacuum": "空闲页回收", "analyze": "统计信息更新",
+                 "fragmentation": "碎片统计", "vacuum": "整理数据库"}
+        lines = []
+        for name, status in self.db_manager.maintenance.status().items():
+            finished = status["last_finished"]
+            when = finished.strftime("%Y-%m-%d %H:%M:%S") if finished else "尚未执行"
+            result = status["result"]
+            if "error" in result:
+                detail = f"失败：{result['error']}"
+            elif name == "fragmentation" and result:
+                detail = f"{result['page_count']} 页，空闲 {result['free_pages']} 页（{result['free_ratio']:.1%}）"
+            elif name == "incremental_vacuum" and result:
+                detail = result.get("skipped") or f"回收 {result['released']} 页，剩余空闲 {result['free_pages']} 页"
+            elif name == "checkpoint" and result:
+                detail = f"WAL {result['wal_bytes'] / 1024 / 1024:.1f}MB" + (f"，已执行 {result['mode']}" if "mode" in result else "")
+            else:
+                detail = f"耗时 {result['elapsed']:.2f}s" if result else ""
+            lines.append(f"{names.get(name, name)}：{when}  {detail}")
+        messagebox.showinfo("数据库维护状态", "\n".join(lines))
     
     def _add_user(self):
         """添加用户"""
@@ -478,54 +539,93 @@ class SystemTab(ttk.Frame):
             messagebox.showerror("错误", f"刷新用户列表失败: {str(e)}")
     
     def _refresh_logs(self):
-        """刷新操作日志"""
+        """刷新操作日志（从最新一页开始）"""
         try:
             # 清空现有数据
             for item in self.log_tree.get_children():
                 self.log_tree.delete(item)
+            self._log_cursor = None
             
-            # 获取最近的操作日志
-            logs = self.db_manager.execute_query("""
-                SELECT operation_time, user, operation_type, target_type, target_id, details
-                FROM operation_logs 
-                ORDER BY operation_time DESC 
-                LIMIT 1000
-            """)
-            
-            # 填充日志数据
-            for log_data in logs:
-                self.log_tree.insert("", tk.END, values=(
-                    log_data['operation_time'],
-                    log_data['user'],
-                    log_data['operation_type'],
-                    log_data['target_type'],
-                    log_data['target_id'],
-                    log_data['details'] or ""
-                ))
+            # 先等待后台写入器写完已提交的日志，再获取最近的操作日志
+            self.db_manager.flush_logs()
+            self._append_log_page()
                 
         except Exception as e:
             logger.error(f"刷新操作日志失败: {str(e)}")
             messagebox.showerror("错误", f"刷新操作日志失败: {str(e)}")
     
+    def _load_more_logs(self):
+        """在列表末尾追加更早的一页日志"""
+        if self._log_cursor is None:
+            self._refresh_logs()
+            return
+        try:
+            if not self._append_log_page():
+                messagebox.showinfo("提示", "没有更早的操作日志")
+        except Exception as e:
+            logger.error(f"加载操作日志失败: {str(e)}")
+            messagebox.showerror("错误", f"加载操作日志失败: {str(e)}")
+    
+    def _append_log_page(self) -> int:
+        """按 (操作时间, id) 游标读取下一页，只访问需要的月份分区；返回本页条数"""
+        logs = self.db_manager.page_logs(self.LOG_PAGE_SIZE, self._log_cursor)
+        
+        # 填充日志数据
+        for log_data in logs:
+            self.log_tree.insert("", tk.END, values=(
+                log_data['operation_time'],
+                log_data['user'],
+                log_data['operation_type'],
+                log_data['target_type'],
+                log_data['target_id'],
+                log_data['details'] or ""
+            ))
+        if logs:
+            self._log_cursor = (logs[-1]['operation_time'], logs[-1]['id'])
+        return len(logs)
+    
     def _export_logs(self):
         """导出操作日志"""
         # TODO: 实现日志导出功能
         messagebox.showinfo("提示", "日志导出功能待实现")
     
+    def _show_query_stats(self):
+        """显示按总耗时排序的 SQL 查询统计"""
+        try:
+            report = self.db_manager.dump_query_stats()
+            
+            stats_dialog = tk.Toplevel(self)
+            stats_dialog.title("查询统计")
+            stats_dialog.geometry("1000x500")
+            stats_dialog.transient(self)
+            
+            text = tk.Text(stats_dialog, wrap=tk.NONE, font=("Courier New", 9))
+            scrollbar_y = ttk.Scrollbar(stats_dialog, orient="vertical", command=text.yview)
+            scrollbar_x = ttk.Scrollbar(stats_dialog, orient="horizontal", command=text.xview)
+            text.configure(yscrollcommand=scrollbar_y.set, xscrollcommand=scrollbar_x.set)
+            text.insert(tk.END, report)
+            text.configure(state=tk.DISABLED)
+            
+            scrollbar_y.pack(side=tk.RIGHT, fill=tk.Y)
+            scrollbar_x.pack(side=tk.BOTTOM, fill=tk.X)
+            text.pack(fill=tk.BOTH, expand=True)
+            
+        except Exception as e:
+            logger.error(f"显示查询统计失败: {str(e)}")
+            messagebox.showerror("错误", f"显示查询统计失败: {str(e)}")
+    
     def _clear_logs(self):
-        """清空操作日志"""
-        if not messagebox.askyesno("警告", "确定要清空所有操作日志吗？\n此操作不可撤销！"):
+        """清空操作日志（删除全部分区，删除前导出）"""
+        if not messagebox.askyesno("警告", f"确定要清空所有操作日志吗？\n"
+                                         f"日志将先导出到 {config.database.log_export_dir} 目录后从数据库中删除"):
             return
         
-        try:
-            if self.db_manager.execute_command("DELETE FROM operation_logs"):
-                messagebox.showinfo("成功", "操作日志已清空")
-                self._refresh_logs()
-            else:
-                messagebox.showerror("错误", "清空操作日志失败")
-                
-        except Exception as e:
-            messagebox.showerror("错误", f"清空操作日志失败: {str(e)}")
+        result = self.db_manager.purge_logs(keep_months=0)
+        if result is None:
+            messagebox.showerror("错误", "清空操作日志失败")
+            return
+        messagebox.showinfo("成功", f"操作日志已清空，共导出 {len(result[1])} 个文件")
+        self._refresh_logs()
     
     def _update_stats(self):
         """更新统计信息"""
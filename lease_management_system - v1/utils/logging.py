@@ -7,6 +7,17 @@ from logging.handlers import RotatingFileHandler
 from config.settings import config
 
 
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """首次写入日志时才创建日志目录和文件，只导入模块或不产生日志的进程不会在磁盘上留下目录"""
+    
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+    
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
 class LoggerManager:
     """日志管理器"""
     
@@ -30,11 +41,8 @@ class LoggerManager:
             
         logger.setLevel(logging.INFO)
         
-        # 创建日志目录
-        os.makedirs(config.logging.log_dir, exist_ok=True)
-        
-        # 创建文件处理器
-        handler = RotatingFileHandler(
+        # 创建文件处理器（日志目录在首次写入时创建）
+        handler = LazyRotatingFileHandler(
             config.logging.log_path,
             maxBytes=config.logging.max_bytes,
             backupCount=config.logging.backup_count,